@@ -0,0 +1,194 @@
+"""Connection reuse benchmark of the download handler.
+
+Serves medium post payloads (synthetic, or the responses recorded in
+betamax cassettes) from a local HTTP server, crawls them with a bare
+spider and reports throughput, the connections the server accepted and
+the `http_pool/` stats of `handlers.PooledHTTPDownloadHandler`.
+
+Usage:
+    python -m benchmarks.bench_http_pool
+    python -m benchmarks.bench_http_pool --handler scrapy
+    python -m benchmarks.bench_http_pool --max-requests 50 --check 0.9
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.reactor import install_reactor
+from twisted.web import resource, server
+
+from benchmarks import payloads
+
+REACTOR = 'twisted.internet.asyncioreactor.AsyncioSelectorReactor'
+
+HANDLERS = {
+    'pooled': 'medium_crawler.handlers.PooledHTTPDownloadHandler',
+    'scrapy': 'scrapy.core.downloader.handlers.http11.HTTP11DownloadHandler',
+}
+
+
+class Payloads(resource.Resource):
+    """Serve the same bodies over and over, whatever the path."""
+
+    isLeaf = True
+
+    def __init__(self, bodies: List[bytes]) -> None:
+        """Set bodies."""
+        super().__init__()
+        self.bodies = bodies
+        self.served = 0
+
+    def render_GET(self, request) -> bytes:
+        """Serve the next body."""
+        body = self.bodies[self.served % len(self.bodies)]
+        self.served += 1
+        request.setHeader(b'content-type', b'application/json')
+        return body
+
+
+class CountingSite(server.Site):
+    """Site counting the connections it accepts."""
+
+    connections = 0
+
+    def buildProtocol(self, addr):
+        """Count a new connection."""
+        self.connections += 1
+        return super().buildProtocol(addr)
+
+
+class PostSpider(scrapy.Spider):
+    """Request the same number of posts from the stand-in server."""
+
+    name = 'bench_http_pool'
+
+    def __init__(self, base_url: str, requests: int, **kwargs) -> None:
+        """Set server and number of requests."""
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.requests = requests
+
+    async def start(self):
+        """Scrapy 2.13+ entry point."""
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self) -> Iterator[scrapy.Request]:
+        """Request the posts."""
+        for i in range(self.requests):
+            yield scrapy.Request(
+                f'{self.base_url}/writer/{i:012x}?format=json',
+                dont_filter=True
+            )
+
+    def parse(self, response):
+        """Discard the payload."""
+        return None
+
+
+def cassette_bodies(directory: str) -> List[bytes]:
+    """Get the response bodies recorded in betamax cassettes."""
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            cassette = json.load(f)
+        for interaction in cassette.get('http_interactions', []):
+            body = interaction['response']['body']
+            if 'base64_string' in body:
+                bodies.append(base64.b64decode(body['base64_string']))
+            else:
+                bodies.append(body.get('string', '').encode())
+    return bodies
+
+
+def run(args: argparse.Namespace) -> Dict[str, float]:
+    """Crawl the stand-in server once.
+
+    Args:
+        args (argparse.Namespace): benchmark options
+
+    Returns:
+        Dict[str, float]: throughput, server connections and pool stats
+    """
+    bodies = cassette_bodies(args.cassettes) if args.cassettes else []
+    bodies = bodies or [
+        payloads.dump(payloads.post(f'{i:012x}', 'writer', 'writer', 20, 3))
+        for i in range(10)
+    ]
+    process = CrawlerProcess({
+        'DOWNLOAD_HANDLERS': {'http': HANDLERS[args.handler]},
+        'CONCURRENT_REQUESTS': args.concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': args.concurrency,
+        'HTTP_POOL_MAX_REQUESTS': args.max_requests,
+        'LOG_LEVEL': 'WARNING',
+        'TELNETCONSOLE_ENABLED': False,
+        'TWISTED_REACTOR': REACTOR,
+    })
+    # the server runs on the reactor of the crawl
+    install_reactor(REACTOR)
+    from twisted.internet import reactor
+    site = CountingSite(Payloads(bodies))
+    port = reactor.listenTCP(0, site, interface='127.0.0.1')
+    crawler = process.create_crawler(PostSpider)
+    process.crawl(
+        crawler,
+        base_url=f'http://127.0.0.1:{port.getHost().port}',
+        requests=args.requests
+    )
+    start = time.perf_counter()
+    process.start()
+    elapsed = time.perf_counter() - start
+    stats = crawler.stats.get_stats()
+    return {
+        'requests/s': args.requests / elapsed,
+        'server connections': site.connections,
+        'new': stats.get('http_pool/connections/new', 0),
+        'reused': stats.get('http_pool/connections/reused', 0),
+        'retired': stats.get('http_pool/connections/retired', 0),
+        'reuse ratio': stats.get('http_pool/reuse_ratio', 0),
+    }
+
+
+def process_command() -> argparse.Namespace:
+    """Create the benchmark parser.
+
+    Returns:
+        argparse.Namespace: argparse object
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handler', choices=sorted(HANDLERS),
+                        default='pooled', help='Download handler')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='Number of requests (default 2000)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Concurrent requests (default 16)')
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help='HTTP_POOL_MAX_REQUESTS (default 0)')
+    parser.add_argument('--cassettes',
+                        help='Serve the bodies of betamax cassettes')
+    parser.add_argument('--check', type=float,
+                        help='Fail when the reuse ratio is below this')
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Execute."""
+    args = process_command()
+    results = run(args)
+    for name, value in results.items():
+        print(f'{name:<20}{value:>12.2f}')
+    if args.check is not None and results['reuse ratio'] < args.check:
+        print(f'LOW REUSE {results["reuse ratio"]:.2f} < {args.check:.2f}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""Offline benchmark of the MediumPost parsing hot path.
+
+Replays synthetic (or betamax-recorded) medium payloads through the spider
+callbacks without any network and reports latency percentiles, throughput
+and peak memory of each callback.
+
+Usage:
+    python -m benchmarks.bench_parsing --scale large
+    python -m benchmarks.bench_parsing --scale large --save
+    python -m benchmarks.bench_parsing --scale large --compare
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks import payloads
+from medium_crawler.parents import PostRef
+from medium_crawler.spiders.medium import MediumPost
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+SCALES = {
+    'small': {'posts': 10, 'paragraphs': 50, 'comments': 200,
+              'authors': 50, 'rounds': 30},
+    'large': {'posts': 100, 'paragraphs': 2000, 'comments': 5000,
+              'authors': 1000, 'rounds': 10},
+}
+
+USER_ID = '8045c82962e2'
+USERNAME = 'chiayinchen'
+POST_ID = '625a07c75000'
+
+
+class Case:
+    """One callback replayed on one payload."""
+
+    def __init__(
+        self,
+        name: str,
+        callback: str,
+        url: str,
+        body: bytes,
+        meta: Callable[[], dict] = dict
+    ) -> None:
+        """Set payload.
+
+        Args:
+            name (str): case name
+            callback (str): MediumPost callback name
+            url (str): response url
+            body (bytes): response body
+            meta (Callable[[], dict]): factory of the request meta
+        """
+        self.name = name
+        self.callback = callback
+        self.url = url
+        self.body = body
+        self.meta = meta
+
+    def prepare(self) -> Callable[[], list]:
+        """Build a fresh spider and response for one call."""
+        spider = MediumPost(date='20000101', usernames=USERNAME)
+        response = HtmlResponse(
+            url=self.url,
+            body=self.body,
+            request=Request(self.url, meta=self.meta())
+        )
+        if 'post_id' in response.meta:
+            spider.posts.put(PostRef(
+                response.meta['post_id'], USERNAME, 'Chia Yin Chen', 'Title'
+            ))
+        callback = getattr(spider, self.callback)
+        return lambda: list(callback(response))
+
+
+def comment_meta(post_id: str) -> Callable[[], dict]:
+    """Get the meta factory of a `responsesStream` request."""
+    def meta():
+        return {'uid': USERNAME, 'post_id': post_id}
+    return meta
+
+
+def synthetic_cases(scale: dict) -> List[Case]:
+    """Build the synthetic payloads of a scale.
+
+    Args:
+        scale (dict): payload sizes, see `SCALES`
+
+    Returns:
+        List[Case]: benchmark cases
+    """
+    newest_ms = int(time.time() * 1000)
+    return [
+        Case(
+            name='parse_links',
+            callback='parse_links',
+            url=f'https://medium.com/@{USERNAME}?format=json',
+            body=payloads.dump(payloads.profile(
+                USER_ID, USERNAME, scale['posts'], newest_ms
+            )),
+            meta=lambda: {'uid': USERNAME}
+        ),
+        Case(
+            name='post',
+            callback='post',
+            url=f'https://medium.com/{USER_ID}/{POST_ID}?format=json',
+            body=payloads.dump(payloads.post(
+                POST_ID, USER_ID, USERNAME, scale['paragraphs'],
+                scale['comments']
+            )),
+            meta=lambda: {'uid': USERNAME}
+        ),
+        Case(
+            name='comment',
+            callback='comment',
+            url=f'https://medium.com/_/api/posts/{POST_ID}/responsesStream',
+            body=payloads.dump(payloads.responses(
+                POST_ID, scale['comments'], scale['authors'],
+                missing_authors=0.1
+            )),
+            meta=comment_meta(POST_ID)
+        ),
+    ]
+
+
+def cassette_cases(directory: str) -> List[Case]:
+    """Build cases from the responses recorded in betamax cassettes.
+
+    Args:
+        directory (str): betamax cassette directory
+
+    Returns:
+        List[Case]: benchmark cases
+    """
+    cases = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            cassette = json.load(f)
+        for interaction in cassette.get('http_interactions', []):
+            url = interaction['request']['uri']
+            body = interaction['response']['body']
+            if 'base64_string' in body:
+                data = base64.b64decode(body['base64_string'])
+            else:
+                data = body.get('string', '').encode()
+            path = urlparse(url).path
+            if path.endswith('/responsesStream'):
+                post_id = path.split('/')[-2]
+                cases.append(Case(f'comment {post_id}', 'comment',
+                                  url, data, comment_meta(post_id)))
+            elif path.startswith('/@'):
+                cases.append(Case(f'parse_links {path}', 'parse_links', url,
+                                  data, lambda: {'uid': USERNAME}))
+            else:
+                cases.append(Case(f'post {path}', 'post', url, data,
+                                  lambda: {'uid': USERNAME}))
+    return cases
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Get the q-th percentile (nearest rank) of a list."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_case(case: Case, rounds: int) -> Dict[str, float]:
+    """Time a case and measure its peak memory.
+
+    Args:
+        case (Case): benchmark case
+        rounds (int): number of timed calls
+
+    Returns:
+        Dict[str, float]: latency percentiles (ms), throughput, peak memory
+    """
+    latencies = []
+    outputs = []
+    for _ in range(rounds):
+        call = case.prepare()
+        start = time.perf_counter()
+        outputs = call()
+        latencies.append(time.perf_counter() - start)
+
+    call = case.prepare()
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_items = sum(1 for o in outputs if not isinstance(o, Request))
+    total = sum(latencies)
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'items': n_items,
+        'requests': len(outputs) - n_items,
+        'items_per_sec': n_items * rounds / total if total else 0.0,
+        'outputs_per_sec': len(outputs) * rounds / total if total else 0.0,
+        'peak_kib': peak / 1024,
+        'payload_kib': len(case.body) / 1024,
+    }
+
+
+def compare(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    threshold: float
+) -> List[str]:
+    """List the cases whose p50 latency regressed past the threshold.
+
+    Args:
+        results (Dict[str, dict]): current results by case
+        baseline (Dict[str, dict]): baseline results by case
+        threshold (float): allowed relative slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        List[str]: regression messages
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'peak_kib'):
+            if result[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f'{name}: {metric} {base[metric]:.2f} -> '
+                    f'{result[metric]:.2f}'
+                )
+    return regressions
+
+
+def process_command() -> argparse.Namespace:
+    """Create the benchmark parser.
+
+    Returns:
+        argparse.Namespace: argparse object
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--rounds', type=int,
+                        help='Timed calls per case (default depends on scale)')
+    parser.add_argument('--cassettes',
+                        help='Replay betamax cassettes from this directory')
+    parser.add_argument('--save', nargs='?', const=BASELINE,
+                        help='Write results to a baseline file')
+    parser.add_argument('--compare', nargs='?', const=BASELINE,
+                        help='Fail on regressions against a baseline file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative regression (default 0.2)')
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Execute."""
+    args = process_command()
+    scale = SCALES[args.scale]
+    rounds = args.rounds or scale['rounds']
+    if args.cassettes:
+        cases, key = cassette_cases(args.cassettes), 'cassettes'
+    else:
+        cases, key = synthetic_cases(scale), args.scale
+
+    results = {case.name: run_case(case, rounds) for case in cases}
+    print(f'{"case":<24}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}'
+          f'{"items/s":>12}{"peak KiB":>12}{"payload KiB":>13}')
+    for name, r in results.items():
+        print(f'{name[:24]:<24}{r["p50_ms"]:>10.2f}{r["p90_ms"]:>10.2f}'
+              f'{r["p99_ms"]:>10.2f}{r["items_per_sec"]:>12.0f}'
+              f'{r["peak_kib"]:>12.0f}{r["payload_kib"]:>13.0f}')
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.save):
+            with open(args.save) as f:
+                baseline = json.load(f)
+        baseline[key] = results
+        with open(args.save, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get(key, {})
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Startup time benchmark of the package and the command line tools.
+
+Runs each target in a fresh interpreter with `python -X importtime` and
+reports the median import time and wall time, which every cron-launched
+crawl pays before its first request.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --check
+    python -m benchmarks.bench_startup --save
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(os.path.dirname(__file__), 'startup_budget.json')
+
+TARGETS = {
+    'import medium_crawler': ['-c', 'import medium_crawler'],
+    'import settings': ['-c', 'import medium_crawler.settings'],
+    'import pipelines': ['-c', 'import medium_crawler.pipelines'],
+    'import spider': ['-c', 'import medium_crawler.spiders.medium'],
+    'run.py --help': [os.path.join(ROOT, 'medium_crawler', 'run.py'),
+                      '--help'],
+}
+
+
+def import_time(stderr: str) -> float:
+    """Sum the cumulative time of the top-level imports.
+
+    Args:
+        stderr (str): `-X importtime` output
+
+    Returns:
+        float: import time in ms
+    """
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000
+
+
+def run_target(args: List[str], rounds: int) -> Dict[str, float]:
+    """Start a target in fresh interpreters.
+
+    Args:
+        args (List[str]): python arguments
+        rounds (int): number of runs
+
+    Returns:
+        Dict[str, float]: median import and wall time in ms
+    """
+    imports, walls = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', *args],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True
+        )
+        walls.append((time.perf_counter() - start) * 1000)
+        imports.append(import_time(process.stderr))
+    return {
+        'import_ms': statistics.median(imports),
+        'wall_ms': statistics.median(walls),
+    }
+
+
+def over_budget(
+    results: Dict[str, dict],
+    budget: Dict[str, float]
+) -> List[str]:
+    """List the targets whose median import time exceeds their budget.
+
+    Args:
+        results (Dict[str, dict]): current results by target
+        budget (Dict[str, float]): maximum import time (ms) by target
+
+    Returns:
+        List[str]: budget messages
+    """
+    return [
+        f'{name}: {result["import_ms"]:.0f} ms > {budget[name]:.0f} ms'
+        for name, result in results.items()
+        if name in budget and result['import_ms'] > budget[name]
+    ]
+
+
+def process_command() -> argparse.Namespace:
+    """Create the benchmark parser.
+
+    Returns:
+        argparse.Namespace: argparse object
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='Runs per target (default 5)')
+    parser.add_argument('--save', nargs='?', const=BUDGET,
+                        help='Write the results plus headroom as the budget')
+    parser.add_argument('--headroom', type=float, default=0.2,
+                        help='Budget headroom used by --save (default 0.2)')
+    parser.add_argument('--min-headroom', type=float, default=20,
+                        help='Minimum budget headroom in ms used by --save '
+                             '(default 20)')
+    parser.add_argument('--check', nargs='?', const=BUDGET,
+                        help='Fail when a target is over its budget')
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Execute."""
+    args = process_command()
+    results = {
+        name: run_target(target, args.rounds)
+        for name, target in TARGETS.items()
+    }
+    print(f'{"target":<24}{"import ms":>12}{"wall ms":>12}')
+    for name, r in results.items():
+        print(f'{name:<24}{r["import_ms"]:>12.0f}{r["wall_ms"]:>12.0f}')
+
+    if args.save:
+        budget = {
+            name: round(r['import_ms'] + max(
+                r['import_ms'] * args.headroom, args.min_headroom
+            ))
+            for name, r in results.items()
+        }
+        with open(args.save, 'w') as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.check:
+        with open(args.check) as f:
+            budget = json.load(f)
+        messages = over_budget(results, budget)
+        for message in messages:
+            print(f'OVER BUDGET {message}')
+        return 1 if messages else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""Local stand-in for the medium API, to load test the crawler.
+
+Serves synthetic `])}while(1);</x>`-prefixed payloads for the endpoints the
+spider requests, with configurable latency, errors and 429 bursts:
+
+    /@{username}?format=json                    profile page
+    /_/api/users/{user_id}/profile/stream       next profile pages
+    /{user_id}/{post_id}?format=json            post, or comment author
+    /_/api/posts/{post_id}/responsesStream      comment pages
+    /_mock/stats                                served requests by route
+
+Writers are named `writer0`, `writer1`, ... and post one post a day, the
+newest today. Payloads are generated from the path and `--seed`, so a
+crawl sees the same data on every run.
+
+Usage:
+    python -m benchmarks.mock_medium --writers 20 --posts 30 --latency 0.05
+    scrapy crawl medium -a usernames=writer0,writer1 -a back=30 \\
+        -s MEDIUM_BASE_URL=http://127.0.0.1:8080
+    python medium_crawler/run.py -s medium --base-url http://127.0.0.1:8080
+"""
+import argparse
+import json
+import math
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from twisted.web import resource, server
+
+from benchmarks import payloads
+
+ROUTES = (
+    ('profile', re.compile(r'^/@(?P<username>[^/]+)$')),
+    ('profile_stream',
+     re.compile(r'^/_/api/users/(?P<user_id>[^/]+)/profile/stream$')),
+    ('comment', re.compile(r'^/_/api/posts/(?P<post_id>[^/]+)/'
+                           r'responsesStream$')),
+    ('stats', re.compile(r'^/_mock/stats$')),
+    ('post', re.compile(r'^/(?P<user_id>[^/@_][^/]*)/(?P<post_id>[^/]+)$')),
+)
+
+
+class MockMedium(resource.Resource):
+    """Synthetic medium API."""
+
+    isLeaf = True
+
+    def __init__(
+        self,
+        writers: int = 10,
+        posts: int = 30,
+        page_size: int = 10,
+        comments: int = 50,
+        comment_page_size: int = 50,
+        authors: int = 100,
+        missing_authors: float = 0.1,
+        paragraphs: int = 20,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        burst_every: float = 0.0,
+        burst_length: float = 0.0,
+        seed: int = 0
+    ) -> None:
+        """Set data sizes and faults.
+
+        Args:
+            writers (int): number of writers
+            posts (int): posts per writer, rounded up to full pages
+            page_size (int): posts per profile page
+            comments (int): comments per post
+            comment_page_size (int): comments per `responsesStream` page
+            authors (int): distinct comment authors per post
+            missing_authors (float): share of comment authors left out of
+                                     `references.User`, looked up by the
+                                     spider one by one
+            paragraphs (int): paragraphs per post
+            latency (float): mean response delay in seconds, +/- 50%
+            error_rate (float): share of requests answered with a 500
+            burst_every (float): seconds between two 429 bursts, 0 for none
+            burst_length (float): seconds every request gets a 429
+            seed (int): random seed
+        """
+        super().__init__()
+        # post ids start with the first 6 characters of the user id
+        self.writers = {f'writer{i}': f'{i:06x}' * 2 for i in range(writers)}
+        self.usernames = {v: k for k, v in self.writers.items()}
+        self.pages = max(1, math.ceil(posts / page_size))
+        self.page_size = page_size
+        self.comments = comments
+        self.comment_page_size = comment_page_size
+        self.authors = authors
+        self.missing_authors = missing_authors
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.started = time.time()
+        self.newest_ms = int(self.started * 1000)
+        self.served: Counter = Counter()
+
+    def payload_seed(self, path: str) -> int:
+        """Get the seed of the payload of a path."""
+        return zlib.crc32(f'{self.seed}:{path}'.encode())
+
+    def fault(self, now: float) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Draw the error of a request.
+
+        Args:
+            now (float): request time
+
+        Returns:
+            Optional[Tuple[int, Dict[str, str]]]: status and headers, None
+                                                  to serve the payload
+        """
+        if self.burst_every and self.burst_length:
+            elapsed = (now - self.started) % self.burst_every
+            if elapsed < self.burst_length:
+                retry_after = math.ceil(self.burst_length - elapsed)
+                return 429, {'Retry-After': str(retry_after)}
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return 500, {}
+        return None
+
+    def route(
+        self,
+        path: str,
+        args: Dict[str, str]
+    ) -> Tuple[str, int, bytes]:
+        """Build the response of a request.
+
+        Args:
+            path (str): url path
+            args (Dict[str, str]): query arguments
+
+        Returns:
+            Tuple[str, int, bytes]: route name, status and body
+        """
+        for name, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return 'unknown', 404, b''
+        params = match.groupdict()
+        if name == 'stats':
+            return name, 200, json.dumps(self.served).encode()
+        if name in ('profile', 'profile_stream'):
+            if name == 'profile':
+                username = params['username']
+                user_id = self.writers.get(username)
+                page = 1
+            else:
+                user_id = params['user_id']
+                username = self.usernames.get(user_id)
+                page = int(args.get('page') or 1)
+            if user_id is None or username is None or page > self.pages:
+                return name, 404, b''
+            obj = payloads.profile(
+                user_id, username, self.page_size, self.newest_ms, page=page,
+                has_next=page < self.pages
+            )
+        elif name == 'comment':
+            limit = int(args.get('limit') or self.comment_page_size)
+            page = int(args.get('to') or 0) // limit + 1
+            left = self.comments - (page - 1) * self.comment_page_size
+            if left <= 0:
+                return name, 404, b''
+            obj = payloads.responses(
+                params['post_id'],
+                min(left, self.comment_page_size),
+                self.authors,
+                missing_authors=self.missing_authors,
+                page=page,
+                has_next=left > self.comment_page_size,
+                seed=self.payload_seed(path)
+            )
+        else:
+            user_id, post_id = params['user_id'], params['post_id']
+            # comment ids start with `c`, their payload names the author
+            is_comment = post_id.startswith('c')
+            obj = payloads.post(
+                post_id,
+                user_id,
+                self.usernames.get(user_id, f'user_{user_id}'),
+                1 if is_comment else self.paragraphs,
+                0 if is_comment else self.comments,
+                seed=self.payload_seed(path),
+                updated_at=payloads.updated_at(
+                    post_id, self.page_size, self.newest_ms
+                )
+            )
+        return name, 200, payloads.dump(obj)
+
+    def render_GET(self, request: server.Request) -> int:
+        """Answer a request after the configured latency."""
+        from twisted.internet import reactor
+
+        path = request.path.decode()
+        args = {k.decode(): v[0].decode() for k, v in request.args.items()}
+        fault = path != '/_mock/stats' and self.fault(time.time())
+        if fault:
+            name, (status, headers), body = 'fault', fault, b''
+        else:
+            name, status, body = self.route(path, args)
+        self.served[f'{name}/{status}'] += 1
+        gone = []
+        request.notifyFinish().addBoth(gone.append)
+
+        def respond():
+            if gone:
+                return
+            request.setResponseCode(status)
+            request.setHeader(b'content-type', b'application/json')
+            for key, value in (headers if fault else {}).items():
+                request.setHeader(key.encode(), value.encode())
+            request.write(body)
+            request.finish()
+
+        if self.latency:
+            delay = self.latency * (0.5 + self.rng.random())
+            reactor.callLater(delay, respond)
+        else:
+            respond()
+        return server.NOT_DONE_YET
+
+
+def process_command() -> argparse.Namespace:
+    """Create the server parser.
+
+    Returns:
+        argparse.Namespace: argparse object
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--writers', type=int, default=10)
+    parser.add_argument('--posts', type=int, default=30,
+                        help='Posts per writer')
+    parser.add_argument('--page-size', type=int, default=10,
+                        help='Posts per profile page')
+    parser.add_argument('--comments', type=int, default=50,
+                        help='Comments per post')
+    parser.add_argument('--comment-page-size', type=int, default=50)
+    parser.add_argument('--authors', type=int, default=100,
+                        help='Distinct comment authors per post')
+    parser.add_argument('--missing-authors', type=float, default=0.1,
+                        help='Share of authors the spider looks up')
+    parser.add_argument('--paragraphs', type=int, default=20,
+                        help='Paragraphs per post')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Mean response delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests answered with a 500')
+    parser.add_argument('--burst-every', type=float, default=0.0,
+                        help='Seconds between two 429 bursts')
+    parser.add_argument('--burst-length', type=float, default=0.0,
+                        help='Seconds of each 429 burst')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Execute."""
+    from twisted.internet import reactor
+
+    args = vars(process_command())
+    host, port = args.pop('host'), args.pop('port')
+    mock = MockMedium(**args)
+    reactor.listenTCP(port, server.Site(mock), interface=host)
+    print(f'mock medium on http://{host}:{port}, '
+          f'writers writer0..writer{len(mock.writers) - 1}')
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Synthetic medium payloads."""
+import json
+import random
+from typing import Optional
+
+PREFIX = '])}while(1);</x>'
+
+DAY_MS = 86400 * 1000
+
+
+def dump(obj: dict) -> bytes:
+    """Serialize a payload the way medium does.
+
+    Args:
+        obj (dict): payload
+
+    Returns:
+        bytes: `])}while(1);</x>`-prefixed json
+    """
+    return (PREFIX + json.dumps(obj)).encode()
+
+
+def user(user_id: str, username: Optional[str] = None) -> dict:
+    """Build a `references.User` entry."""
+    username = username or f'user_{user_id}'
+    return {'userId': user_id, 'username': username,
+            'name': username.replace('_', ' ').title()}
+
+
+def updated_at(post_id: str, page_size: int, newest_ms: int) -> int:
+    """Get the `updatedAt` of a post listed by `profile`.
+
+    Args:
+        post_id (str): post id built by `profile`
+        page_size (int): posts per profile page
+        newest_ms (int): `updatedAt` of the first post
+
+    Returns:
+        int: `updatedAt` (ms), one day older per post, `newest_ms` for ids
+             not built by `profile`
+    """
+    if not post_id[-6:].isdigit():
+        return newest_ms
+    page, i = int(post_id[-6:-3]), int(post_id[-3:])
+    return newest_ms - (i + (page - 1) * page_size) * DAY_MS
+
+
+def paragraphs(n: int, rng: random.Random) -> list:
+    """Build `bodyModel.paragraphs` of random words."""
+    words = ['crawler', 'medium', 'scrapy', 'python', 'data', 'json', 'post']
+    return [
+        {'text': ' '.join(rng.choices(words, k=rng.randint(5, 40)))}
+        for _ in range(n)
+    ]
+
+
+def profile(
+    user_id: str,
+    username: str,
+    n_posts: int,
+    newest_ms: int,
+    page: int = 1,
+    has_next: bool = True
+) -> dict:
+    """Build a profile page payload (`/@user?format=json`).
+
+    Posts are one day apart, newest first. `paging.path` is an absolute
+    medium.com url, as medium returns it.
+
+    Args:
+        user_id (str): writer's user id
+        username (str): writer's profile page name
+        n_posts (int): number of posts on the page
+        newest_ms (int): `updatedAt` of the first post
+        page (int): page number
+        has_next (bool): add `paging.next`
+
+    Returns:
+        dict: payload
+    """
+    posts = {}
+    for i in range(n_posts):
+        post_id = f'{user_id[:6]}{page:03d}{i:03d}'
+        posts[post_id] = {
+            'id': post_id,
+            'creatorId': user_id,
+            'updatedAt': updated_at(post_id, n_posts, newest_ms),
+        }
+    paging = {
+        'path': f'https://medium.com/_/api/users/{user_id}/profile/stream'
+    }
+    if has_next:
+        paging['next'] = {'limit': n_posts, 'page': page + 1,
+                          'to': str(newest_ms - page * n_posts * DAY_MS)}
+    return {'success': True, 'payload': {
+        'user': user(user_id, username),
+        'references': {'Post': posts,
+                       'User': {user_id: user(user_id, username)}},
+        'paging': paging,
+    }}
+
+
+def post(
+    post_id: str,
+    user_id: str,
+    username: str,
+    n_paragraphs: int,
+    comment_count: int,
+    seed: int = 0,
+    updated_at: int = 1583020800000
+) -> dict:
+    """Build a post payload (`/{user}/{post}?format=json`).
+
+    Args:
+        post_id (str): post id
+        user_id (str): writer's user id
+        username (str): writer's profile page name
+        n_paragraphs (int): number of paragraphs of the article
+        comment_count (int): `responsesCreatedCount`
+        seed (int): random seed
+        updated_at (int): `updatedAt` (ms), as listed by `profile`
+
+    Returns:
+        dict: payload
+    """
+    rng = random.Random(seed)
+    return {'success': True, 'payload': {
+        'value': {
+            'id': post_id,
+            'creatorId': user_id,
+            'title': f'Post {post_id}',
+            'mediumUrl': f'https://medium.com/@{username}/{post_id}',
+            'createdAt': 1583020800000,
+            'updatedAt': updated_at,
+            'content': {'bodyModel': {
+                'paragraphs': paragraphs(n_paragraphs, rng)
+            }},
+            'virtuals': {
+                'responsesCreatedCount': comment_count,
+                'totalClapCount': rng.randint(0, 10000),
+                'tags': [{'name': t} for t in ('python', 'scrapy', 'data')],
+            },
+        },
+        'references': {'User': {user_id: user(user_id, username)}},
+    }}
+
+
+def responses(
+    post_id: str,
+    n_comments: int,
+    n_authors: int,
+    missing_authors: float = 0.0,
+    page: int = 1,
+    has_next: bool = False,
+    seed: int = 0
+) -> dict:
+    """Build a `responsesStream` payload.
+
+    Args:
+        post_id (str): commented post id
+        n_comments (int): number of comments on the page
+        n_authors (int): number of distinct comment authors
+        missing_authors (float): share of authors left out of
+                                 `references.User`
+        page (int): page number
+        has_next (bool): add `paging.next`
+        seed (int): random seed
+
+    Returns:
+        dict: payload
+    """
+    rng = random.Random(seed)
+    author_ids = [f'{i:012x}' for i in range(n_authors)]
+    posts = {post_id: {'id': post_id}}
+    for i in range(n_comments):
+        comment_id = f'c{post_id}{page:04d}{i:07d}'
+        posts[comment_id] = {
+            'id': comment_id,
+            'creatorId': rng.choice(author_ids),
+            'createdAt': 1583020800000 + i * 1000,
+            'previewContent2': {'bodyModel': {
+                'paragraphs': paragraphs(rng.randint(1, 4), rng)
+            }},
+            'virtuals': {'responsesCreatedCount': rng.randint(0, 3),
+                         'totalClapCount': rng.randint(0, 50)},
+        }
+    known = author_ids[int(len(author_ids) * missing_authors):]
+    paging = {'path': f'/_/api/posts/{post_id}/responsesStream'}
+    if has_next:
+        paging['next'] = {'limit': n_comments, 'to': str(page * n_comments)}
+    return {'success': True, 'payload': {
+        'references': {'Post': posts,
+                       'User': {a: user(a) for a in known}},
+        'paging': paging,
+    }}
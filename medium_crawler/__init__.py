@@ -1,37 +1,56 @@
-import copy
-
-import scrapy.utils.log
-from colorlog import ColoredFormatter
+import functools
+import logging
 
 __version_info__ = (0, 0, 7)
 __version__ = '.'.join(str(_) for _ in __version_info__)
 
 
-# colorize different log levels
-color_formatter = ColoredFormatter(
-    (
-        '%(log_color)s%(levelname)-5s%(reset)s '
-        '%(yellow)s[%(asctime)s]%(reset)s'
-        '%(white)s %(name)s %(funcName)s '
-        '%(bold_purple)s:%(lineno)d%(reset)s '
-        '%(log_color)s%(message)s%(reset)s'
-    ),
-    datefmt='%y-%m-%d %H:%M:%S',
-    log_colors={
-        'DEBUG': 'blue',
-        'INFO': 'bold_cyan',
-        'WARNING': 'red',
-        'ERROR': 'bg_bold_red',
-        'CRITICAL': 'red,bg_white',
-    }
-)
-_get_handler = copy.copy(scrapy.utils.log._get_handler)
-
-
-def _get_handler_custom(*args, **kwargs):
-    handler = _get_handler(*args, **kwargs)
-    handler.setFormatter(color_formatter)
-    return handler
-
-
-scrapy.utils.log._get_handler = _get_handler_custom
+@functools.lru_cache(maxsize=None)
+def get_color_formatter() -> logging.Formatter:
+    """Get the formatter colorizing the different log levels."""
+    from colorlog import ColoredFormatter
+    return ColoredFormatter(
+        (
+            '%(log_color)s%(levelname)-5s%(reset)s '
+            '%(yellow)s[%(asctime)s]%(reset)s'
+            '%(white)s %(name)s %(funcName)s '
+            '%(bold_purple)s:%(lineno)d%(reset)s '
+            '%(log_color)s%(message)s%(reset)s'
+        ),
+        datefmt='%y-%m-%d %H:%M:%S',
+        log_colors={
+            'DEBUG': 'blue',
+            'INFO': 'bold_cyan',
+            'WARNING': 'red',
+            'ERROR': 'bg_bold_red',
+            'CRITICAL': 'red,bg_white',
+        }
+    )
+
+
+def install_color_logging() -> None:
+    """Colorize the log handler scrapy creates in `configure_logging`.
+
+    Must be called before logging is configured, e.g. by setting the
+    `COLOR_LOGS` environment variable, which `settings` reads.
+    """
+    import scrapy.utils.log
+    get_handler = scrapy.utils.log._get_handler
+    if getattr(get_handler, 'colored', False):
+        return
+
+    @functools.wraps(get_handler)
+    def _get_handler_custom(*args, **kwargs):
+        handler = get_handler(*args, **kwargs)
+        handler.setFormatter(get_color_formatter())
+        return handler
+
+    _get_handler_custom.colored = True
+    scrapy.utils.log._get_handler = _get_handler_custom
+
+
+def __getattr__(name: str) -> object:
+    """Build `color_formatter` on first access."""
+    if name == 'color_formatter':
+        return get_color_formatter()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,387 @@
+"""Comment author resolution."""
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import sessionmaker
+
+from . import items
+from .models import UserProfile, create_new_table
+
+
+class ProfileStore:
+    """On-disk cache of medium user profiles shared across runs.
+
+    Profiles older than `ttl` seconds are ignored and evicted, and the
+    table is trimmed to the `max_entries` most recently used rows. Fresh
+    profiles are read in one query on the first lookup and answered from
+    memory afterwards, misses included, so lookups never query the
+    database from the reactor thread. Writes are buffered in memory until
+    `flush` is called.
+    """
+
+    def __init__(
+        self,
+        engine: object,
+        ttl: float = 86400,
+        max_entries: int = 100000
+    ) -> None:
+        """Set database engine and eviction policy.
+
+        Args:
+            engine (object): sqlalchemy engine, see `models.db_connect`
+            ttl (float): seconds before a cached profile expires
+            max_entries (int): maximum number of cached profiles
+        """
+        create_new_table(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._dirty: Dict[str, dict] = {}
+        self._dirty_usernames: Dict[str, str] = {}
+        self._touched: Set[str] = set()
+        # user id to username, name and fetch time, None until `load`
+        self._profiles: Optional[
+            Dict[str, Tuple[Optional[str], Optional[str], float]]
+        ] = None
+        self._usernames: Dict[str, str] = {}
+
+    def load(self) -> None:
+        """Read every fresh profile in one query."""
+        session = self.Session()
+        try:
+            rows = (
+                session.query(UserProfile.user_id, UserProfile.username,
+                              UserProfile.name, UserProfile.fetched_at)
+                .filter(UserProfile.fetched_at >= time.time() - self.ttl)
+                .order_by(UserProfile.fetched_at)
+                .all()
+            )
+        finally:
+            session.close()
+        self._profiles = {}
+        self._usernames = {}
+        for user_id, username, name, fetched_at in rows:
+            self._remember(user_id, username, name, fetched_at)
+
+    def _remember(
+        self,
+        user_id: str,
+        username: Optional[str],
+        name: Optional[str],
+        fetched_at: float
+    ) -> None:
+        self._profiles[user_id] = (username, name, fetched_at)
+        if username is not None:
+            self._usernames[username] = user_id
+
+    def _fresh(self, user_id: str) -> Optional[dict]:
+        if self._profiles is None:
+            self.load()
+        profile = self._profiles.get(user_id)
+        if profile is None or profile[2] < time.time() - self.ttl:
+            return None
+        self._touched.add(user_id)
+        return {'user_id': user_id,
+                'username': profile[0],
+                'name': profile[1]}
+
+    def get(self, user_id: str) -> Optional[dict]:
+        """Get a cached profile by user id.
+
+        Args:
+            user_id (str): medium user id
+
+        Returns:
+            Optional[dict]: `user_id`, `username` and `name` of the user
+        """
+        if user_id in self._dirty:
+            return self._dirty[user_id]
+        return self._fresh(user_id)
+
+    def get_by_username(self, username: str) -> Optional[dict]:
+        """Get a cached profile by username.
+
+        Args:
+            username (str): writer's profile page name
+
+        Returns:
+            Optional[dict]: `user_id`, `username` and `name` of the user
+        """
+        if username in self._dirty_usernames:
+            return self._dirty[self._dirty_usernames[username]]
+        if self._profiles is None:
+            self.load()
+        user_id = self._usernames.get(username)
+        return self._fresh(user_id) if user_id is not None else None
+
+    def put(
+        self,
+        user_id: str,
+        username: Optional[str] = None,
+        name: Optional[str] = None
+    ) -> None:
+        """Buffer a profile to be written on the next `flush`.
+
+        Args:
+            user_id (str): medium user id
+            username (Optional[str]): writer's profile page name
+            name (Optional[str]): display name
+        """
+        profile = self._dirty.setdefault(
+            user_id, {'user_id': user_id, 'username': None, 'name': None}
+        )
+        if username is not None:
+            profile['username'] = username
+            self._dirty_usernames[username] = user_id
+        if name is not None:
+            profile['name'] = name
+
+    def flush(self) -> None:
+        """Write buffered profiles and access times in one transaction."""
+        if not self._dirty and not self._touched:
+            return
+        now = time.time()
+        session = self.Session()
+        try:
+            for profile in self._dirty.values():
+                session.merge(UserProfile(
+                    fetched_at=now, accessed_at=now, **profile
+                ))
+            touched = self._touched.difference(self._dirty)
+            if touched:
+                (
+                    session.query(UserProfile)
+                    .filter(UserProfile.user_id.in_(touched))
+                    .update({'accessed_at': now}, synchronize_session=False)
+                )
+            session.commit()
+        finally:
+            session.close()
+        if self._profiles is not None:
+            for profile in self._dirty.values():
+                self._remember(fetched_at=now, **profile)
+        self._dirty.clear()
+        self._dirty_usernames.clear()
+        self._touched.clear()
+
+    def evict(self) -> int:
+        """Delete expired profiles and trim least recently used ones.
+
+        Returns:
+            int: number of deleted profiles
+        """
+        session = self.Session()
+        try:
+            deleted = (
+                session.query(UserProfile)
+                .filter(UserProfile.fetched_at < time.time() - self.ttl)
+                .delete(synchronize_session=False)
+            )
+            overflow = session.query(UserProfile).count() - self.max_entries
+            if overflow > 0:
+                lru = (
+                    session.query(UserProfile.user_id)
+                    .order_by(UserProfile.accessed_at)
+                    .limit(overflow)
+                    .subquery()
+                )
+                deleted += (
+                    session.query(UserProfile)
+                    .filter(UserProfile.user_id.in_(lru))
+                    .delete(synchronize_session=False)
+                )
+            session.commit()
+        finally:
+            session.close()
+        # read the remaining profiles again on the next lookup
+        self._profiles = None
+        return deleted
+
+    def close(self) -> None:
+        """Flush buffered writes and evict stale profiles."""
+        self.flush()
+        deleted = self.evict()
+        logging.debug(f'Evicted {deleted} cached profiles.')
+
+
+class AuthorCache:
+    """In-process map of Medium user id to display name."""
+
+    def __init__(self, store: Optional[ProfileStore] = None) -> None:
+        """Create an empty cache.
+
+        Args:
+            store (Optional[ProfileStore]): on-disk cache to read through
+                                            and write to
+        """
+        self._names: Dict[str, str] = {}
+        self.store = store
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, user_id: str) -> Optional[str]:
+        """Get the display name of a user.
+
+        Args:
+            user_id (str): medium user id
+
+        Returns:
+            Optional[str]: display name, or None if the user is unknown
+        """
+        name = self._names.get(user_id)
+        if name is None and self.store is not None:
+            profile = self.store.get(user_id)
+            if profile and profile['name'] is not None:
+                name = self._names[user_id] = profile['name']
+        return name
+
+    def update(self, users: Optional[dict]) -> List[str]:
+        """Learn names from a `references.User` map.
+
+        Args:
+            users (Optional[dict]): `references.User` of a medium payload
+
+        Returns:
+            List[str]: user ids added or changed by this update
+        """
+        learned = []
+        for user_id, user in (users or {}).items():
+            name = user.get('name')
+            if self.store is not None and user_id not in self._names:
+                self.store.put(user_id, user.get('username'), name)
+            if name is not None and self._names.get(user_id) != name:
+                self._names[user_id] = name
+                learned.append(user_id)
+        return learned
+
+
+class AuthorResolver:
+    """Fill `author` of comment items without one request per comment.
+
+    Names are taken from the `references.User` map of each payload first.
+    Comments whose author is still unknown are parked until a single lookup
+    for that author id comes back, so each missing author is fetched once
+    no matter how many comments they wrote. A parked comment may carry the
+    origin of the response it was read from, counted in `parked` until
+    `pop_origin` takes it back, see `ResumeMiddleware`.
+    """
+
+    def __init__(self, cache: Optional[AuthorCache] = None) -> None:
+        """Set author cache.
+
+        Args:
+            cache (Optional[AuthorCache]): cache shared by all posts of a crawl
+        """
+        self.cache = cache if cache is not None else AuthorCache()
+        self._pending: Dict[str, List[items.ArticleItem]] = defaultdict(list)
+        self._origins: Dict[int, Hashable] = {}
+        self.parked: Counter = Counter()
+
+    def learn(self, users: Optional[dict]) -> List[items.ArticleItem]:
+        """Update the cache and release comments waiting on learned users.
+
+        Args:
+            users (Optional[dict]): `references.User` of a medium payload
+
+        Returns:
+            List[items.ArticleItem]: comment items whose author became known
+        """
+        released = []
+        for user_id in self.cache.update(users):
+            released.extend(self.release(user_id))
+        return released
+
+    def resolve(self, record: items.ArticleItem) -> bool:
+        """Set the comment author from the cache.
+
+        Args:
+            record (items.ArticleItem): comment item
+
+        Returns:
+            bool: True if the author was found in the cache
+        """
+        name = self.cache.get(record['author_id'])
+        if name is None:
+            return False
+        record['author'] = name
+        return True
+
+    def defer(
+        self,
+        record: items.ArticleItem,
+        origin: Optional[Hashable] = None
+    ) -> bool:
+        """Park a comment until its author is known.
+
+        Args:
+            record (items.ArticleItem): comment item
+            origin (Optional[Hashable]): what the comment was read from
+
+        Returns:
+            bool: True if no lookup for this author is in flight yet
+        """
+        author_id = record['author_id']
+        first = author_id not in self._pending
+        self._pending[author_id].append(record)
+        if origin is not None:
+            self._origins[id(record)] = origin
+            self.parked[origin] += 1
+        return first
+
+    def pop_origin(self, record: items.ArticleItem) -> Optional[Hashable]:
+        """Take back the origin of a released comment.
+
+        Args:
+            record (items.ArticleItem): comment item
+
+        Returns:
+            Optional[Hashable]: origin given to `defer`, None if there was
+                                none
+        """
+        origin = self._origins.pop(id(record), None)
+        if origin is not None:
+            self.parked[origin] -= 1
+            if self.parked[origin] <= 0:
+                del self.parked[origin]
+        return origin
+
+    def release(self, author_id: str) -> Iterator[items.ArticleItem]:
+        """Emit the comments parked for an author.
+
+        Comments are released with the cached name, or with `author`
+        left unset if the lookup failed.
+
+        Args:
+            author_id (str): medium user id
+
+        Yields:
+            items.ArticleItem: comment items
+        """
+        name = self.cache.get(author_id)
+        for record in self._pending.pop(author_id, []):
+            if name is not None:
+                record['author'] = name
+            yield record
+
+    def waiting(self) -> Dict[str, str]:
+        """Get the authors whose comments are parked.
+
+        Returns:
+            Dict[str, str]: medium user id to the link of its first parked
+                            comment
+        """
+        return {
+            author_id: records[0]['link']
+            for author_id, records in self._pending.items()
+        }
+
+    @property
+    def pending(self) -> int:
+        """Number of comments waiting on an author lookup."""
+        return sum(len(v) for v in self._pending.values())
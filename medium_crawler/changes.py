@@ -0,0 +1,137 @@
+"""Content fingerprints of exported items, to detect changes between runs."""
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from scrapy.exceptions import DropItem
+from sqlalchemy import (BigInteger, Column, Integer, MetaData, Table, Text,
+                        create_engine, select)
+
+from . import items
+
+metadata = MetaData()
+
+content_index = Table(
+    'content_index', metadata,
+    Column('link', Text, primary_key=True),
+    Column('fingerprint', BigInteger),
+    Column('comment_count', Integer),
+    Column('like_count', Integer),
+)
+
+# fields whose change makes an item worth emitting again in full
+CONTENT_FIELDS = ('uid', 'author', 'author_id', 'poster', 'title', 'content',
+                  'created_time', 'article_type', 'tag')
+
+NEW, CHANGED, COUNTERS, UNCHANGED = 'new', 'changed', 'counters', 'unchanged'
+
+
+class UnchangedItem(DropItem):
+    """Item identical to the one exported by a previous run."""
+
+
+def content_fingerprint(item: items.ArticleItem) -> int:
+    """Get the 64-bit fingerprint of the content of an item.
+
+    Args:
+        item (items.ArticleItem): ArticleItem object
+
+    Returns:
+        int: signed first 8 bytes of the blake2b of `CONTENT_FIELDS`
+    """
+    data = json.dumps(
+        [item.get(name) for name in CONTENT_FIELDS],
+        default=str, ensure_ascii=False, separators=(',', ':')
+    )
+    digest = hashlib.blake2b(data.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class ContentIndex:
+    """Fingerprint and counters of every exported link, in SQLite.
+
+    A row takes a few dozen bytes besides the link, so the index holds
+    millions of links. Writes are buffered and applied in one transaction
+    every `flush_size` items and by `flush`; a crash only loses the
+    buffer, whose items are emitted again by the next run.
+    """
+
+    def __init__(self, path: str, flush_size: int = 1000) -> None:
+        """Open or create the index.
+
+        Args:
+            path (str): SQLite file
+            flush_size (int): buffered rows that trigger a flush
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.engine = create_engine(f'sqlite:///{path}')
+        metadata.create_all(self.engine)
+        self.flush_size = flush_size
+        self._pending: Dict[str, dict] = {}
+
+    def get(self, link: str) -> Optional[Tuple[int, int, int]]:
+        """Get the fingerprint and counters of a link.
+
+        Args:
+            link (str): item link
+
+        Returns:
+            Optional[Tuple[int, int, int]]: fingerprint, comment count and
+                                            like count, None if unknown
+        """
+        row = self._pending.get(link)
+        if row is not None:
+            return row['fingerprint'], row['comment_count'], row['like_count']
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select([content_index.c.fingerprint,
+                        content_index.c.comment_count,
+                        content_index.c.like_count])
+                .where(content_index.c.link == link)
+            ).first()
+        return tuple(row) if row else None
+
+    def check(self, item: items.ArticleItem) -> str:
+        """Compare an item with its previous version and record it.
+
+        Args:
+            item (items.ArticleItem): ArticleItem object
+
+        Returns:
+            str: `NEW`, `CHANGED` content, `COUNTERS` only or `UNCHANGED`
+        """
+        link = item['link']
+        row = {
+            'link': link,
+            'fingerprint': content_fingerprint(item),
+            'comment_count': item.get('comment_count') or 0,
+            'like_count': item.get('like_count') or 0,
+        }
+        previous = self.get(link)
+        current = (row['fingerprint'], row['comment_count'], row['like_count'])
+        if previous is None:
+            status = NEW
+        elif current == previous:
+            return UNCHANGED
+        elif current[0] != previous[0]:
+            status = CHANGED
+        else:
+            status = COUNTERS
+        self._pending[link] = row
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+        return status
+
+    def flush(self) -> None:
+        """Write the buffered rows in one transaction."""
+        if not self._pending:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                content_index.insert().prefix_with('OR REPLACE'),
+                list(self._pending.values())
+            )
+        self._pending = {}
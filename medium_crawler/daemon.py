@@ -0,0 +1,206 @@
+"""Long-running crawl of the rules in the `rule` table."""
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from scrapy.crawler import Crawler, CrawlerRunner
+from scrapy.utils.defer import deferred_from_coro
+from twisted.internet import defer, task, threads
+
+logger = logging.getLogger(__name__)
+
+# rule columns passed to the spider, a change restarts the crawl
+RULE_FIELDS = ('username', 'date', 'back', 'url', 'source')
+
+
+def rule_signature(rule: object) -> Tuple:
+    """Get the spider arguments of a rule.
+
+    Args:
+        rule (object): `models.Rule` row
+
+    Returns:
+        Tuple: values of `RULE_FIELDS`
+    """
+    return tuple(getattr(rule, name) for name in RULE_FIELDS)
+
+
+def stop_crawler(crawler: Crawler) -> defer.Deferred:
+    """Start a graceful stop of a crawler.
+
+    Args:
+        crawler (Crawler): running crawler
+
+    Returns:
+        defer.Deferred: fired when the crawler is stopped
+    """
+    if hasattr(crawler, 'stop_async'):
+        return deferred_from_coro(crawler.stop_async())
+    return crawler.stop()
+
+
+class RuleDaemon:
+    """Crawl the enabled rules on a running `CrawlerRunner`.
+
+    The rules are loaded every `interval` seconds in a thread. A new rule
+    is queued, a disabled or deleted rule is stopped, and a changed rule
+    is stopped and queued again with its new arguments. A rule that
+    finished is crawled again only once it changes. At most
+    `max_crawlers` crawlers run at the same time, queued rules start in
+    id order as slots free up.
+    """
+
+    def __init__(
+        self,
+        runner: CrawlerRunner,
+        spider_name: str,
+        load_rules: Callable[[], List[object]],
+        interval: float = 30,
+        max_crawlers: int = 4,
+        crawl_kwargs: Optional[dict] = None
+    ) -> None:
+        """Set runner, rule source and limits.
+
+        Args:
+            runner (CrawlerRunner): runner the crawlers are started on
+            spider_name (str): scrapy spider name
+            load_rules (Callable[[], List[object]]): blocking function
+                returning the enabled `models.Rule` rows
+            interval (float): seconds between two rule loads
+            max_crawlers (int): maximum number of concurrent crawlers
+            crawl_kwargs (Optional[dict]): other spider arguments
+        """
+        self.runner = runner
+        self.spider_name = spider_name
+        self.load_rules = load_rules
+        self.interval = interval
+        self.max_crawlers = max_crawlers
+        self.crawl_kwargs = crawl_kwargs or {}
+        self.queued: 'OrderedDict[int, object]' = OrderedDict()
+        self.running: Dict[int, Tuple[Crawler, Tuple]] = {}
+        self.finished: Dict[int, Tuple] = {}
+        self.stopping: Set[int] = set()
+        self.loop: Optional[task.LoopingCall] = None
+
+    def start(self) -> defer.Deferred:
+        """Start polling the rules.
+
+        Returns:
+            defer.Deferred: fired when `stop` was called
+        """
+        self.loop = task.LoopingCall(self.poll)
+        return self.loop.start(self.interval, now=True)
+
+    def stop(self) -> defer.Deferred:
+        """Stop polling and every running crawler.
+
+        Returns:
+            defer.Deferred: fired when the crawlers are stopped
+        """
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self.queued.clear()
+        self.stopping.update(self.running)
+        return defer.DeferredList([
+            stop_crawler(crawler)
+            for crawler, _ in list(self.running.values())
+        ])
+
+    def poll(self) -> defer.Deferred:
+        """Load the rules in a thread and apply them.
+
+        Returns:
+            defer.Deferred: fired when the rules are applied
+        """
+        d = threads.deferToThread(self.load_rules)
+        d.addCallback(self.reconcile)
+        d.addErrback(
+            lambda failure: logger.error(f'cannot load rules: {failure.value}')
+        )
+        return d
+
+    def reconcile(self, rules: List[object]) -> None:
+        """Queue, restart or stop crawlers to match the enabled rules.
+
+        Args:
+            rules (List[object]): enabled `models.Rule` rows
+        """
+        enabled = {rule.id: rule for rule in rules}
+        for rule_id in list(self.queued):
+            if rule_id not in enabled:
+                del self.queued[rule_id]
+        for rule_id in list(self.finished):
+            if rule_id not in enabled:
+                del self.finished[rule_id]
+        for rule_id, (_, signature) in list(self.running.items()):
+            rule = enabled.get(rule_id)
+            if rule is None or rule_signature(rule) != signature:
+                self.cancel(rule_id)
+        for rule_id in sorted(enabled):
+            rule = enabled[rule_id]
+            signature = rule_signature(rule)
+            running = self.running.get(rule_id)
+            if (running and running[1] == signature
+                    and rule_id not in self.stopping):
+                self.queued.pop(rule_id, None)
+                continue
+            if self.finished.get(rule_id) == signature:
+                continue
+            if rule_id not in self.queued:
+                logger.info(f'rule {rule_id} queued.')
+            self.queued[rule_id] = rule
+        self.schedule()
+
+    def cancel(self, rule_id: int) -> None:
+        """Stop the crawler of a rule."""
+        if rule_id in self.stopping:
+            return
+        logger.info(f'rule {rule_id} changed or disabled, stopping.')
+        self.stopping.add(rule_id)
+        crawler, _ = self.running[rule_id]
+        stop_crawler(crawler)
+
+    def schedule(self) -> None:
+        """Start queued rules while there are free slots.
+
+        A changed rule waits for its previous crawler to stop.
+        """
+        for rule_id in list(self.queued):
+            if len(self.running) >= self.max_crawlers:
+                break
+            if rule_id not in self.running:
+                self.crawl(self.queued.pop(rule_id))
+
+    def crawl(self, rule: object) -> None:
+        """Start a crawler for a rule.
+
+        Args:
+            rule (object): `models.Rule` row
+        """
+        crawler = self.runner.create_crawler(self.spider_name)
+        signature = rule_signature(rule)
+        self.finished.pop(rule.id, None)
+        self.running[rule.id] = (crawler, signature)
+        logger.info(f'rule {rule.id} started.')
+        d = self.runner.crawl(crawler, rule=rule, **self.crawl_kwargs)
+        d.addErrback(
+            lambda failure: logger.error(
+                f'rule {rule.id} failed: {failure.value}'
+            )
+        )
+        d.addBoth(lambda _: self.crawled(rule.id, signature))
+
+    def crawled(self, rule_id: int, signature: Tuple) -> None:
+        """Free the slot of a crawler and start the next queued rule.
+
+        Args:
+            rule_id (int): rule id
+            signature (Tuple): spider arguments the crawler ran with
+        """
+        self.running.pop(rule_id, None)
+        if rule_id in self.stopping:
+            self.stopping.discard(rule_id)
+        else:
+            self.finished[rule_id] = signature
+        logger.info(f'rule {rule_id} done.')
+        self.schedule()
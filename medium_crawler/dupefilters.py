@@ -0,0 +1,295 @@
+"""Process-wide request deduplication."""
+import bisect
+import hashlib
+import heapq
+import logging
+import os
+from array import array
+from typing import Dict, Iterable, Optional
+
+import scrapy
+from w3lib.url import canonicalize_url
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(request: scrapy.Request) -> int:
+    """Get the 64-bit fingerprint of a request.
+
+    Args:
+        request (scrapy.Request): scrapy request object
+
+    Returns:
+        int: first 8 bytes of the sha1 of method, canonical url and body
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(request.method.encode())
+    sha1.update(canonicalize_url(request.url).encode())
+    sha1.update(request.body or b'')
+    return int.from_bytes(sha1.digest()[:8], 'big')
+
+
+class FingerprintIndex:
+    """Exact set of 64-bit fingerprints stored in a sorted array.
+
+    New fingerprints go to a small buffer set which is merged into the
+    sorted array once it grows past a fraction of it, so the index costs
+    about 8 bytes per fingerprint.
+    """
+
+    MIN_BUFFER = 65536
+
+    def __init__(self, fingerprints: Iterable[int] = ()) -> None:
+        """Create an index.
+
+        Args:
+            fingerprints (Iterable[int]): initial fingerprints
+        """
+        self._sorted = array('Q', sorted(set(fingerprints)))
+        self._buffer = set()
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._buffer)
+
+    def __contains__(self, fp: int) -> bool:
+        if fp in self._buffer:
+            return True
+        i = bisect.bisect_left(self._sorted, fp)
+        return i < len(self._sorted) and self._sorted[i] == fp
+
+    def add(self, fp: int) -> bool:
+        """Add a fingerprint.
+
+        Args:
+            fp (int): 64-bit fingerprint
+
+        Returns:
+            bool: True if the fingerprint was not in the index
+        """
+        if fp in self:
+            return False
+        self._buffer.add(fp)
+        if len(self._buffer) > max(self.MIN_BUFFER, len(self._sorted) // 8):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Merge the buffer into the sorted array."""
+        if self._buffer:
+            self._sorted = array(
+                'Q', heapq.merge(self._sorted, sorted(self._buffer))
+            )
+            self._buffer = set()
+
+    def save(self, path: str) -> None:
+        """Write the index to a file.
+
+        Args:
+            path (str): file path
+        """
+        self.compact()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            self._sorted.tofile(f)
+        os.replace(tmp_path, path)
+
+    def update(self, other: 'FingerprintIndex') -> None:
+        """Add the fingerprints of another index.
+
+        Args:
+            other (FingerprintIndex): index to merge
+        """
+        self.compact()
+        other.compact()
+        merged = array('Q')
+        last = None
+        for fp in heapq.merge(self._sorted, other._sorted):
+            if fp != last:
+                merged.append(fp)
+                last = fp
+        self._sorted = merged
+
+    def merge_save(self, path: str) -> None:
+        """Add the index to the file, keeping what other processes saved.
+
+        Worker processes of `run.py --workers` save to the same path; the
+        file is read and replaced under an exclusive lock so that no
+        worker overwrites the fingerprints of another.
+
+        Args:
+            path (str): file path
+        """
+        with open(f'{path}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self.update(FingerprintIndex.load(path))
+            self.save(path)
+
+    @classmethod
+    def load(cls, path: str) -> 'FingerprintIndex':
+        """Read an index written by `save`.
+
+        Args:
+            path (str): file path
+
+        Returns:
+            FingerprintIndex: loaded index, empty if the file does not exist
+        """
+        index = cls()
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                index._sorted.frombytes(f.read())
+        return index
+
+
+class SharedIndex:
+    """Fingerprint indexes shared by every crawler of the process.
+
+    Requests handled by a volatile callback (profile pagination) are only
+    deduplicated while crawlers share the index; the others are also
+    saved to `path` when the last crawler using it closes, merged with
+    what other processes saved.
+    """
+
+    _instances: Dict[Optional[str], 'SharedIndex'] = {}
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Load the persisted index.
+
+        Args:
+            path (Optional[str]): file the index is persisted to
+        """
+        self.path = path
+        self.persistent = (
+            FingerprintIndex.load(path) if path else FingerprintIndex()
+        )
+        self.volatile = FingerprintIndex()
+        self.users = 0
+
+    @classmethod
+    def get(cls, path: Optional[str] = None) -> 'SharedIndex':
+        """Get the process-wide index of a path.
+
+        Args:
+            path (Optional[str]): file the index is persisted to
+
+        Returns:
+            SharedIndex: shared index
+        """
+        if path not in cls._instances:
+            cls._instances[path] = cls(path)
+        return cls._instances[path]
+
+    def release(self) -> None:
+        """Save and drop the index once no crawler uses it anymore.
+
+        The next crawler of the process, such as a rule the daemon crawls
+        again, starts from the persisted fingerprints only.
+        """
+        self.users -= 1
+        if self.users > 0:
+            return
+        if self._instances.get(self.path) is self:
+            del self._instances[self.path]
+        if self.path:
+            self.persistent.merge_save(self.path)
+            logger.info(
+                f'Saved {len(self.persistent)} fingerprints to {self.path}'
+            )
+
+
+class SharedDupeFilter:
+    """Request dupefilter backed by the process-wide `SharedIndex`.
+
+    A spider whose `refetch` is true (incremental and refresh crawls) and
+    crawls with `CHANGE_INDEX_PATH` fetch known posts again by design: their
+    requests are recorded in the persisted index but only deduplicated
+    within the process.
+    """
+
+    def __init__(
+        self,
+        index: SharedIndex,
+        volatile_callbacks: Iterable[str] = (),
+        debug: bool = False,
+        stats: object = None
+    ) -> None:
+        """Set shared index.
+
+        Args:
+            index (SharedIndex): process-wide index
+            volatile_callbacks (Iterable[str]): callback names whose
+                                                requests are not persisted
+            debug (bool): log every filtered request
+            stats (object): scrapy stats collector
+        """
+        self.index = index
+        self.volatile_callbacks = set(volatile_callbacks)
+        self.debug = debug
+        self.stats = stats
+        self.logdupes = True
+        self.crawler = None
+        self.refetch = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        dupefilter = cls(
+            index=SharedIndex.get(settings.get('SHARED_DUPEFILTER_PATH')),
+            volatile_callbacks=settings.getlist(
+                'SHARED_DUPEFILTER_VOLATILE_CALLBACKS'
+            ),
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+            stats=crawler.stats
+        )
+        dupefilter.crawler = crawler
+        dupefilter.refetch = bool(settings.get('CHANGE_INDEX_PATH'))
+        return dupefilter
+
+    def request_seen(self, request: scrapy.Request) -> bool:
+        """Check and record a request.
+
+        Args:
+            request (scrapy.Request): scrapy request object
+
+        Returns:
+            bool: True if any crawler of the process already saw it
+        """
+        fp = fingerprint(request)
+        callback = getattr(request.callback, '__name__', None)
+        if callback in self.volatile_callbacks:
+            return not self.index.volatile.add(fp)
+        if self.refetch:
+            self.index.persistent.add(fp)
+            return not self.index.volatile.add(fp)
+        return not self.index.persistent.add(fp)
+
+    def open(self) -> None:
+        """Register the crawler as a user of the shared index."""
+        self.index.users += 1
+        spider = getattr(self.crawler, 'spider', None)
+        if getattr(spider, 'refetch', False):
+            self.refetch = True
+
+    def close(self, reason: str) -> None:
+        """Release the shared index."""
+        self.index.release()
+
+    def log(self, request: scrapy.Request, spider: scrapy.Spider) -> None:
+        """Log a filtered request."""
+        if self.debug:
+            logger.debug(f'Filtered duplicate request: {request}')
+        elif self.logdupes:
+            logger.debug(
+                f'Filtered duplicate request: {request} - no more duplicates '
+                'will be shown (see DUPEFILTER_DEBUG to show all duplicates)'
+            )
+            self.logdupes = False
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
@@ -0,0 +1,241 @@
+"""Scrapy extensions."""
+import bisect
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Sequence, Tuple
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        """Set bucket upper bounds.
+
+        Args:
+            bounds (Sequence[float]): sorted upper bounds, `+Inf` is implied
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of its bucket.
+
+        Args:
+            q (float): quantile between 0 and 1
+
+        Returns:
+            float: bucket upper bound, `inf` for the overflow bucket
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return 0.0
+
+    def prometheus(self, name: str, labels: str) -> str:
+        """Render the histogram in the Prometheus text format.
+
+        Args:
+            name (str): metric name
+            labels (str): rendered labels without braces
+
+        Returns:
+            str: `_bucket`, `_sum` and `_count` samples
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return '\n'.join(lines)
+
+
+class CallbackMetrics:
+    """Per-callback latency and throughput metrics.
+
+    Download latency and payload size come from the `response_received`
+    signal; parse CPU time and yielded items/requests are reported by
+    `middlewares.CallbackMetricsMiddleware`. Metrics are labelled with the
+    callback name and the `Rule` id when the spider runs from `run.py`,
+    logged every `interval` seconds and written to a Prometheus textfile.
+    """
+
+    METRICS = {
+        'download_seconds': ('Download latency.', LATENCY_BUCKETS),
+        'parse_cpu_seconds': ('CPU time spent in the callback.',
+                              LATENCY_BUCKETS),
+        'payload_bytes': ('Response body size.', SIZE_BUCKETS),
+        'items': ('Items yielded per response.', COUNT_BUCKETS),
+        'requests': ('Requests yielded per response.', COUNT_BUCKETS),
+    }
+
+    def __init__(
+        self,
+        interval: float = 60,
+        prometheus_file: Optional[str] = None
+    ) -> None:
+        """Set export options.
+
+        Args:
+            interval (float): seconds between log lines and file exports
+            prometheus_file (Optional[str]): textfile path, may contain
+                                             `{spider}` and `{rule}`
+        """
+        self.interval = interval
+        self.prometheus_file = prometheus_file
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self.responses = defaultdict(int)
+        self.loop = None
+        self.spider = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.getbool('INSTRUMENTATION_ENABLED'):
+            raise NotConfigured
+        ext = cls(
+            interval=settings.getfloat('INSTRUMENTATION_INTERVAL'),
+            prometheus_file=settings.get('INSTRUMENTATION_PROMETHEUS_FILE')
+        )
+        crawler.signals.connect(ext.spider_opened, signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signals.spider_closed)
+        crawler.signals.connect(
+            ext.response_received, signals.response_received
+        )
+        return ext
+
+    @staticmethod
+    def callback_name(request) -> str:
+        """Get the name of the callback of a request."""
+        return getattr(request.callback, '__name__', None) or 'parse'
+
+    def rule(self, spider) -> str:
+        """Get the `Rule` id label of a spider."""
+        rule_id = getattr(spider, 'rule_id', None)
+        return '' if rule_id is None else str(rule_id)
+
+    def observe(
+        self,
+        callback: str,
+        rule: str,
+        metric: str,
+        value: float
+    ) -> None:
+        """Record a value of a metric.
+
+        Args:
+            callback (str): callback name
+            rule (str): `Rule` id, or empty string
+            metric (str): one of `METRICS`
+            value (float): observed value
+        """
+        key = (metric, callback, rule)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(
+                self.METRICS[metric][1]
+            )
+        histogram.observe(value)
+
+    def response_received(self, response, request, spider):
+        """Record download latency and payload size."""
+        callback = self.callback_name(request)
+        rule = self.rule(spider)
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.observe(callback, rule, 'download_seconds', latency)
+        self.observe(callback, rule, 'payload_bytes', len(response.body))
+
+    def spider_opened(self, spider):
+        """Start the periodic export."""
+        self.spider = spider
+        if self.interval > 0:
+            self.loop = task.LoopingCall(self.export)
+            self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        """Stop the periodic export and export once more."""
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self.export()
+
+    def export(self) -> None:
+        """Log a summary line per callback and write the textfile."""
+        for (metric, callback, rule), h in sorted(self.histograms.items()):
+            if metric != 'parse_cpu_seconds':
+                continue
+            download = self.histograms.get(
+                ('download_seconds', callback, rule)
+            )
+            items = self.histograms.get(('items', callback, rule))
+            requests = self.histograms.get(('requests', callback, rule))
+            logger.info(
+                f'callback={callback} rule={rule or "-"} responses={h.count} '
+                f'download_p50<={download.quantile(0.5) if download else 0}s '
+                f'download_p90<={download.quantile(0.9) if download else 0}s '
+                f'parse_cpu_p50<={h.quantile(0.5)}s '
+                f'parse_cpu_p90<={h.quantile(0.9)}s '
+                f'parse_cpu_total={h.sum:.3f}s '
+                f'items={int(items.sum) if items else 0} '
+                f'requests={int(requests.sum) if requests else 0}'
+            )
+        if self.prometheus_file:
+            self.write_prometheus()
+
+    def prometheus(self) -> str:
+        """Render every histogram in the Prometheus text format."""
+        blocks = []
+        for metric, (help_text, _) in self.METRICS.items():
+            name = f'medium_callback_{metric}'
+            samples = [
+                h.prometheus(name, f'callback="{c}",rule="{r}"')
+                for (m, c, r), h in sorted(self.histograms.items())
+                if m == metric
+            ]
+            if samples:
+                blocks.append(f'# HELP {name} {help_text}')
+                blocks.append(f'# TYPE {name} histogram')
+                blocks.extend(samples)
+        return '\n'.join(blocks) + '\n'
+
+    def write_prometheus(self) -> None:
+        """Write the textfile atomically."""
+        path = self.prometheus_file.format(
+            spider=getattr(self.spider, 'name', 'spider'),
+            rule=self.rule(self.spider) or 'all'
+        )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
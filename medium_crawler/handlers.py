@@ -0,0 +1,107 @@
+"""Download handlers."""
+import logging
+import weakref
+from typing import Any, Hashable, Optional
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from twisted.internet import defer
+from twisted.web.client import HTTPConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class MeteredConnectionPool(HTTPConnectionPool):
+    """Keep-alive connection pool counting new and reused connections.
+
+    Connections are keyed by scheme, host, port and proxy, so each proxy
+    of `ProxyMiddleware` gets its own connections to medium.com. An
+    HTTP/1.1 connection carries one request at a time; a connection is
+    retired once it served `max_requests` requests, so that a long crawl
+    does not stick to one edge server. Counters go to the crawler stats
+    under `http_pool/`.
+    """
+
+    def __init__(
+        self,
+        reactor: Any,
+        stats: Optional[Any] = None,
+        max_requests: int = 0
+    ) -> None:
+        """Set stats and request cap.
+
+        Args:
+            reactor (Any): twisted reactor
+            stats (Optional[Any]): scrapy stats collector
+            max_requests (int): requests per connection, 0 for no limit
+        """
+        super().__init__(reactor, persistent=True)
+        self.stats = stats
+        self.max_requests = max_requests
+        self.served = weakref.WeakKeyDictionary()
+        self.new = 0
+        self.reused = 0
+
+    def inc(self, name: str) -> None:
+        """Increment a counter and update the reuse ratio."""
+        if self.stats is None:
+            return
+        self.stats.inc_value(f'http_pool/connections/{name}')
+        total = self.new + self.reused
+        if total:
+            self.stats.set_value('http_pool/reuse_ratio',
+                                 round(self.reused / total, 4))
+
+    def getConnection(self, key: Hashable, endpoint: Any) -> defer.Deferred:
+        """Get a cached connection or open one, see `HTTPConnectionPool`."""
+        new = self.new
+        d = super().getConnection(key, endpoint)
+        if self.new == new:
+            self.reused += 1
+            self.inc('reused')
+        return d
+
+    def _newConnection(self, key: Hashable, endpoint: Any) -> defer.Deferred:
+        self.new += 1
+        self.inc('new')
+        return super()._newConnection(key, endpoint)
+
+    def _putConnection(self, key: Hashable, connection: Any) -> None:
+        served = self.served.get(connection, 0) + 1
+        if self.max_requests and served >= self.max_requests:
+            self.served.pop(connection, None)
+            connection.transport.loseConnection()
+            self.inc('retired')
+            return
+        self.served[connection] = served
+        super()._putConnection(key, connection)
+
+
+class PooledHTTPDownloadHandler(HTTP11DownloadHandler):
+    """HTTP/1.1 handler on a `MeteredConnectionPool`.
+
+    Every request goes to medium.com, either directly or through one of
+    a few proxies, so a handful of keep-alive connections per proxy saves
+    a TCP and TLS handshake on nearly every request.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler: Any) -> 'PooledHTTPDownloadHandler':
+        """Replace the connection pool of scrapy's handler."""
+        from twisted.internet import reactor
+        handler = super().from_crawler(crawler)
+        settings = crawler.settings
+        pool = MeteredConnectionPool(
+            reactor,
+            stats=crawler.stats,
+            max_requests=settings.getint('HTTP_POOL_MAX_REQUESTS')
+        )
+        pool.maxPersistentPerHost = (
+            settings.getint('HTTP_POOL_MAX_PER_HOST')
+            or handler._pool.maxPersistentPerHost
+        )
+        pool.cachedConnectionTimeout = settings.getfloat(
+            'HTTP_POOL_IDLE_TIMEOUT', pool.cachedConnectionTimeout
+        )
+        pool._factory = handler._pool._factory
+        handler._pool = pool
+        return handler
@@ -0,0 +1,254 @@
+"""Durable journal of a resumable crawl."""
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import scrapy
+from sqlalchemy import (BigInteger, Column, Integer, MetaData, Table, Text,
+                        create_engine, func, select)
+
+from . import items
+from .dupefilters import FingerprintIndex
+from .parents import PostRef, PostTable
+
+metadata = MetaData()
+
+job_request = Table(
+    'job_request', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('priority', Integer, index=True),
+    Column('data', Text),
+)
+
+job_item = Table(
+    'job_item', metadata,
+    Column('fingerprint', BigInteger, primary_key=True),
+)
+
+# sent by the pipelines that buffer items before writing them, so that
+# `ResumeMiddleware` only counts an item as emitted once it is stored:
+# `item_buffered` with the `item`, `items_stored` with the `fingerprints`
+# (see `item_fingerprint`) of the items written
+item_buffered = object()
+items_stored = object()
+
+# meta kept in the journal, the others (proxy, download slot, latency...)
+# are set again when the request is sent
+META_KEYS = ('uid', 'user_id', 'post_id', 'post_updated_at', 'comment_page',
+             'comments_seen', 'comment_count', 'comment_to', 'comment_skip',
+             'comment_quiet', 'author_id', 'retry_times')
+
+
+def item_fingerprint(item: items.ArticleItem) -> int:
+    """Get the 64-bit fingerprint of an item.
+
+    Args:
+        item (items.ArticleItem): ArticleItem object
+
+    Returns:
+        int: first 8 bytes of the sha1 of the article type and link
+    """
+    key = f"{item.get('article_type')} {item.get('link')}"
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], 'big')
+
+
+def signed(fp: int) -> int:
+    """Map an unsigned 64-bit fingerprint to a signed database integer."""
+    return fp - (1 << 64) if fp >= (1 << 63) else fp
+
+
+def dump_request(
+    request: scrapy.Request,
+    posts: Optional[PostTable] = None
+) -> str:
+    """Serialize a spider request.
+
+    Only `META_KEYS` are kept, plus the `PostRef` of the commented post,
+    so an entry takes a few hundred bytes.
+
+    Args:
+        request (scrapy.Request): request whose callbacks are spider methods
+        posts (Optional[PostTable]): spider's post table
+
+    Returns:
+        str: compact json
+    """
+    meta = {k: request.meta[k] for k in META_KEYS if k in request.meta}
+    data = {'u': request.url, 'p': request.priority, 'm': meta}
+    ref = posts.get(meta['post_id']) if posts and 'post_id' in meta else None
+    if ref is not None:
+        data['r'] = list(ref)
+    if request.callback:
+        data['c'] = request.callback.__name__
+    if request.errback:
+        data['e'] = request.errback.__name__
+    if request.method != 'GET' or request.body:
+        data['method'] = request.method
+        data['body'] = request.body.decode('latin1')
+    return json.dumps(data, separators=(',', ':'))
+
+
+def load_request(data: str, spider: scrapy.Spider) -> scrapy.Request:
+    """Deserialize a request written by `dump_request`.
+
+    The request skips the dupefilter, which may already have seen it, and
+    its `PostRef` is put back in the spider's post table.
+
+    Args:
+        data (str): compact json
+        spider (scrapy.Spider): spider owning the callbacks
+
+    Returns:
+        scrapy.Request: scrapy request object
+    """
+    obj = json.loads(data)
+    if 'r' in obj and hasattr(spider, 'posts'):
+        spider.posts.put(PostRef(*obj['r']))
+    return scrapy.Request(
+        url=obj['u'],
+        method=obj.get('method', 'GET'),
+        body=obj.get('body', '').encode('latin1'),
+        meta=obj['m'],
+        priority=obj['p'],
+        callback=getattr(spider, obj['c']) if 'c' in obj else None,
+        errback=getattr(spider, obj['e']) if 'e' in obj else None,
+        dont_filter=True
+    )
+
+
+class JobJournal:
+    """Pending requests and emitted items of a crawl, in SQLite.
+
+    Writes are buffered and applied in one transaction by `flush`. A
+    request added and finished between two flushes is never written.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """Open or create the journal of a job.
+
+        Args:
+            directory (str): job directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'journal.db')
+        self.engine = create_engine(f'sqlite:///{self.path}')
+        metadata.create_all(self.engine)
+        with self.engine.connect() as conn:
+            self._next_id = (
+                conn.execute(select([func.max(job_request.c.id)])).scalar()
+                or 0
+            ) + 1
+            self.items = FingerprintIndex(
+                row[0] % (1 << 64)
+                for row in conn.execute(select([job_item.c.fingerprint]))
+            )
+        self._added: Dict[int, dict] = {}
+        self._finished: List[int] = []
+        self._emitted: List[int] = []
+
+    def __len__(self) -> int:
+        """Get the number of pending requests."""
+        with self.engine.connect() as conn:
+            count = conn.execute(
+                select([func.count()]).select_from(job_request)
+            ).scalar()
+        return count + len(self._added) - len(self._finished)
+
+    def add(
+        self,
+        request: scrapy.Request,
+        posts: Optional[PostTable] = None
+    ) -> int:
+        """Record a scheduled request.
+
+        Args:
+            request (scrapy.Request): scrapy request object
+            posts (Optional[PostTable]): spider's post table
+
+        Returns:
+            int: journal id, also stored in `request.meta['job_id']`
+        """
+        job_id = self._next_id
+        self._next_id += 1
+        self._added[job_id] = {
+            'id': job_id,
+            'priority': request.priority,
+            'data': dump_request(request, posts),
+        }
+        request.meta['job_id'] = job_id
+        return job_id
+
+    def finish(self, job_id: int) -> None:
+        """Remove a request whose response was handled.
+
+        Args:
+            job_id (int): journal id
+        """
+        if self._added.pop(job_id, None) is None:
+            self._finished.append(job_id)
+
+    def emit(self, item: items.ArticleItem) -> None:
+        """Record an emitted item."""
+        self.emit_fingerprint(item_fingerprint(item))
+
+    def emit_fingerprint(self, fp: int) -> None:
+        """Record an emitted item by its `item_fingerprint`."""
+        if self.items.add(fp):
+            self._emitted.append(fp)
+
+    def emitted(self, item: items.ArticleItem) -> bool:
+        """Check whether an item was emitted by this job."""
+        return item_fingerprint(item) in self.items
+
+    def pending(self, spider: scrapy.Spider) -> Iterator[scrapy.Request]:
+        """Load the pending requests, highest priority first.
+
+        Args:
+            spider (scrapy.Spider): spider owning the callbacks
+
+        Yields:
+            scrapy.Request: scrapy request object
+        """
+        self.flush()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select([job_request.c.id, job_request.c.data])
+                .order_by(job_request.c.priority.desc(), job_request.c.id)
+            ).fetchall()
+        for job_id, data in rows:
+            request = load_request(data, spider)
+            request.meta['job_id'] = job_id
+            yield request
+
+    def flush(self) -> None:
+        """Write the buffered changes in one transaction."""
+        if not (self._added or self._finished or self._emitted):
+            return
+        with self.engine.begin() as conn:
+            if self._added:
+                conn.execute(job_request.insert(), list(self._added.values()))
+            for i in range(0, len(self._finished), 500):
+                conn.execute(
+                    job_request.delete().where(
+                        job_request.c.id.in_(self._finished[i:i + 500])
+                    )
+                )
+            if self._emitted:
+                conn.execute(
+                    job_item.insert(),
+                    [{'fingerprint': signed(fp)} for fp in self._emitted]
+                )
+        self._added = {}
+        self._finished = []
+        self._emitted = []
+
+    def clear(self) -> None:
+        """Forget the job once it finished, so the next run starts over."""
+        self._added = {}
+        self._finished = []
+        self._emitted = []
+        self.items = FingerprintIndex()
+        with self.engine.begin() as conn:
+            conn.execute(job_request.delete())
+            conn.execute(job_item.delete())
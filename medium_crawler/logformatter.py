@@ -0,0 +1,17 @@
+"""Scrapy log formatter."""
+import logging
+
+from scrapy.logformatter import LogFormatter
+
+from .changes import UnchangedItem
+
+
+class MediumLogFormatter(LogFormatter):
+    """Log unchanged items at debug level, a re-crawl drops most items."""
+
+    def dropped(self, item, exception, response, spider):
+        """Lower the level of `UnchangedItem` drops."""
+        result = super().dropped(item, exception, response, spider)
+        if isinstance(exception, UnchangedItem):
+            result['level'] = logging.DEBUG
+        return result
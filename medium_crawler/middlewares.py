@@ -1,37 +1,753 @@
 """Scrapy middlewares."""
+import gzip
+import hashlib
+import json
 import logging
 import os
-import random
-from distutils.util import strtobool
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+
+import scrapy
+from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from sqlalchemy.orm import sessionmaker
+from twisted.internet import task
+from w3lib.url import canonicalize_url
+
+from . import jobs
+from .extensions import CallbackMetrics
+from .jobs import JobJournal, item_fingerprint
+from .models import Proxy, db_connect
+from .proxies import ProxyPool
+from .ratelimit import RateController, backoff, parse_retry_after
+from .utils import endpoint_type, sleep, strtobool
 
 
 # configurable environment variables
 PROXY = os.environ.get('PROXY', 'http://127.0.0.1:8787')
-PROXY_ENABLED = bool(strtobool(os.environ.get('PROXY_ENABLED', 'FALSE')))
+PROXY_ENABLED = strtobool(os.environ.get('PROXY_ENABLED', 'FALSE'))
 
 
 class ProxyMiddleware:
-    """HTTP proxy middleware."""
+    """HTTP proxy pool middleware.
 
-    def __init__(self, proxy_depth=None):
-        """Set proxy depth."""
-        self.proxy_depth = proxy_depth
+    Proxies come from the `PROXY` environment variable (comma separated),
+    the `PROXY_LIST` setting and the enabled rows of the `proxy` table.
+    Requests of one medium user stick to one proxy, other requests go to
+    the healthiest proxy, see `proxies.ProxyPool`. Each proxy gets its own
+    download slot so that a slow proxy only delays its own requests, and
+    quarantined proxies are probed every `PROXY_PROBE_INTERVAL` seconds.
+    """
 
-    def process_request(self, request, spider):
-        """Scrapy's `process_request` method."""
-        if self.use_proxy(request):
-            logging.debug('using proxy.')
-            request.meta['proxy'] = PROXY
+    BAN_CODES = {403, 429}
+    ERROR_CODES = {500, 502, 503, 504, 407, 408}
+
+    def __init__(
+        self,
+        pool: ProxyPool,
+        crawler: object,
+        probe_url: Optional[str] = None,
+        probe_interval: float = 30
+    ) -> None:
+        """Set proxy pool and probe options.
+
+        Args:
+            pool (ProxyPool): proxy pool
+            crawler (object): scrapy crawler
+            probe_url (Optional[str]): url requested to probe a proxy
+            probe_interval (float): seconds between probes, 0 to disable
+        """
+        self.pool = pool
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.probe_url = probe_url
+        self.probe_interval = probe_interval
+        self.loop = None
 
-    def use_proxy(self, request):
-        """Make HTTP request without proxy when depth >= 3."""
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
         # if environ variable "PROXY_ENABLED" set to False, disable proxy
         if not PROXY_ENABLED:
-            return False
-        if 'depth' in request.meta:
-            self.proxy_depth = request.meta['depth']
-        if self.proxy_depth:
-            i = self.proxy_depth
+            raise NotConfigured
+        urls = [u.strip() for u in PROXY.split(',')]
+        urls += settings.getlist('PROXY_LIST')
+        if settings.getbool('PROXY_FROM_DATABASE'):
+            urls += cls.load_proxies()
+        pool = ProxyPool(
+            urls,
+            max_failures=settings.getint('PROXY_MAX_FAILURES'),
+            quarantine=settings.getfloat('PROXY_QUARANTINE_TIME'),
+            max_quarantine=settings.getfloat('PROXY_MAX_QUARANTINE_TIME')
+        )
+        if not pool:
+            raise NotConfigured('no proxy configured')
+        mw = cls(
+            pool,
+            crawler,
+            probe_url=settings.get('PROXY_PROBE_URL'),
+            probe_interval=settings.getfloat('PROXY_PROBE_INTERVAL')
+        )
+        crawler.signals.connect(mw.spider_opened, signals.spider_opened)
+        crawler.signals.connect(mw.spider_closed, signals.spider_closed)
+        return mw
+
+    @staticmethod
+    def load_proxies() -> List[str]:
+        """Get the enabled proxies of the `proxy` table."""
+        engine = db_connect()
+        if not engine.dialect.has_table(engine, Proxy.__tablename__):
+            return []
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        urls = [p.url for p in session.query(Proxy).filter_by(enable=1)]
+        session.close()
+        return urls
+
+    def spider_opened(self, spider):
+        """Start probing quarantined proxies."""
+        if self.probe_url and self.probe_interval > 0:
+            self.loop = task.LoopingCall(self.probe)
+            self.loop.start(self.probe_interval, now=False)
+
+    def spider_closed(self, spider):
+        """Stop probing."""
+        if self.loop and self.loop.running:
+            self.loop.stop()
+
+    def probe(self) -> None:
+        """Request the probe url through every proxy whose quarantine ended.
+
+        Probe responses go through `process_response`, so a successful
+        probe puts the proxy back in the pool.
+        """
+        for proxy in self.pool.due():
+            request = scrapy.Request(
+                self.probe_url,
+                meta={
+                    'proxy': proxy.url,
+                    'proxy_probe': True,
+                    'dont_retry': True,
+                    'dont_cache': True,
+                },
+                dont_filter=True
+            )
+            self.stats.inc_value('proxy_pool/probe')
+            d = self.crawler.engine.download(request)
+            d.addErrback(lambda _: None)
+
+    def process_request(self, request, spider):
+        """Scrapy's `process_request` method."""
+        if request.meta.get('proxy_probe'):
+            proxy = request.meta['proxy']
+        else:
+            proxy = self.pool.pick(request.meta.get('uid'))
+        request.meta.pop('proxy_pool', None)
+        if proxy is None:
+            # every proxy is quarantined
+            request.meta.pop('proxy', None)
+            request.meta.pop('download_slot', None)
+            self.stats.inc_value('proxy_pool/direct')
+            return
+        logging.debug(f'using proxy {proxy}.')
+        request.meta['proxy'] = proxy
+        request.meta['proxy_pool'] = proxy
+        request.meta['download_slot'] = (
+            f'{urlparse_cached(request).hostname}@{proxy}'
+        )
+        self.pool.proxies[proxy].in_flight += 1
+
+    def release(self, request) -> Optional[str]:
+        """Get the pool proxy of a request and decrement its in-flight."""
+        proxy = request.meta.pop('proxy_pool', None)
+        if proxy in self.pool.proxies:
+            state = self.pool.proxies[proxy]
+            state.in_flight = max(0, state.in_flight - 1)
+        return proxy
+
+    def process_response(self, request, response, spider):
+        """Score the proxy from the response status and latency."""
+        proxy = self.release(request)
+        if proxy is None or 'cached' in response.flags:
+            return response
+        if response.status in self.BAN_CODES:
+            self.failure(proxy, ban=True)
+        elif response.status in self.ERROR_CODES:
+            self.failure(proxy)
+        else:
+            self.pool.success(proxy, request.meta.get('download_latency'))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        """Score the proxy of a failed download."""
+        proxy = self.release(request)
+        if proxy is not None:
+            self.failure(proxy)
+
+    def failure(self, proxy: str, ban: bool = False) -> None:
+        """Record a proxy failure."""
+        if self.pool.failure(proxy, ban=ban):
+            self.stats.inc_value('proxy_pool/quarantined')
+            logging.warning(f'proxy {proxy} quarantined.')
+
+
+class MediumCacheMiddleware:
+    """On-disk cache of medium JSON responses.
+
+    Responses are keyed by the canonical url, so pagination requests with
+    the same `limit`/`to`/`page` share an entry whatever their query order.
+    Each endpoint type has its own TTL; stale entries are revalidated with
+    `If-None-Match`/`If-Modified-Since` and served again on `304`.
+    """
+
+    def __init__(self, cache_dir: str, ttls: dict, stats: object) -> None:
+        """Set cache directory and TTLs.
+
+        Args:
+            cache_dir (str): directory of the cached responses
+            ttls (dict): seconds an entry stays fresh, by endpoint type
+            stats (object): scrapy stats collector
+        """
+        self.cache_dir = cache_dir
+        self.ttls = ttls
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.getbool('MEDIUM_CACHE_ENABLED'):
+            raise NotConfigured
+        return cls(
+            cache_dir=settings.get('MEDIUM_CACHE_DIR'),
+            ttls=settings.getdict('MEDIUM_CACHE_TTLS'),
+            stats=crawler.stats
+        )
+
+    def endpoint(self, request: scrapy.Request) -> Optional[str]:
+        """Get the endpoint type of a request.
+
+        Args:
+            request (scrapy.Request): scrapy request object
+
+        Returns:
+            Optional[str]: `profile`, `post`, `comment`, or None if the
+                           request should not be cached
+        """
+        if request.method != 'GET' or request.meta.get('dont_cache'):
+            return None
+        return endpoint_type(urlparse_cached(request).path)
+
+    def path(self, request: scrapy.Request, endpoint: str) -> str:
+        """Get the file of the cache entry of a request."""
+        key = hashlib.sha1(canonicalize_url(request.url).encode()).hexdigest()
+        return os.path.join(self.cache_dir, endpoint, key[:2], f'{key}.gz')
+
+    def load(self, path: str) -> Optional[dict]:
+        """Read a cache entry.
+
+        Args:
+            path (str): entry file
+
+        Returns:
+            Optional[dict]: metadata with the body under `body`
+        """
+        try:
+            with gzip.open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                meta['body'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def store(self, path: str, response: scrapy.http.Response) -> None:
+        """Write a cache entry.
+
+        Args:
+            path (str): entry file
+            response (scrapy.http.Response): response to store
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            'url': response.url,
+            'status': response.status,
+            'headers': {
+                k.decode('latin1'): [v.decode('latin1') for v in vs]
+                for k, vs in response.headers.items()
+            },
+            'stored_at': time.time(),
+        }
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(json.dumps(meta).encode() + b'\n')
+            f.write(response.body)
+        os.replace(tmp_path, path)
+
+    def to_response(
+        self,
+        meta: dict,
+        request: scrapy.Request
+    ) -> scrapy.http.Response:
+        """Build a response from a cache entry."""
+        headers = Headers(meta['headers'])
+        respcls = responsetypes.from_args(
+            headers=headers, url=meta['url'], body=meta['body']
+        )
+        return respcls(
+            url=meta['url'],
+            status=meta['status'],
+            headers=headers,
+            body=meta['body'],
+            flags=['cached'],
+            request=request
+        )
+
+    def process_request(self, request, spider):
+        """Serve fresh entries and add validators to stale ones."""
+        endpoint = self.endpoint(request)
+        if endpoint is None:
+            return None
+        meta = self.load(self.path(request, endpoint))
+        if meta is None:
+            self.stats.inc_value('medium_cache/miss')
+            return None
+        if time.time() - meta['stored_at'] < self.ttls.get(endpoint, 0):
+            self.stats.inc_value('medium_cache/hit')
+            return self.to_response(meta, request)
+        self.stats.inc_value('medium_cache/stale')
+        headers = Headers(meta['headers'])
+        if b'ETag' in headers:
+            request.headers[b'If-None-Match'] = headers[b'ETag']
+        if b'Last-Modified' in headers:
+            request.headers[b'If-Modified-Since'] = headers[b'Last-Modified']
+        return None
+
+    def process_response(self, request, response, spider):
+        """Store new responses and replay revalidated ones."""
+        if 'cached' in response.flags:
+            return response
+        endpoint = self.endpoint(request)
+        if endpoint is None:
+            return response
+        path = self.path(request, endpoint)
+        if response.status == 304:
+            meta = self.load(path)
+            if meta is not None:
+                self.stats.inc_value('medium_cache/revalidated')
+                cached = self.to_response(meta, request)
+                self.store(path, cached)
+                return cached
+        elif response.status == 200:
+            self.stats.inc_value('medium_cache/store')
+            self.store(path, response)
+        return response
+
+
+class CallbackMetricsMiddleware:
+    """Measure CPU time and output of each spider callback.
+
+    Must be the closest spider middleware to the spider, so that only the
+    callback itself is timed. Results go to the `CallbackMetrics` extension.
+    """
+
+    def __init__(self, metrics: CallbackMetrics) -> None:
+        """Set the extension collecting the metrics."""
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        for ext in crawler.extensions.middlewares:
+            if isinstance(ext, CallbackMetrics):
+                return cls(ext)
+        raise NotConfigured
+
+    def process_spider_output(self, response, result, spider):
+        """Time the callback while its output is consumed."""
+        counts = {'cpu': 0.0, 'items': 0, 'requests': 0}
+        result = iter(result)
+        while True:
+            start = time.process_time()
+            try:
+                output = next(result)
+            except StopIteration:
+                counts['cpu'] += time.process_time() - start
+                break
+            counts['cpu'] += time.process_time() - start
+            self.count(counts, output)
+            yield output
+        self.record(response, spider, counts)
+
+    async def process_spider_output_async(self, response, result, spider):
+        """Asynchronous version of `process_spider_output`."""
+        counts = {'cpu': 0.0, 'items': 0, 'requests': 0}
+        result = result.__aiter__()
+        while True:
+            start = time.process_time()
+            try:
+                output = await result.__anext__()
+            except StopAsyncIteration:
+                counts['cpu'] += time.process_time() - start
+                break
+            counts['cpu'] += time.process_time() - start
+            self.count(counts, output)
+            yield output
+        self.record(response, spider, counts)
+
+    @staticmethod
+    def count(counts: dict, output: object) -> None:
+        """Count an item or a request."""
+        if isinstance(output, scrapy.Request):
+            counts['requests'] += 1
         else:
-            i = random.randint(1, 10)
-        return i >= 3  # make default value configurable
+            counts['items'] += 1
+
+    def record(self, response, spider, counts: dict) -> None:
+        """Report the measures of one callback call."""
+        callback = self.metrics.callback_name(response.request)
+        rule = self.metrics.rule(spider)
+        for metric, key in (('parse_cpu_seconds', 'cpu'),
+                            ('items', 'items'),
+                            ('requests', 'requests')):
+            self.metrics.observe(callback, rule, metric, counts[key])
+
+
+class RateLimitMiddleware:
+    """Delay requests with a token bucket per endpoint type and proxy.
+
+    Bucket rates adapt with AIMD: they grow on successful responses and are
+    cut on `429`/`5xx`, honouring `Retry-After`.
+    """
+
+    THROTTLE_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, controller: RateController, stats: object) -> None:
+        """Set rate controller."""
+        self.controller = controller
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.getbool('RATE_CONTROL_ENABLED'):
+            raise NotConfigured
+        controller = RateController(
+            endpoints=settings.getdict('RATE_CONTROL_ENDPOINTS'),
+            min_rate=settings.getfloat('RATE_CONTROL_MIN_RATE'),
+            max_rate=settings.getfloat('RATE_CONTROL_MAX_RATE'),
+            increase=settings.getfloat('RATE_CONTROL_INCREASE'),
+            decrease=settings.getfloat('RATE_CONTROL_DECREASE')
+        )
+        return cls(controller, crawler.stats)
+
+    def bucket(self, request):
+        """Get the token bucket of a request."""
+        return self.controller.bucket(
+            endpoint_type(urlparse_cached(request).path),
+            request.meta.get('proxy') or ''
+        )
+
+    async def process_request(self, request, spider):
+        """Wait for a token of the request's bucket."""
+        delay = self.bucket(request).reserve()
+        if delay > 0:
+            self.stats.inc_value('rate_control/delayed')
+            await sleep(delay)
+        return None
+
+    def process_response(self, request, response, spider):
+        """Adjust the bucket rate from the response status."""
+        if 'cached' in response.flags:
+            return response
+        bucket = self.bucket(request)
+        if response.status in self.THROTTLE_CODES:
+            self.stats.inc_value(f'rate_control/throttled/{response.status}')
+            bucket.on_throttle(
+                parse_retry_after(response.headers.get(b'Retry-After'))
+            )
+        else:
+            bucket.on_success()
+        return response
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+    """Retry with exponential backoff and jitter instead of at once.
+
+    The delay is stored in the `retry_not_before` meta of the retry request
+    and waited for when the retry goes through `process_request`, with or
+    without `RateLimitMiddleware`. A `Retry-After` header sets the minimum
+    delay.
+    """
+
+    def __init__(self, settings):
+        """Set backoff base and cap."""
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE')
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX')
+
+    def delay(self, retry: scrapy.Request, retry_after=None) -> None:
+        """Set the earliest time a retry request may be sent."""
+        wait = backoff(
+            retry.meta.get('retry_times', 1),
+            self.backoff_base,
+            self.backoff_max
+        )
+        if retry_after:
+            wait = max(wait, retry_after)
+        retry.meta['retry_not_before'] = time.time() + wait
+
+    async def process_request(self, request, spider):
+        """Wait until the `retry_not_before` of a retry request."""
+        delay = request.meta.get('retry_not_before', 0) - time.time()
+        if delay > 0:
+            await sleep(delay)
+        return None
+
+    def process_response(self, request, response, spider):
+        """Scrapy's `process_response` method."""
+        result = super().process_response(request, response, spider)
+        if isinstance(result, scrapy.Request):
+            self.delay(
+                result, parse_retry_after(response.headers.get(b'Retry-After'))
+            )
+        return result
+
+    def process_exception(self, request, exception, spider):
+        """Scrapy's `process_exception` method."""
+        result = super().process_exception(request, exception, spider)
+        if isinstance(result, scrapy.Request):
+            self.delay(result)
+        return result
+
+
+class ResumeMiddleware:
+    """Journal of pending requests and emitted items to resume a crawl.
+
+    Scheduled requests are added to a `jobs.JobJournal` in `RESUME_DIR`
+    (one subdirectory per rule from `run.py`) and removed once nothing
+    depends on them anymore: their response was handled, the items it
+    yielded left the pipelines and were written by the pipelines that
+    buffer them (see `pipelines.BufferedPipeline`), and the comments it
+    parked for an author lookup were released and stored too. Items are
+    recorded as emitted once stored, so a crash only ever causes
+    refetches. A restarted job replaces the start requests with the
+    pending ones and drops items it already emitted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 1,
+        stats: object = None
+    ) -> None:
+        """Set job directory.
+
+        Args:
+            directory (str): root directory of the job journals
+            flush_interval (float): seconds between journal writes
+            stats (object): scrapy stats collector
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.journal = None
+        self.spider = None
+        self.loop = None
+        self.crawler = None
+        # journal ids whose response was handled, and their items in flight
+        self.handled: Set[int] = set()
+        self.deps: Counter = Counter()
+        # by item fingerprint: journal ids of the items in flight, buffers
+        # holding them and whether the items that left were scraped
+        self.flight: Dict[int, List[Optional[int]]] = defaultdict(list)
+        self.holds: Counter = Counter()
+        self.left: Dict[int, List[bool]] = defaultdict(list)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.get('RESUME_DIR'):
+            raise NotConfigured
+        mw = cls(
+            directory=settings.get('RESUME_DIR'),
+            flush_interval=settings.getfloat('RESUME_FLUSH_INTERVAL'),
+            stats=crawler.stats
+        )
+        mw.crawler = crawler
+        crawler.signals.connect(mw.spider_opened, signals.spider_opened)
+        crawler.signals.connect(mw.spider_closed, signals.spider_closed)
+        crawler.signals.connect(
+            mw.request_scheduled, signals.request_scheduled
+        )
+        crawler.signals.connect(mw.request_dropped, signals.request_dropped)
+        crawler.signals.connect(mw.item_scraped, signals.item_scraped)
+        crawler.signals.connect(mw.item_done, signals.item_dropped)
+        crawler.signals.connect(mw.item_done, signals.item_error)
+        crawler.signals.connect(mw.item_buffered, jobs.item_buffered)
+        crawler.signals.connect(mw.items_stored, jobs.items_stored)
+        return mw
+
+    def open(self, spider) -> JobJournal:
+        """Open the journal of the spider's job."""
+        if self.journal is None:
+            self.spider = spider
+            directory = self.directory
+            if getattr(spider, 'rule_id', None) is not None:
+                directory = os.path.join(directory, f'rule-{spider.rule_id}')
+            self.journal = JobJournal(directory)
+        return self.journal
+
+    def restore(self, start_requests, spider):
+        """Replace the start requests with the pending ones, if any."""
+        journal = self.open(spider)
+        if not len(journal):
+            return start_requests
+        logging.info(f'Resuming {len(journal)} requests from {journal.path}')
+        self.stats.set_value('resume/restored', len(journal))
+        return journal.pending(spider)
+
+    def process_start_requests(self, start_requests, spider):
+        """Scrapy's `process_start_requests` method."""
+        yield from self.restore(start_requests, spider)
+
+    async def process_start(self, start):
+        """Scrapy's `process_start` method (Scrapy >= 2.13)."""
+        spider = self.crawler.spider
+        if len(self.open(spider)):
+            for request in self.restore((), spider):
+                yield request
+        else:
+            async for request in start:
+                yield request
+
+    def spider_opened(self, spider):
+        """Start the periodic journal writes."""
+        self.open(spider)
+        if self.flush_interval > 0:
+            self.loop = task.LoopingCall(self.journal.flush)
+            self.loop.start(self.flush_interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        """Write the journal, or forget it when the crawl finished."""
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        if reason == 'finished':
+            self.journal.clear()
+        else:
+            self.journal.flush()
+
+    def request_scheduled(self, request, spider):
+        """Add a new request to the journal."""
+        if 'job_id' not in request.meta:
+            self.journal.add(request, getattr(spider, 'posts', None))
+
+    def request_dropped(self, request, spider):
+        """Remove a request filtered by the scheduler."""
+        job_id = request.meta.get('job_id')
+        if job_id is not None:
+            self.journal.finish(job_id)
+
+    def item_scraped(self, item, spider):
+        """Record an item leaving the pipelines."""
+        self.item_left(item, scraped=True)
+
+    def item_done(self, item, *args, **kwargs):
+        """Record an item dropped or failed in the pipelines."""
+        self.item_left(item, scraped=False)
+
+    def item_left(self, item, scraped: bool) -> None:
+        """Forget an item once it left the pipelines and is stored."""
+        fp = item_fingerprint(item)
+        self.left[fp].append(scraped)
+        self.check(fp)
+
+    def item_buffered(self, item):
+        """Hold an item until the pipeline buffering it writes it."""
+        self.holds[item_fingerprint(item)] += 1
+
+    def items_stored(self, fingerprints):
+        """Release the items a pipeline wrote."""
+        for fp in fingerprints:
+            self.holds[fp] -= 1
+            if self.holds[fp] <= 0:
+                del self.holds[fp]
+            self.check(fp)
+
+    def check(self, fp: int) -> None:
+        """Settle the items of a fingerprint no buffer holds anymore."""
+        if self.holds.get(fp) or fp not in self.left:
+            return
+        for scraped in self.left.pop(fp):
+            if scraped:
+                self.journal.emit_fingerprint(fp)
+            job_ids = self.flight.get(fp)
+            job_id = job_ids.pop(0) if job_ids else None
+            if not job_ids:
+                self.flight.pop(fp, None)
+            if job_id is not None:
+                self.deps[job_id] -= 1
+                if self.deps[job_id] <= 0:
+                    del self.deps[job_id]
+                self.settle(job_id)
+
+    def settle(self, job_id: int) -> None:
+        """Remove a handled request once nothing depends on it."""
+        authors = getattr(self.spider, 'authors', None)
+        if (
+            job_id in self.handled and not self.deps.get(job_id) and
+            not (authors is not None and authors.parked.get(job_id))
+        ):
+            self.handled.discard(job_id)
+            self.journal.finish(job_id)
+
+    def keep(self, obj, response) -> bool:
+        """Check a callback output, dropping items already emitted.
+
+        Child requests lose the journal id they inherit with the meta. An
+        item depends on the request of the response, or for a comment
+        parked for its author, on the request of the comment page.
+        """
+        if isinstance(obj, scrapy.Request):
+            obj.meta.pop('job_id', None)
+            return True
+        authors = getattr(self.spider, 'authors', None)
+        origin = authors.pop_origin(obj) if authors is not None else None
+        if self.journal.emitted(obj):
+            self.stats.inc_value('resume/items_skipped')
+            if origin is not None:
+                self.settle(origin)
+            return False
+        job_id = origin if origin is not None else response.meta.get('job_id')
+        self.flight[item_fingerprint(obj)].append(job_id)
+        if job_id is not None:
+            self.deps[job_id] += 1
+        return True
+
+    def done(self, response) -> None:
+        """Remove the request of a handled response once it can be."""
+        job_id = response.request.meta.get('job_id')
+        if job_id is not None:
+            self.handled.add(job_id)
+            self.settle(job_id)
+
+    def process_spider_output(self, response, result, spider):
+        """Scrapy's `process_spider_output` method."""
+        for obj in result:
+            if self.keep(obj, response):
+                yield obj
+        self.done(response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        """Scrapy's `process_spider_output_async` method."""
+        async for obj in result:
+            if self.keep(obj, response):
+                yield obj
+        self.done(response)
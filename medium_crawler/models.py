@@ -2,7 +2,8 @@
 import os
 from os.path import abspath, dirname, join
 
-from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy import (BigInteger, Column, DateTime, Float, Integer, String,
+                        Text, create_engine)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -33,3 +34,76 @@ class Rule(Base):
     url = Column(String)
     source = Column(String(30))
     enable = Column(Integer)
+
+
+class Proxy(Base):
+    """Table for the proxies of the proxy pool."""
+
+    __tablename__ = 'proxy'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    url = Column(String, unique=True)
+    enable = Column(Integer)
+
+
+class UserProfile(Base):
+    """Table for cached medium user profiles."""
+
+    __tablename__ = 'user_profile'
+
+    user_id = Column(String(20), primary_key=True)
+    username = Column(String(64), index=True)
+    name = Column(String)
+    fetched_at = Column(Float)
+    accessed_at = Column(Float, index=True)
+
+
+class Watermark(Base):
+    """Table for the latest crawled post of each writer."""
+
+    __tablename__ = 'watermark'
+
+    username = Column(String(30), primary_key=True)
+    post_id = Column(String(20))
+    updated_at = Column(BigInteger)
+
+
+class PostState(Base):
+    """Table for the `updatedAt` of each crawled post."""
+
+    __tablename__ = 'post_state'
+
+    post_id = Column(String(20), primary_key=True)
+    username = Column(String(30))
+    updated_at = Column(BigInteger)
+
+
+class CommentCursor(Base):
+    """Table for the responses already crawled of each refreshed post."""
+
+    __tablename__ = 'comment_cursor'
+
+    post_id = Column(String(20), primary_key=True)
+    seen = Column(Integer)
+    to = Column(String(64))
+    skip = Column(Integer)
+
+
+class Article(Base):
+    """Table for crawled posts and comments, see `items.ArticleItem`."""
+
+    __tablename__ = 'article'
+
+    link = Column(String(255), primary_key=True)
+    uid = Column(String(64))
+    author = Column(String)
+    author_id = Column(String(20))
+    poster = Column(String)
+    title = Column(String)
+    content = Column(Text)
+    comment_count = Column(Integer)
+    like_count = Column(Integer)
+    created_time = Column(DateTime)
+    fetched_time = Column(DateTime)
+    article_type = Column(String(10))
+    tag = Column(String)
@@ -0,0 +1,51 @@
+"""Per-crawl table of the posts whose comments are being crawled."""
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class PostRef(NamedTuple):
+    """Fields of a post copied into its comments."""
+
+    post_id: str
+    uid: Optional[str]
+    author: Optional[str]
+    title: Optional[str]
+
+
+class PostTable:
+    """Bounded map of post id to `PostRef`.
+
+    Comment requests only carry the post id in their meta. A post is
+    removed when its last comment page was parsed, and the least recently
+    used posts are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        """Set table size.
+
+        Args:
+            max_entries (int): maximum number of posts
+        """
+        self.max_entries = max_entries
+        self._refs: 'OrderedDict[str, PostRef]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def put(self, ref: PostRef) -> None:
+        """Add or refresh a post."""
+        self._refs[ref.post_id] = ref
+        self._refs.move_to_end(ref.post_id)
+        while len(self._refs) > self.max_entries:
+            self._refs.popitem(last=False)
+
+    def get(self, post_id: str) -> Optional[PostRef]:
+        """Get a post, None if it is unknown or was evicted."""
+        ref = self._refs.get(post_id)
+        if ref is not None:
+            self._refs.move_to_end(post_id)
+        return ref
+
+    def discard(self, post_id: str) -> None:
+        """Remove a post whose comments were all parsed."""
+        self._refs.pop(post_id, None)
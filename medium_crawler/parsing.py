@@ -0,0 +1,348 @@
+"""Payload extraction, inline or in a process-wide worker pool."""
+import concurrent.futures
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from twisted.internet import defer
+
+from . import items, payload
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('thread', 'process')
+
+
+class LinksResult(NamedTuple):
+    """What `MediumPost.parse_links` reads from a profile page."""
+
+    user: Optional[dict]
+    posts: Dict[str, dict]
+    paging: Optional[dict]
+
+
+class PostResult(NamedTuple):
+    """What `MediumPost.post` reads from a post payload."""
+
+    record: items.ArticleItem
+    users: Dict[str, dict]
+    post_id: str
+    updated_at: int
+
+
+class MetricsResult(NamedTuple):
+    """What `MediumPost.refresh_post` reads from a post payload."""
+
+    record: items.ArticleDeltaItem
+    post_id: str
+    author: Optional[str]
+    title: Optional[str]
+
+
+class CommentResult(NamedTuple):
+    """What `MediumPost.comment` reads from a `responsesStream` page."""
+
+    users: Dict[str, dict]
+    comments: List[dict]
+    paging: Optional[dict]
+
+
+def users(references: Any, copy: bool = False) -> Dict[str, dict]:
+    """Get a `references.User` map, copied into plain dicts if asked."""
+    if not copy:
+        return references
+    return {
+        user_id: {'name': user.get('name'),
+                  'username': user.get('username')}
+        for user_id, user in (references or {}).items()
+    }
+
+
+def paging(obj: Any) -> Optional[dict]:
+    """Get the next page of a payload.
+
+    Returns:
+        Optional[dict]: `path`, `limit`, `to` and `page` of the next page
+    """
+    pages = obj.get('payload', {}).get('paging', {})
+    if 'next' not in pages:
+        return None
+    return {
+        'path': pages['path'],
+        'limit': pages['next'].get('limit'),
+        'to': pages['next'].get('to'),
+        'page': pages['next'].get('page'),
+    }
+
+
+def links_result(obj: Any, copy: bool = False) -> LinksResult:
+    """Extract a profile page.
+
+    Args:
+        obj (Any): decoded payload
+        copy (bool): copy what is read into plain dicts, to send it to
+                     another process
+
+    Returns:
+        LinksResult: author, posts (`id`, `updatedAt` and `creatorId`) and
+                     next page
+    """
+    body = obj.get('payload', {})
+    user = body.get('user')
+    posts = body.get('references', {}).get('Post') or {}
+    if copy:
+        if user:
+            user = {
+                'userId': user['userId'],
+                'username': user.get('username'),
+                'name': user.get('name'),
+            }
+        posts = {
+            k: {'id': v['id'], 'updatedAt': v['updatedAt'],
+                'creatorId': v['creatorId']}
+            for k, v in posts.items()
+        }
+    return LinksResult(user=user, posts=posts, paging=paging(obj))
+
+
+def post_item(post: Any) -> items.ArticleItem:
+    """Parse medium post item.
+
+    Args:
+        post (Any): `payload` of a post
+
+    Returns:
+        items.ArticleItem: ArticleItem object
+    """
+    link = post['value']['mediumUrl']
+    uid = [i[1] for i in post['references']['User'].items()][0]['username']
+    author = [i[1] for i in post['references']['User'].items()][0]['name']
+    author_id = [i[1] for i in post['references']['User'].items()][0]['userId']  # noqa: E501
+    title = post['value']['title']
+    content = '\n'.join([i['text'] for i in post['value']['content']['bodyModel']['paragraphs']])  # noqa: E501
+    comment_count = int(post['value']['virtuals']['responsesCreatedCount'])
+    like_count = int(post['value']['virtuals']['totalClapCount'])
+    created_time = datetime.fromtimestamp(post['value']['createdAt'] / 1000)
+    tag = ','.join([i['name'] for i in post['value']['virtuals']['tags']])
+    return items.ArticleItem(
+        uid=uid,
+        link=link,
+        author=author,
+        author_id=author_id,
+        poster=author,
+        title=title,
+        content=content,
+        comment_count=comment_count,
+        like_count=like_count,
+        created_time=created_time,
+        article_type='post',
+        tag=tag,
+    )
+
+
+def post_result(obj: Any, copy: bool = False) -> PostResult:
+    """Extract a post payload.
+
+    Args:
+        obj (Any): decoded payload
+        copy (bool): copy the users into plain dicts
+
+    Returns:
+        PostResult: post item, users, post id and `updatedAt`
+    """
+    post = obj['payload']
+    return PostResult(
+        record=post_item(post),
+        users=users(post['references'].get('User'), copy),
+        post_id=post['value']['id'],
+        updated_at=post['value']['updatedAt']
+    )
+
+
+def metrics_result(obj: Any, copy: bool = False) -> MetricsResult:
+    """Extract the counters of a post payload.
+
+    Unlike `post_result`, the article body is not read.
+
+    Args:
+        obj (Any): decoded payload
+        copy (bool): unused, the result only holds plain values
+
+    Returns:
+        MetricsResult: counters, post id, author name and title, which
+                       the comments of a refresh need
+    """
+    post = obj['payload']
+    value = post['value']
+    user = next(iter((post['references'].get('User') or {}).values()), {})
+    return MetricsResult(
+        record=items.ArticleDeltaItem(
+            uid=user.get('username'),
+            link=value['mediumUrl'],
+            article_type='post',
+            comment_count=int(value['virtuals']['responsesCreatedCount']),
+            like_count=int(value['virtuals']['totalClapCount']),
+        ),
+        post_id=value['id'],
+        author=user.get('name'),
+        title=value.get('title')
+    )
+
+
+def comment_result(
+    obj: Any,
+    post_id: str,
+    limit: int = 0,
+    copy: bool = False
+) -> CommentResult:
+    """Extract a `responsesStream` page.
+
+    Args:
+        obj (Any): decoded payload
+        post_id (str): id of the commented post, skipped in `Post`
+        limit (int): maximum number of comments, 0 for no limit
+        copy (bool): copy the users into plain dicts
+
+    Returns:
+        CommentResult: users, comments (`post_id`, `author_id`, `content`,
+                       `comment_count`, `like_count`, `created_time`)
+                       and next page
+    """
+    references = obj.get('payload', {}).get('references', {})
+    comments = []
+    for comment_id, post in (references.get('Post') or {}).items():
+        if comment_id == post_id:
+            continue
+        if limit and len(comments) >= limit:
+            break
+        comments.append({
+            'post_id': comment_id,
+            'author_id': post['creatorId'],
+            'content': '\n'.join([i['text'] for i in post['previewContent2']['bodyModel']['paragraphs']]),  # noqa: E501
+            'comment_count': int(post['virtuals']['responsesCreatedCount']),
+            'like_count': int(post['virtuals']['totalClapCount']),
+            'created_time': datetime.fromtimestamp(post['createdAt'] / 1000),
+        })
+    return CommentResult(
+        users=users(references.get('User'), copy),
+        comments=comments,
+        paging=paging(obj)
+    )
+
+
+def decode_and_extract(
+    extract: Callable[..., Any],
+    body: bytes,
+    backend: str,
+    *args: Any
+) -> Any:
+    """Decode a response body and extract it, in a pool worker.
+
+    The result is copied into plain objects, which can be pickled and do
+    not keep the decoded payload alive.
+
+    Args:
+        extract (Callable[..., Any]): extraction function of this module
+        body (bytes): response body
+        backend (str): payload backend, see `payload.get_decoder`
+        *args (Any): other arguments of `extract`
+
+    Returns:
+        Any: extraction result
+    """
+    return extract(payload.get_decoder(backend)(body), *args, copy=True)
+
+
+class ParsePool:
+    """Worker pool shared by every crawler of the process.
+
+    Threads keep the reactor responsive while a payload is decoded;
+    processes also spread decoding over several cores. At most
+    `max_in_flight` payloads are submitted at a time, the others wait on
+    the reactor, where scrapy counts their responses against
+    `SCRAPER_SLOT_MAX_ACTIVE_SIZE` and stops downloading when it is full.
+    """
+
+    _instances: Dict[Tuple[str, int, int], 'ParsePool'] = {}
+
+    def __init__(
+        self,
+        kind: str = 'thread',
+        workers: int = 2,
+        max_in_flight: int = 8
+    ) -> None:
+        """Start the workers.
+
+        Args:
+            kind (str): `thread` or `process`
+            workers (int): number of workers
+            max_in_flight (int): payloads submitted at the same time
+
+        Raises:
+            ValueError: if the kind is unknown
+        """
+        if kind not in KINDS:
+            raise ValueError(f'Unknown parse pool: {kind!r}')
+        self.kind = kind
+        self.key = (kind, workers, max_in_flight)
+        if kind == 'process':
+            self.executor = concurrent.futures.ProcessPoolExecutor(workers)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                workers, thread_name_prefix='parse'
+            )
+        self.semaphore = defer.DeferredSemaphore(max_in_flight)
+        self.users = 0
+
+    @classmethod
+    def get(
+        cls,
+        kind: str = 'thread',
+        workers: int = 2,
+        max_in_flight: int = 8
+    ) -> 'ParsePool':
+        """Get the process-wide pool of a configuration."""
+        key = (kind, workers, max_in_flight)
+        if key not in cls._instances:
+            cls._instances[key] = cls(kind, workers, max_in_flight)
+        pool = cls._instances[key]
+        pool.users += 1
+        return pool
+
+    @property
+    def in_flight(self) -> int:
+        """Number of payloads submitted to the workers."""
+        return self.semaphore.limit - self.semaphore.tokens
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> defer.Deferred:
+        """Run a function in a worker.
+
+        Args:
+            func (Callable[..., Any]): module-level function
+            *args (Any): picklable arguments
+
+        Returns:
+            defer.Deferred: fired on the reactor with the result
+        """
+        return self.semaphore.run(self._submit, func, *args)
+
+    def _submit(self, func: Callable[..., Any], *args: Any) -> defer.Deferred:
+        from twisted.internet import reactor
+        d = defer.Deferred()
+
+        def done(future):
+            if future.exception() is not None:
+                reactor.callFromThread(d.errback, future.exception())
+            else:
+                reactor.callFromThread(d.callback, future.result())
+
+        self.executor.submit(func, *args).add_done_callback(done)
+        return d
+
+    def release(self) -> None:
+        """Shut the workers down once no crawler uses the pool anymore."""
+        self.users -= 1
+        if self.users <= 0:
+            self._instances.pop(self.key, None)
+            self.executor.shutdown(wait=False)
+            logger.debug(f'Parse pool {self.key} shut down.')
@@ -0,0 +1,114 @@
+"""Medium JSON payload decoding."""
+import json
+from json.decoder import WHITESPACE
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover
+    simdjson = None
+
+PREFIX = b'])}while(1);</x>'
+BACKENDS = ('auto', 'orjson', 'simdjson', 'json')
+
+_json_decoder = json.JSONDecoder()
+
+
+def _strip(body: bytes) -> memoryview:
+    """Skip the anti-hijacking prefix without copying the body."""
+    view = memoryview(body)
+    if body.startswith(PREFIX):
+        return view[len(PREFIX):]
+    return view
+
+
+def decode_json(body: bytes) -> Any:
+    """Decode a medium payload with the standard library.
+
+    The standard library only parses `str`, so the body is decoded from
+    utf-8 once and parsed from after the prefix, without slicing.
+
+    Args:
+        body (bytes): response body
+
+    Returns:
+        Any: decoded payload
+    """
+    text = body.decode('utf-8')
+    start = len(PREFIX) if body.startswith(PREFIX) else 0
+    obj, end = _json_decoder.raw_decode(
+        text, WHITESPACE.match(text, start).end()
+    )
+    end = WHITESPACE.match(text, end).end()
+    if end != len(text):
+        raise json.JSONDecodeError('Extra data', text, end)
+    return obj
+
+
+def decode_orjson(body: bytes) -> Any:
+    """Decode a medium payload with orjson.
+
+    Args:
+        body (bytes): response body
+
+    Returns:
+        Any: decoded payload
+    """
+    return orjson.loads(_strip(body))
+
+
+def decode_simdjson(body: bytes) -> Any:
+    """Decode a medium payload lazily with simdjson.
+
+    Objects and arrays are only materialized when they are accessed, so
+    callbacks reading a handful of keys skip building the whole tree.
+    Each call uses its own parser because a parser invalidates its previous
+    document when reused. The parser reads the stripped body through the
+    buffer protocol.
+
+    Args:
+        body (bytes): response body
+
+    Returns:
+        Any: decoded payload
+    """
+    return simdjson.Parser().parse(_strip(body))
+
+
+def get_decoder(backend: str = 'auto') -> Callable[[bytes], Any]:
+    """Get a payload decoder.
+
+    `auto` picks orjson when it is installed and falls back to the
+    standard library. simdjson is only used when asked for explicitly,
+    because its lazy objects are read-only.
+
+    Args:
+        backend (str): one of `auto`, `orjson`, `simdjson` or `json`
+
+    Returns:
+        Callable[[bytes], Any]: function decoding a response body
+
+    Raises:
+        ValueError: if the backend is unknown or not installed
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown payload backend: {backend!r}')
+    if backend == 'auto':
+        backend = 'orjson' if orjson is not None else 'json'
+    if backend == 'orjson':
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+        return decode_orjson
+    if backend == 'simdjson':
+        if simdjson is None:
+            raise ValueError('simdjson is not installed')
+        return decode_simdjson
+    return decode_json
+
+
+decode = get_decoder()
@@ -1,15 +1,80 @@
 """Scrapy pipelines."""
-from datetime import datetime
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Hashable, List, Tuple
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import mysql, postgresql
+from twisted.internet import task
+
+from . import changes, jobs
+from .items import ArticleDeltaItem, ArticleRecord
+from .models import Article, create_new_table, db_connect
+
+# imported by `import_pyarrow` when Parquet export is enabled
+pa = pq = None
+
+
+def import_pyarrow() -> None:
+    """Import pyarrow, which takes longer than the rest of the project.
+
+    Raises:
+        ImportError: if pyarrow is not installed
+    """
+    global pa, pq
+    if pa is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
 
 
 class DefaultValuesPipeline:
-    """Set default values processor."""
+    """Set default values processor.
+
+    Field metadata may set a `default` value or a `default_factory`
+    called for every item. The defaults of an item class are collected
+    once into a table.
+    """
+
+    def __init__(self) -> None:
+        """Set the table of defaults per item class."""
+        self.defaults: Dict[type, Tuple[dict, tuple]] = {}
+
+    def table(self, item_class: type) -> Tuple[dict, tuple]:
+        """Get the default values and factories of an item class.
+
+        Args:
+            item_class (type): scrapy item class
+
+        Returns:
+            Tuple[dict, tuple]: field to value, and (field, factory) pairs
+        """
+        table = self.defaults.get(item_class)
+        if table is None:
+            fields = item_class.fields
+            table = self.defaults[item_class] = (
+                {f: m['default'] for f, m in fields.items()
+                 if 'default' in m},
+                tuple((f, m['default_factory']) for f, m in fields.items()
+                      if 'default_factory' in m)
+            )
+        return table
 
     def process_item(self, item, spider):
         """Initialize fields with a default value."""
-        for field, value in item.fields.items():
-            if 'default' in value:
-                item.setdefault(field, value['default'])
+        values, factories = self.table(type(item))
+        for field, value in values.items():
+            if field not in item:
+                item[field] = value
+        for field, factory in factories:
+            if field not in item:
+                item[field] = factory()
         return item
 
 
@@ -19,3 +84,388 @@ class AutoFetchTime:
     def process_item(self, item, spider):
         item['fetched_time'] = datetime.now()
         return item
+
+
+class ChangeDetectionPipeline:
+    """Drop items that did not change since the previous run.
+
+    Items are compared with the `changes.ContentIndex` by link. Unchanged
+    items are dropped, items whose counters are the only change are
+    replaced by a slim `ArticleDeltaItem`, and new or changed items pass.
+    """
+
+    def __init__(self, index: changes.ContentIndex, stats: object) -> None:
+        """Set content index.
+
+        Args:
+            index (changes.ContentIndex): fingerprints of exported links
+            stats (object): scrapy stats collector
+        """
+        self.index = index
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        path = settings.get('CHANGE_INDEX_PATH')
+        if not path:
+            raise NotConfigured
+        pipeline = cls(
+            index=changes.ContentIndex(
+                path, flush_size=settings.getint('CHANGE_INDEX_FLUSH_SIZE')
+            ),
+            stats=crawler.stats
+        )
+        crawler.signals.connect(
+            pipeline.spider_closed, signal=signals.spider_closed
+        )
+        return pipeline
+
+    def spider_closed(self, spider):
+        """Write the buffered fingerprints."""
+        self.index.flush()
+
+    def process_item(self, item, spider):
+        """Drop, slim down or pass an item."""
+        if isinstance(item, ArticleDeltaItem) or not item.get('link'):
+            return item
+        status = self.index.check(item)
+        self.stats.inc_value(f'changes/{status}')
+        if status == changes.UNCHANGED:
+            raise changes.UnchangedItem(f'Unchanged {item["link"]}')
+        if status == changes.COUNTERS:
+            return ArticleDeltaItem(
+                {k: item[k] for k in ArticleDeltaItem.fields if k in item}
+            )
+        return item
+
+
+class BufferedPipeline:
+    """Pipeline writing items some time after `process_item`.
+
+    Subclasses call `buffered` for each item they keep and `stored` once
+    the items of a buffer are written, which sends the `jobs` signals a
+    resumable crawl waits on before it counts an item as emitted.
+    """
+
+    def __init__(self) -> None:
+        """Start without unwritten items."""
+        self.signals = None
+        self.unstored: Dict[Hashable, List[int]] = defaultdict(list)
+
+    def buffered(self, item, key: Hashable = None) -> None:
+        """Announce an item kept in the buffer `key`."""
+        if self.signals is not None:
+            self.signals.send_catch_log(jobs.item_buffered, item=item)
+            self.unstored[key].append(jobs.item_fingerprint(item))
+
+    def stored(self, key: Hashable = None) -> None:
+        """Announce the items of the buffer `key` are written."""
+        fingerprints = self.unstored.pop(key, None)
+        if fingerprints:
+            self.signals.send_catch_log(
+                jobs.items_stored, fingerprints=fingerprints
+            )
+
+
+class ArticleExportPipeline(BufferedPipeline):
+    """Store ArticleItem in the `article` table in batches.
+
+    Items are buffered by `link` as compact `ArticleRecord` and upserted
+    with one executemany per batch, when the buffer reaches `batch_size`
+    items, every `flush_interval` seconds, and when the spider closes.
+    An `ArticleDeltaItem` only updates the counters of its row.
+    """
+
+    columns = [c.name for c in Article.__table__.columns]
+
+    def __init__(
+        self,
+        engine: object,
+        batch_size: int = 500,
+        flush_interval: float = 5
+    ) -> None:
+        """Set database engine and flush thresholds.
+
+        Args:
+            engine (object): sqlalchemy engine, see `models.db_connect`
+            batch_size (int): number of buffered items that triggers a flush
+            flush_interval (float): seconds between time-based flushes
+        """
+        super().__init__()
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = {}
+        self.deltas = {}
+        self.last_flush = time.monotonic()
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.getbool('ARTICLE_EXPORT_ENABLED'):
+            raise NotConfigured
+        pipeline = cls(
+            engine=db_connect(),
+            batch_size=settings.getint('ARTICLE_EXPORT_BATCH_SIZE'),
+            flush_interval=settings.getfloat('ARTICLE_EXPORT_FLUSH_INTERVAL')
+        )
+        pipeline.signals = crawler.signals
+        return pipeline
+
+    def open_spider(self, spider):
+        """Create the table and start the time-based flush."""
+        create_new_table(self.engine)
+        if self.flush_interval > 0:
+            self.loop = task.LoopingCall(self.flush_if_due)
+            self.loop.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        """Flush the remaining items."""
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self.flush()
+
+    def process_item(self, item, spider):
+        """Buffer an item, flushing when the batch is full."""
+        link = item['link']
+        if isinstance(item, ArticleDeltaItem):
+            record = self.buffer.get(link)
+            if record is None:
+                self.deltas[link] = {
+                    'b_link': link,
+                    'comment_count': item.get('comment_count'),
+                    'like_count': item.get('like_count'),
+                    'fetched_time': item.get('fetched_time'),
+                }
+            else:
+                record.comment_count = item.get('comment_count')
+                record.like_count = item.get('like_count')
+        else:
+            self.deltas.pop(link, None)
+            self.buffer[link] = ArticleRecord.from_item(item)
+        self.buffered(item)
+        if len(self.buffer) + len(self.deltas) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush_if_due(self) -> None:
+        """Flush if nothing was flushed for `flush_interval` seconds."""
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def upsert_statement(self) -> object:
+        """Build an insert statement that replaces rows with the same link.
+
+        Returns:
+            object: sqlalchemy insert statement for the engine's dialect
+        """
+        table = Article.__table__
+        dialect = self.engine.dialect.name
+        if dialect == 'sqlite':
+            return table.insert().prefix_with('OR REPLACE')
+        if dialect == 'postgresql':
+            stmt = postgresql.insert(table)
+            return stmt.on_conflict_do_update(
+                index_elements=[table.c.link],
+                set_={c: stmt.excluded[c] for c in self.columns if c != 'link'}
+            )
+        if dialect == 'mysql':
+            stmt = mysql.insert(table)
+            return stmt.on_duplicate_key_update(
+                **{c: stmt.inserted[c] for c in self.columns if c != 'link'}
+            )
+        return None
+
+    def flush(self) -> None:
+        """Write buffered items in one transaction."""
+        self.last_flush = time.monotonic()
+        if not (self.buffer or self.deltas):
+            return
+        rows = [record.asdict() for record in self.buffer.values()]
+        deltas = list(self.deltas.values())
+        self.buffer = {}
+        self.deltas = {}
+        table = Article.__table__
+        stmt = self.upsert_statement()
+        with self.engine.begin() as conn:
+            if rows:
+                if stmt is None:
+                    conn.execute(
+                        table.delete().where(
+                            table.c.link.in_([r['link'] for r in rows])
+                        )
+                    )
+                    stmt = table.insert()
+                conn.execute(stmt, rows)
+            if deltas:
+                conn.execute(
+                    table.update()
+                    .where(table.c.link == bindparam('b_link'))
+                    .values(comment_count=bindparam('comment_count'),
+                            like_count=bindparam('like_count'),
+                            fetched_time=bindparam('fetched_time')),
+                    deltas
+                )
+        self.stored()
+        logging.debug(
+            f'Exported {len(rows)} articles, {len(deltas)} counter updates.'
+        )
+
+
+class ParquetExportPipeline(BufferedPipeline):
+    """Write ArticleItem to rolling Parquet files.
+
+    Files are partitioned as `article_type=<type>/crawl_date=<date>/` under
+    `export_dir`. Each partition buffers at most `row_group_size` rows as
+    columns before they are written as one row group, and a new file is
+    started every `max_rows_per_file` rows. `ArticleDeltaItem` rows go to
+    the same partitions under `export_dir/deltas`, with only their fields.
+    Rows count as stored once their file is closed, as an unclosed Parquet
+    file cannot be read.
+    """
+
+    def __init__(
+        self,
+        export_dir: str,
+        row_group_size: int = 10000,
+        max_rows_per_file: int = 1000000
+    ) -> None:
+        """Set output directory and batch sizes.
+
+        Args:
+            export_dir (str): root directory of the partitions
+            row_group_size (int): rows per Parquet row group
+            max_rows_per_file (int): rows before rolling to a new file
+        """
+        import_pyarrow()
+        super().__init__()
+        self.export_dir = export_dir
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        self.schema = pa.schema([
+            ('uid', pa.string()),
+            ('link', pa.string()),
+            ('author', pa.string()),
+            ('author_id', pa.string()),
+            ('poster', pa.string()),
+            ('title', pa.string()),
+            ('content', pa.string()),
+            ('comment_count', pa.int64()),
+            ('like_count', pa.int64()),
+            ('created_time', pa.timestamp('ms')),
+            ('fetched_time', pa.timestamp('ms')),
+            ('article_type', pa.dictionary(pa.int32(), pa.string())),
+            ('tag', pa.list_(pa.string())),
+        ])
+        self.delta_schema = pa.schema([
+            self.schema.field(name) for name in ArticleDeltaItem.fields
+        ])
+        self.run_id = f'{datetime.now():%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.batches: Dict[Tuple[str, date, bool], Dict[str, List]] = {}
+        self.writers: Dict[Tuple[str, date, bool], object] = {}
+        self.rows_in_file: Dict[Tuple[str, date, bool], int] = (
+            defaultdict(int)
+        )
+        self.files: Dict[Tuple[str, date, bool], int] = defaultdict(int)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Scrapy's `from_crawler` method."""
+        settings = crawler.settings
+        if not settings.getbool('PARQUET_EXPORT_ENABLED'):
+            raise NotConfigured
+        try:
+            import_pyarrow()
+        except ImportError:
+            raise NotConfigured('pyarrow is not installed')
+        pipeline = cls(
+            export_dir=settings.get('PARQUET_EXPORT_DIR'),
+            row_group_size=settings.getint('PARQUET_ROW_GROUP_SIZE'),
+            max_rows_per_file=settings.getint('PARQUET_MAX_ROWS_PER_FILE')
+        )
+        pipeline.signals = crawler.signals
+        return pipeline
+
+    def process_item(self, item, spider):
+        """Append an item to the column batch of its partition."""
+        fetched_time = item.get('fetched_time') or datetime.now()
+        delta = isinstance(item, ArticleDeltaItem)
+        key = (item.get('article_type') or 'unknown', fetched_time.date(),
+               delta)
+        schema = self.delta_schema if delta else self.schema
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = {n: [] for n in schema.names}
+        for name in schema.names:
+            if name == 'tag':
+                tag = item.get('tag')
+                batch[name].append(tag.split(',') if tag else [])
+            elif name == 'fetched_time':
+                batch[name].append(fetched_time)
+            else:
+                batch[name].append(item.get(name))
+        self.buffered(item, key)
+        if len(batch['link']) >= self.row_group_size:
+            self.write(key)
+        return item
+
+    def close_spider(self, spider):
+        """Write the remaining rows and close every file."""
+        for key in list(self.batches):
+            self.write(key)
+        for key, writer in self.writers.items():
+            writer.close()
+            self.stored(key)
+        self.writers.clear()
+
+    def path(self, key: Tuple[str, date, bool]) -> str:
+        """Get the path of the current file of a partition.
+
+        Args:
+            key (Tuple[str, date, bool]): article type, crawl date and
+                                          whether rows are deltas
+
+        Returns:
+            str: parquet file path
+        """
+        article_type, crawl_date, delta = key
+        directory = os.path.join(
+            os.path.join(self.export_dir, 'deltas') if delta
+            else self.export_dir,
+            f'article_type={article_type}',
+            f'crawl_date={crawl_date.isoformat()}'
+        )
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(
+            directory, f'part-{self.run_id}-{self.files[key]:05d}.parquet'
+        )
+
+    def write(self, key: Tuple[str, date, bool]) -> None:
+        """Write the column batch of a partition as one row group.
+
+        Args:
+            key (Tuple[str, date, bool]): article type, crawl date and
+                                          whether rows are deltas
+        """
+        batch = self.batches.pop(key, None)
+        if not batch or not batch['link']:
+            return
+        schema = self.delta_schema if key[2] else self.schema
+        table = pa.Table.from_pydict(batch, schema=schema)
+        writer = self.writers.get(key)
+        if writer is None:
+            writer = self.writers[key] = pq.ParquetWriter(
+                self.path(key), schema
+            )
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_in_file[key] += table.num_rows
+        if self.rows_in_file[key] >= self.max_rows_per_file:
+            writer.close()
+            self.stored(key)
+            del self.writers[key]
+            self.rows_in_file[key] = 0
+            self.files[key] += 1
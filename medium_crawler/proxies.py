@@ -0,0 +1,194 @@
+"""Proxy pool with health scoring."""
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+class ProxyState:
+    """Health of one proxy.
+
+    Latency, error rate and ban rate are exponentially weighted moving
+    averages, so a proxy recovers its score after transient failures.
+    """
+
+    def __init__(self, url: str, alpha: float = 0.3) -> None:
+        """Set proxy url.
+
+        Args:
+            url (str): proxy url
+            alpha (float): weight of the latest observation
+        """
+        self.url = url
+        self.alpha = alpha
+        self.latency = 1.0
+        self.error_rate = 0.0
+        self.ban_rate = 0.0
+        self.failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        self.in_flight = 0
+
+    def average(self, current: float, value: float) -> float:
+        """Update a moving average."""
+        return current + self.alpha * (value - current)
+
+    @property
+    def score(self) -> float:
+        """Get the health score, higher is better."""
+        health = (1 - self.error_rate) * (1 - self.ban_rate)
+        return health / (self.latency + 0.1)
+
+    def quarantined(self, now: float) -> bool:
+        """Check whether the proxy is quarantined."""
+        return now < self.quarantined_until
+
+
+class ProxyPool:
+    """Pick the healthiest proxy, keeping one proxy per session.
+
+    A proxy is quarantined after `max_failures` consecutive errors or a
+    ban. When the quarantine is over, the first failure quarantines it
+    again for twice as long (up to `max_quarantine`) and the first success,
+    e.g. of a probe, restores it.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        max_failures: int = 3,
+        quarantine: float = 60,
+        max_quarantine: float = 3600
+    ) -> None:
+        """Set proxies and quarantine thresholds.
+
+        Args:
+            urls (Iterable[str]): proxy urls
+            max_failures (int): consecutive errors before quarantine
+            quarantine (float): seconds of the first quarantine
+            max_quarantine (float): upper bound of a quarantine in seconds
+        """
+        self.proxies: Dict[str, ProxyState] = {
+            url: ProxyState(url) for url in dict.fromkeys(urls) if url
+        }
+        self.max_failures = max_failures
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self.sessions: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        """Get the number of proxies."""
+        return len(self.proxies)
+
+    def healthy(self, now: Optional[float] = None) -> List[ProxyState]:
+        """Get the proxies that are not quarantined."""
+        now = time.monotonic() if now is None else now
+        return [p for p in self.proxies.values() if not p.quarantined(now)]
+
+    def due(self, now: Optional[float] = None) -> List[ProxyState]:
+        """Get the quarantined proxies whose quarantine is over."""
+        now = time.monotonic() if now is None else now
+        return [
+            p for p in self.proxies.values()
+            if p.quarantined_until and not p.quarantined(now)
+        ]
+
+    def pick(
+        self,
+        session: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> Optional[str]:
+        """Get a proxy for a request.
+
+        Args:
+            session (Optional[str]): sticky session key, e.g. medium username
+            now (Optional[float]): monotonic time
+
+        Returns:
+            Optional[str]: proxy url, None when every proxy is quarantined
+        """
+        now = time.monotonic() if now is None else now
+        if session is not None:
+            url = self.sessions.get(session)
+            if url and not self.proxies[url].quarantined(now):
+                return url
+        candidates = self.healthy(now)
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda p: p.score / (1 + p.in_flight))
+        if session is not None:
+            self.sessions[session] = best.url
+        return best.url
+
+    def success(
+        self,
+        url: str,
+        latency: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> None:
+        """Record a successful response.
+
+        Args:
+            url (str): proxy url
+            latency (Optional[float]): download latency in seconds
+            now (Optional[float]): monotonic time
+        """
+        now = time.monotonic() if now is None else now
+        proxy = self.proxies.get(url)
+        if proxy is None:
+            return
+        if latency is not None:
+            proxy.latency = proxy.average(proxy.latency, latency)
+        proxy.error_rate = proxy.average(proxy.error_rate, 0)
+        proxy.ban_rate = proxy.average(proxy.ban_rate, 0)
+        proxy.failures = 0
+        if proxy.quarantined_until and not proxy.quarantined(now):
+            proxy.quarantined_until = 0.0
+            proxy.quarantines = 0
+
+    def failure(
+        self,
+        url: str,
+        ban: bool = False,
+        now: Optional[float] = None
+    ) -> bool:
+        """Record an error or a ban.
+
+        Args:
+            url (str): proxy url
+            ban (bool): the response looks like a ban (403/429)
+            now (Optional[float]): monotonic time
+
+        Returns:
+            bool: True if the proxy was quarantined
+        """
+        now = time.monotonic() if now is None else now
+        proxy = self.proxies.get(url)
+        if proxy is None:
+            return False
+        proxy.error_rate = proxy.average(proxy.error_rate, 1)
+        proxy.ban_rate = proxy.average(proxy.ban_rate, 1 if ban else 0)
+        if proxy.quarantined(now):
+            # requests sent before the quarantine
+            return False
+        proxy.failures += 1
+        relapse = bool(proxy.quarantined_until)
+        if ban or relapse or proxy.failures >= self.max_failures:
+            self.quarantine_proxy(proxy, now)
+            return True
+        return False
+
+    def quarantine_proxy(
+        self,
+        proxy: ProxyState,
+        now: Optional[float] = None
+    ) -> None:
+        """Quarantine a proxy and move its sessions elsewhere."""
+        now = time.monotonic() if now is None else now
+        duration = min(
+            self.max_quarantine, self.quarantine * 2 ** proxy.quarantines
+        )
+        proxy.quarantines += 1
+        proxy.failures = 0
+        proxy.quarantined_until = now + duration
+        self.sessions = {
+            s: u for s, u in self.sessions.items() if u != proxy.url
+        }
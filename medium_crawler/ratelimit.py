@@ -0,0 +1,153 @@
+"""Adaptive request rate control."""
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Token bucket whose rate follows AIMD.
+
+    The rate grows by `increase` tokens/s after every successful response
+    and is multiplied by `decrease` after a throttling response (429/5xx).
+    A `Retry-After` blocks the bucket until the given time.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        min_rate: float = 0.1,
+        max_rate: float = 50,
+        increase: float = 0.05,
+        decrease: float = 0.5
+    ) -> None:
+        """Set the initial rate and AIMD parameters.
+
+        Args:
+            rate (float): initial tokens per second
+            burst (float): bucket capacity
+            min_rate (float): lower bound of the rate
+            max_rate (float): upper bound of the rate
+            increase (float): tokens/s added per success
+            decrease (float): rate factor applied per throttling response
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Take a token, borrowing from the future if none is left.
+
+        Args:
+            now (Optional[float]): monotonic time
+
+        Returns:
+            float: seconds to wait before sending the request
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def on_success(self) -> None:
+        """Increase the rate additively."""
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(
+        self,
+        retry_after: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> None:
+        """Decrease the rate multiplicatively.
+
+        Args:
+            retry_after (Optional[float]): seconds from `Retry-After`
+            now (Optional[float]): monotonic time
+        """
+        now = time.monotonic() if now is None else now
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class RateController:
+    """Token buckets per endpoint type and proxy."""
+
+    def __init__(self, endpoints: Dict[str, dict], **aimd) -> None:
+        """Set bucket parameters.
+
+        Args:
+            endpoints (Dict[str, dict]): `rate` and `burst` by endpoint
+                                         type, `default` for the others
+            **aimd: `min_rate`, `max_rate`, `increase` and `decrease`
+        """
+        self.endpoints = endpoints
+        self.aimd = aimd
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def bucket(self, endpoint: Optional[str], proxy: str = '') -> TokenBucket:
+        """Get the bucket of an endpoint type and proxy.
+
+        Args:
+            endpoint (Optional[str]): endpoint type, see `utils.endpoint_type`
+            proxy (str): proxy url, empty for direct requests
+
+        Returns:
+            TokenBucket: token bucket
+        """
+        endpoint = endpoint if endpoint in self.endpoints else 'default'
+        key = (endpoint, proxy)
+        if key not in self.buckets:
+            config = self.endpoints.get(endpoint, {'rate': 1, 'burst': 1})
+            self.buckets[key] = TokenBucket(
+                rate=config['rate'], burst=config['burst'], **self.aimd
+            )
+        return self.buckets[key]
+
+
+def parse_retry_after(value: Optional[bytes]) -> Optional[float]:
+    """Parse a `Retry-After` header.
+
+    Args:
+        value (Optional[bytes]): delay in seconds or an HTTP date
+
+    Returns:
+        Optional[float]: seconds to wait, None if absent or invalid
+    """
+    if not value:
+        return None
+    value = value.decode('latin1').strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(retry_times: int, base: float = 1, cap: float = 60) -> float:
+    """Exponential backoff with full jitter.
+
+    Args:
+        retry_times (int): number of retries so far, starting at 1
+        base (float): delay of the first retry
+        cap (float): maximum delay
+
+    Returns:
+        float: seconds to wait before the retry
+    """
+    return random.uniform(0, min(cap, base * 2 ** (retry_times - 1)))
@@ -1,20 +1,41 @@
 """Medium Crawler Command Line Tools."""
 import argparse
+import functools
 import logging
-from typing import List
+import multiprocessing
+import os
+import queue
+import sys
+import zlib
+from collections import Counter
+from os.path import abspath, dirname
+from typing import Dict, List, Optional
 
-from scrapy.crawler import CrawlerRunner
-from scrapy.utils.log import configure_logging
-from scrapy.utils.project import get_project_settings
-from sqlalchemy.orm import sessionmaker
-from twisted.internet import reactor
+if not __package__:
+    # run as `python medium_crawler/run.py`
+    sys.path.insert(0, dirname(dirname(abspath(__file__))))
 
-from models import Rule, create_new_table, db_connect
-from utils import timer
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from medium_crawler.models import (Rule, create_new_table,  # noqa: E402
+                                   db_connect)
+from medium_crawler.utils import timer  # noqa: E402
 
 launch_logger = logging.getLogger('launch_crawlers_logger')
-settings = get_project_settings()
-configure_logging(settings)
+
+
+@functools.lru_cache(maxsize=None)
+def project_settings() -> object:
+    """Load the scrapy project settings and configure logging once.
+
+    Returns:
+        object: scrapy settings
+    """
+    from scrapy.utils.log import configure_logging
+    from scrapy.utils.project import get_project_settings
+    settings = get_project_settings()
+    configure_logging(settings)
+    return settings
 
 
 def process_command() -> argparse.Namespace:
@@ -28,46 +49,343 @@ def process_command() -> argparse.Namespace:
                         help='Please input the scrapy spider name',
                         type=str,
                         required=True)
+    parser.add_argument('-i', '--incremental',
+                        help='Skip posts crawled by previous runs',
+                        action='store_true')
+    parser.add_argument('-r', '--resume',
+                        help='Directory to keep the crawl state in, '
+                             'a restarted crawl continues where it stopped',
+                        type=str)
+    parser.add_argument('-w', '--workers',
+                        help='Number of worker processes to shard rules on',
+                        type=int,
+                        default=1)
+    parser.add_argument('--shard-by',
+                        help='Rule attribute used to pick the worker',
+                        choices=['id', 'username'],
+                        default='id')
+    parser.add_argument('-d', '--daemon',
+                        help='Keep running and follow the changes of the '
+                             'rule table',
+                        action='store_true')
+    parser.add_argument('--poll-interval',
+                        help='Seconds between two loads of the rule table '
+                             'in daemon mode',
+                        type=float,
+                        default=30)
+    parser.add_argument('--max-crawlers',
+                        help='Maximum number of concurrent crawlers in '
+                             'daemon mode',
+                        type=int,
+                        default=4)
+    parser.add_argument('--base-url',
+                        help='Send the requests to a stand-in server '
+                             'instead of https://medium.com',
+                        type=str)
     return parser.parse_args()
 
 
-def start_crawlers(spider_name: str, rules: List[Rule]) -> None:
+def load_rules(engine: object) -> List[Rule]:
+    """Load the enabled rules.
+
+    Args:
+        engine (object): sqlalchemy engine, see `models.db_connect`
+
+    Returns:
+        List[Rule]: enabled rules, detached from their session
+    """
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    rules = session.query(Rule).filter_by(enable=1).all()
+    session.close()
+    return rules
+
+
+def find_spider(runner: object, spider_name: str) -> Optional[str]:
+    """Get the name of the first spider matching `spider_name`."""
+    crawlers = [c for c in runner.spider_loader.list() if spider_name in c]
+    return crawlers[0] if crawlers else None
+
+
+def start_crawlers(
+    spider_name: str,
+    rules: List[Rule],
+    incremental: bool = False,
+    resume: Optional[str] = None
+) -> List[dict]:
     """Start specified spiders from cmd with scrapy core api.
 
     Args:
         spider_name (str): scrapy spider name
         rules (List[Rule]): pass arguments for spider from database
+        incremental (bool): skip posts crawled by previous runs
+        resume (Optional[str]): crawl state directory, see `RESUME_DIR`
+
+    Returns:
+        List[dict]: scrapy stats of each crawler
     """
+    from scrapy.crawler import CrawlerRunner
+    from twisted.internet import reactor
+
+    settings = project_settings()
+    if resume:
+        settings.set('RESUME_DIR', resume)
     runner = CrawlerRunner(settings)
-    crawlers = runner.spider_loader.list()
-    crawlers = [c for c in crawlers if c.__contains__(spider_name)]
-    if crawlers:
+    spider = find_spider(runner, spider_name)
+    if spider:
+        started = []
         for rule in rules:
-            runner.crawl(crawlers[0], rule=rule)
+            crawler = runner.create_crawler(spider)
+            runner.crawl(crawler, rule=rule, incremental=incremental)
+            started.append(crawler)
         d = runner.join()
         d.addBoth(lambda _: reactor.stop())
         reactor.run()
         launch_logger.debug('all finished.')
-    else:
-        launch_logger.warning('provide the right spider name.')
+        return [crawler.stats.get_stats() for crawler in started]
+    launch_logger.warning('provide the right spider name.')
+    return []
 
 
-@timer
-def main():
-    """Execute."""
+def shard_rules(
+    rules: List[Rule],
+    workers: int,
+    shard_by: str = 'id'
+) -> List[List[Rule]]:
+    """Split rules between worker processes.
+
+    Args:
+        rules (List[Rule]): enabled rules
+        workers (int): number of worker processes
+        shard_by (str): `id`, or `username` to keep a writer on one worker
+
+    Returns:
+        List[List[Rule]]: rules of each worker
+    """
+    shards = [[] for _ in range(workers)]
+    for rule in rules:
+        if shard_by == 'username':
+            key = zlib.crc32((rule.username or rule.url or '').encode())
+        else:
+            key = rule.id
+        shards[key % workers].append(rule)
+    return shards
+
+
+def aggregate_stats(stats: List[dict]) -> Dict[str, object]:
+    """Sum numeric scrapy stats and count finish reasons.
+
+    Args:
+        stats (List[dict]): scrapy stats of each crawler
+
+    Returns:
+        Dict[str, object]: aggregated stats
+    """
+    total = Counter()
+    reasons = Counter()
+    for crawler_stats in stats:
+        for key, value in crawler_stats.items():
+            if key == 'finish_reason':
+                reasons[value] += 1
+            elif isinstance(value, (int, float)) and 'time' not in key:
+                total[key] += value
+    return {**total, 'finish_reason': dict(reasons)}
+
+
+def exit_code(stats: List[dict]) -> int:
+    """Get the exit code of a batch of crawlers.
+
+    Args:
+        stats (List[dict]): scrapy stats of each crawler
+
+    Returns:
+        int: 0 if every crawler finished normally, otherwise 1
+    """
+    if all(s.get('finish_reason') == 'finished' for s in stats):
+        return 0
+    return 1
+
+
+def run_worker(
+    spider_name: str,
+    rule_ids: List[int],
+    incremental: bool,
+    resume: Optional[str],
+    results: multiprocessing.Queue
+) -> None:
+    """Crawl a shard of rules in its own process and reactor.
+
+    Rules are loaded again from the database so that `DATABASE_URL` of the
+    parent applies.
+
+    Args:
+        spider_name (str): scrapy spider name
+        rule_ids (List[int]): ids of the rules of this shard
+        incremental (bool): skip posts crawled by previous runs
+        resume (Optional[str]): crawl state directory
+        results (multiprocessing.Queue): queue to send crawler stats to
+    """
     engine = db_connect()
-    create_new_table(engine=engine)
     Session = sessionmaker(bind=engine)
     session = Session()
-    rules = session.query(Rule).filter_by(enable=1).all()
+    rules = session.query(Rule).filter(Rule.id.in_(rule_ids)).all()
     session.close()
+    stats = start_crawlers(
+        spider_name=spider_name,
+        rules=rules,
+        incremental=incremental,
+        resume=resume
+    )
+    results.put(stats)
+    sys.exit(exit_code(stats) if stats else 1)
+
+
+def start_workers(
+    spider_name: str,
+    rules: List[Rule],
+    workers: int,
+    shard_by: str = 'id',
+    incremental: bool = False,
+    resume: Optional[str] = None
+) -> int:
+    """Shard rules across worker processes and wait for them.
+
+    Args:
+        spider_name (str): scrapy spider name
+        rules (List[Rule]): pass arguments for spider from database
+        workers (int): number of worker processes
+        shard_by (str): `id` or `username`
+        incremental (bool): skip posts crawled by previous runs
+        resume (Optional[str]): crawl state directory
+
+    Returns:
+        int: 0 if every worker succeeded, otherwise 1
+    """
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    processes = []
+    for shard in shard_rules(rules, workers, shard_by):
+        if not shard:
+            continue
+        process = ctx.Process(
+            target=run_worker,
+            args=(spider_name, [r.id for r in shard], incremental, resume,
+                  results)
+        )
+        process.start()
+        processes.append(process)
+
+    stats = []
+    remaining = len(processes)
+    while remaining:
+        try:
+            stats.extend(results.get(timeout=1))
+            remaining -= 1
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes):
+                break
+    for process in processes:
+        process.join()
+    launch_logger.info(f'aggregated stats: {aggregate_stats(stats)}')
+    codes = [p.exitcode for p in processes]
+    launch_logger.debug(f'worker exit codes: {codes}')
+    return 0 if all(code == 0 for code in codes) else 1
+
 
+def start_daemon(
+    spider_name: str,
+    poll_interval: float = 30,
+    max_crawlers: int = 4,
+    incremental: bool = False,
+    resume: Optional[str] = None
+) -> int:
+    """Crawl the enabled rules until the process is stopped.
+
+    New, changed and disabled rules are picked up every `poll_interval`
+    seconds without restarting, see `daemon.RuleDaemon`.
+
+    Args:
+        spider_name (str): scrapy spider name
+        poll_interval (float): seconds between two loads of the rule table
+        max_crawlers (int): maximum number of concurrent crawlers
+        incremental (bool): skip posts crawled by previous runs
+        resume (Optional[str]): crawl state directory, see `RESUME_DIR`
+
+    Returns:
+        int: process exit code
+    """
+    from scrapy.crawler import CrawlerRunner
+    from twisted.internet import reactor
+
+    from medium_crawler.daemon import RuleDaemon
+
+    settings = project_settings()
+    if resume:
+        settings.set('RESUME_DIR', resume)
+    runner = CrawlerRunner(settings)
+    spider = find_spider(runner, spider_name)
+    if not spider:
+        launch_logger.warning('provide the right spider name.')
+        return 1
+    engine = db_connect()
+    daemon = RuleDaemon(
+        runner=runner,
+        spider_name=spider,
+        load_rules=lambda: load_rules(engine),
+        interval=poll_interval,
+        max_crawlers=max_crawlers,
+        crawl_kwargs={'incremental': incremental}
+    )
+    reactor.callWhenRunning(daemon.start)
+    reactor.addSystemEventTrigger('before', 'shutdown', daemon.stop)
+    reactor.run()
+    launch_logger.debug('daemon stopped.')
+    return 0
+
+
+@timer
+def main() -> int:
+    """Execute.
+
+    Returns:
+        int: process exit code
+    """
     arg = vars(process_command())
-    if rules:
-        start_crawlers(spider_name=arg.get('spider'), rules=rules)
-    else:
+    if arg.get('base_url'):
+        # read by `settings`, in this process and in the workers
+        os.environ['MEDIUM_BASE_URL'] = arg['base_url'].rstrip('/')
+    project_settings()
+    engine = db_connect()
+    create_new_table(engine=engine)
+    if arg.get('daemon'):
+        return start_daemon(
+            spider_name=arg.get('spider'),
+            poll_interval=arg.get('poll_interval'),
+            max_crawlers=arg.get('max_crawlers'),
+            incremental=arg.get('incremental'),
+            resume=arg.get('resume')
+        )
+    rules = load_rules(engine)
+    if not rules:
         launch_logger.warning('no rule need to be crawled.')
+        return 0
+    if arg.get('workers') > 1:
+        return start_workers(
+            spider_name=arg.get('spider'),
+            rules=rules,
+            workers=arg.get('workers'),
+            shard_by=arg.get('shard_by'),
+            incremental=arg.get('incremental'),
+            resume=arg.get('resume')
+        )
+    stats = start_crawlers(
+        spider_name=arg.get('spider'),
+        rules=rules,
+        incremental=arg.get('incremental'),
+        resume=arg.get('resume')
+    )
+    return exit_code(stats) if stats else 1
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
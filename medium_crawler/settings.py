@@ -1,24 +1,151 @@
 """Scrapy settings."""
+import os
+
+from medium_crawler import install_color_logging
+from medium_crawler.utils import strtobool
+
+# colorize the log, opt-in to keep `import medium_crawler` cheap
+if strtobool(os.environ.get('COLOR_LOGS', 'FALSE')):
+    install_color_logging()
 
 BOT_NAME = 'medium_crawler'
 SPIDER_MODULES = ['medium_crawler.spiders']
 NEWSPIDER_MODULE = 'medium_crawler.spiders'
 
+# medium or a stand-in server, e.g. `python -m benchmarks.mock_medium`
+MEDIUM_BASE_URL = os.environ.get('MEDIUM_BASE_URL', 'https://medium.com')
+
 ROBOTSTXT_OBEY = False
+# used while RATE_CONTROL_ENABLED is off, see `MediumPost.update_settings`
 DOWNLOAD_DELAY = 0.3
 AUTOTHROTTLE_ENABLED = True
 AUTOTHROTTLE_START_DELAY = 5
 AUTOTHROTTLE_MAX_DELAY = 60
 AUTOTHROTTLE_TARGET_CONCURRENCY = 5.0
 AUTOTHROTTLE_DEBUG = True
-RETRY_HTTP_CODES = [500, 503, 504, 400, 408]
-RETRY_TIMES = 10
+RETRY_HTTP_CODES = [500, 502, 503, 504, 400, 408, 429]
+RETRY_TIMES = 6
+RETRY_BACKOFF_BASE = 1  # seconds
+RETRY_BACKOFF_MAX = 60
+
+# token bucket per endpoint type and proxy, see `ratelimit.RateController`;
+# off by default, enable it with `-s RATE_CONTROL_ENABLED=True`, which also
+# turns DOWNLOAD_DELAY and AutoThrottle off unless they are set on the
+# command line
+RATE_CONTROL_ENABLED = False
+RATE_CONTROL_ENDPOINTS = {
+    'profile': {'rate': 2, 'burst': 4},  # requests per second
+    'post': {'rate': 5, 'burst': 10},
+    'comment': {'rate': 2, 'burst': 4},
+    'default': {'rate': 2, 'burst': 4},
+}
+RATE_CONTROL_MIN_RATE = 0.1
+RATE_CONTROL_MAX_RATE = 50
+RATE_CONTROL_INCREASE = 0.05
+RATE_CONTROL_DECREASE = 0.5
+
+# post urls streamed from the `url_source` spider argument, see `sources`
+URL_SOURCE_RATE = 0  # start requests per second, 0 for no limit
+URL_SOURCE_CHUNK_SIZE = 1000  # rows per query of `db:` sources
+
+# comment pages and comments crawled per post, 0 for no limit
+COMMENT_MAX_PAGES = 0
+COMMENT_BUDGET = 0
+# posts whose comments are being crawled, see `parents.PostTable`
+POST_TABLE_MAX_ENTRIES = 10000
+
+# on-disk cache of user profiles, see `authors.ProfileStore`
+PROFILE_CACHE_ENABLED = True
+PROFILE_CACHE_TTL = 86400  # seconds
+PROFILE_CACHE_MAX_ENTRIES = 100000
+
+# one of `auto`, `orjson`, `simdjson` or `json`, see `payload.get_decoder`
+PAYLOAD_JSON_BACKEND = 'auto'
+
+# decode and extract payloads in `thread` or `process` workers shared by every
+# crawler of the process, see `parsing.ParsePool`; None parses inline
+PARSE_POOL = None
+PARSE_POOL_WORKERS = 2
+PARSE_POOL_MAX_IN_FLIGHT = 8  # payloads submitted to the workers at a time
+
+# one fingerprint index for every crawler of the process, see `dupefilters`
+DUPEFILTER_CLASS = 'medium_crawler.dupefilters.SharedDupeFilter'
+SHARED_DUPEFILTER_PATH = None  # file to persist fingerprints between runs
+SHARED_DUPEFILTER_VOLATILE_CALLBACKS = ['parse_links']
 
 ITEM_PIPELINES = {
     'medium_crawler.pipelines.DefaultValuesPipeline': 100,
     'medium_crawler.pipelines.AutoFetchTime': 200,
+    'medium_crawler.pipelines.ChangeDetectionPipeline': 250,
+    'medium_crawler.pipelines.ArticleExportPipeline': 300,
+    'medium_crawler.pipelines.ParquetExportPipeline': 400,
 }
 
+# drop items unchanged since the previous run, see `changes.ContentIndex`
+CHANGE_INDEX_PATH = None  # SQLite file of the content fingerprints
+CHANGE_INDEX_FLUSH_SIZE = 1000
+LOG_FORMATTER = 'medium_crawler.logformatter.MediumLogFormatter'
+
+# batched upsert of items into the `article` table
+ARTICLE_EXPORT_ENABLED = False
+ARTICLE_EXPORT_BATCH_SIZE = 500
+ARTICLE_EXPORT_FLUSH_INTERVAL = 5  # seconds
+
+# rolling parquet files partitioned by article type and crawl date
+PARQUET_EXPORT_ENABLED = False
+PARQUET_EXPORT_DIR = 'exports'
+PARQUET_ROW_GROUP_SIZE = 10000
+PARQUET_MAX_ROWS_PER_FILE = 1000000
+
+SPIDER_MIDDLEWARES = {
+    'medium_crawler.middlewares.ResumeMiddleware': 10,
+    'medium_crawler.middlewares.CallbackMetricsMiddleware': 990,
+}
+
+# journal of pending requests and emitted items, see `ResumeMiddleware`
+RESUME_DIR = None  # e.g. 'jobs/backfill', `run.py --resume` sets it
+RESUME_FLUSH_INTERVAL = 1  # seconds
+
+EXTENSIONS = {
+    'medium_crawler.extensions.CallbackMetrics': 500,
+}
+
+# per-callback latency/throughput histograms, see `extensions.CallbackMetrics`
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_INTERVAL = 60  # seconds
+INSTRUMENTATION_PROMETHEUS_FILE = None  # e.g. 'metrics/{spider}-{rule}.prom'
+
 DOWNLOADER_MIDDLEWARES = {
     'medium_crawler.middlewares.ProxyMiddleware': 100,
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+    'medium_crawler.middlewares.BackoffRetryMiddleware': 550,
+    'medium_crawler.middlewares.MediumCacheMiddleware': 900,
+    'medium_crawler.middlewares.RateLimitMiddleware': 950,
+}
+
+# keep-alive connections per host and proxy, see `handlers`
+DOWNLOAD_HANDLERS = {
+    'http': 'medium_crawler.handlers.PooledHTTPDownloadHandler',
+    'https': 'medium_crawler.handlers.PooledHTTPDownloadHandler',
+}
+HTTP_POOL_MAX_PER_HOST = 0  # idle connections, 0 for per-domain concurrency
+HTTP_POOL_IDLE_TIMEOUT = 240  # seconds
+HTTP_POOL_MAX_REQUESTS = 0  # requests per connection, 0 for no limit
+
+# proxy pool, enabled by the `PROXY_ENABLED` environment variable
+PROXY_LIST = []  # in addition to the `PROXY` environment variable
+PROXY_FROM_DATABASE = True  # enabled rows of the `proxy` table
+PROXY_MAX_FAILURES = 3  # consecutive errors before quarantine
+PROXY_QUARANTINE_TIME = 60  # seconds, doubled on every relapse
+PROXY_MAX_QUARANTINE_TIME = 3600
+PROXY_PROBE_URL = 'https://medium.com/robots.txt'
+PROXY_PROBE_INTERVAL = 30  # seconds
+
+# on-disk cache of medium JSON responses, see `MediumCacheMiddleware`
+MEDIUM_CACHE_ENABLED = False
+MEDIUM_CACHE_DIR = '.medium_cache'
+MEDIUM_CACHE_TTLS = {
+    'profile': 3600,  # seconds
+    'post': 604800,
+    'comment': 3600,
 }
@@ -0,0 +1,184 @@
+"""Streaming sources of post urls, for bulk re-crawls."""
+import hashlib
+import io
+import logging
+import re
+import sys
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import MetaData, Table, select
+
+from .dupefilters import FingerprintIndex
+
+logger = logging.getLogger(__name__)
+
+FILE_PREFIX = 'file:'
+DB_PREFIX = 'db:'
+STDIN = '-'
+# medium post ids are 8 to 16 hex digits, `/p/<id>` is their short url
+POST_ID = re.compile(r'[0-9a-f]{8,16}')
+
+
+def is_source(value: Optional[str]) -> bool:
+    """Tell whether a `url` argument names a source rather than urls."""
+    return bool(value) and (
+        value == STDIN or value.startswith((FILE_PREFIX, DB_PREFIX))
+    )
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """Get the canonical form of a post url.
+
+    The scheme becomes https, the host is lowercased without `www.`, and
+    the query, fragment and trailing slash are dropped. A bare post id
+    becomes `https://medium.com/p/<id>`.
+
+    Args:
+        url (str): post url, with or without scheme, or post id
+
+    Returns:
+        Optional[str]: canonical url, None for blank lines, `#` comments
+                       and urls without host or path
+    """
+    url = url.strip()
+    if not url or url.startswith('#'):
+        return None
+    if POST_ID.fullmatch(url):
+        return f'https://medium.com/p/{url}'
+    if '://' not in url:
+        url = f'https://{url}'
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    if parts.scheme not in ('http', 'https') or not host or not path:
+        return None
+    return f'https://{host}{path}'
+
+
+def read_file(path: str) -> Iterator[str]:
+    """Read urls line by line from a file, or stdin for `-`."""
+    if path == STDIN:
+        yield from io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        return
+    with open(path, encoding='utf-8') as f:
+        yield from f
+
+
+def read_table(
+    engine: object,
+    table: str,
+    column: str,
+    chunk_size: int = 1000
+) -> Iterator[str]:
+    """Read urls from a table, one chunk per query.
+
+    Chunks are read in `column` order after the last value of the
+    previous chunk, so no cursor stays open while the crawl writes to
+    the same database. Index the column of a large table.
+
+    Args:
+        engine (object): sqlalchemy engine, see `models.db_connect`
+        table (str): table name
+        column (str): url column
+        chunk_size (int): rows per query
+
+    Yields:
+        str: url
+    """
+    url = Table(table, MetaData(), autoload_with=engine).c[column]
+    last = None
+    while True:
+        query = select([url]).where(url.isnot(None))
+        if last is not None:
+            query = query.where(url > last)
+        with engine.connect() as conn:
+            rows = conn.execute(
+                query.order_by(url).limit(chunk_size)
+            ).fetchall()
+        for row in rows:
+            yield row[0]
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def open_source(
+    source: str,
+    engine: Optional[object] = None,
+    chunk_size: int = 1000
+) -> Iterator[str]:
+    """Read the urls of a source.
+
+    Args:
+        source (str): `-` for stdin, `db:<table>.<column>`, or a file
+                      path, optionally prefixed with `file:`
+        engine (Optional[object]): sqlalchemy engine of `db:` sources
+        chunk_size (int): rows per query of `db:` sources
+
+    Returns:
+        Iterator[str]: lazy iterator of raw urls
+
+    Raises:
+        ValueError: if a `db:` source has no column
+    """
+    if source.startswith(DB_PREFIX):
+        table, _, column = source[len(DB_PREFIX):].rpartition('.')
+        if not table:
+            raise ValueError(f'expected db:<table>.<column>, got {source!r}')
+        if engine is None:
+            from .models import db_connect
+            engine = db_connect()
+        return read_table(engine, table, column, chunk_size)
+    if source.startswith(FILE_PREFIX):
+        source = source[len(FILE_PREFIX):]
+    return read_file(source)
+
+
+def url_fingerprint(url: str) -> int:
+    """Get the 64-bit fingerprint of a normalized url."""
+    return int.from_bytes(hashlib.sha1(url.encode()).digest()[:8], 'big')
+
+
+class UrlStream:
+    """Normalized, deduplicated urls of a source.
+
+    Urls are read one at a time; only the 8-byte fingerprint of each url
+    seen stays in memory, see `dupefilters.FingerprintIndex`.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        stats: Optional[object] = None
+    ) -> None:
+        """Set source.
+
+        Args:
+            urls (Iterable[str]): raw urls
+            stats (Optional[object]): scrapy stats collector
+        """
+        self.urls = urls
+        self.stats = stats
+        self.seen = FingerprintIndex()
+
+    def inc(self, name: str) -> None:
+        """Increment a `url_source/` counter."""
+        if self.stats is not None:
+            self.stats.inc_value(f'url_source/{name}')
+
+    def __iter__(self) -> Iterator[str]:
+        for raw in self.urls:
+            self.inc('read')
+            url = normalize_url(raw)
+            if url is None:
+                if raw.strip() and not raw.lstrip().startswith('#'):
+                    logger.debug(f'Skip invalid url {raw.strip()!r}')
+                    self.inc('invalid')
+                continue
+            if not self.seen.add(url_fingerprint(url)):
+                self.inc('duplicate')
+                continue
+            yield url
@@ -1,24 +1,38 @@
 """Medium Crawler."""
-import json
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Iterator, Union
+from typing import (Any, AsyncIterator, Awaitable, Callable, Iterator,
+                    Optional, Set, Union)
 
 import dateutil.parser as dp
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.python.failure import Failure
 
-from .. import items
+from .. import (authors, items, models, parents, parsing, payload, sources,
+                utils, watermarks)
+
+
+MEDIUM_URL = 'https://medium.com'
+REFRESH_MODES = ('metrics', 'comments')
+# responses per `responsesStream` page when a refresh resumes the stream
+COMMENT_PAGE_LIMIT = 50
 
 
 class MediumPost(scrapy.Spider):
     """Crawl medium post."""
 
     name = 'medium'
+    # the feed (profile pages and posts) before comments before authors,
+    # newer `updatedAt` first within each kind, see `priority`
+    priorities = {'post': 200, 'comment': 100, 'author': 0}
 
     def __init__(self, *args, **kwargs) -> None:
         """Pass extra arguments for spider.
 
-        If `urls` is set, `usernames` will be ignored.
+        If `urls` or `url_source` is set, `usernames` will be ignored.
         If `date` is set, `back` will be ignored.
 
         Args:
@@ -26,7 +40,18 @@ class MediumPost(scrapy.Spider):
                                           profile page names
             date (Union[str, None]): crawling date (YYYYMMDD)
             back (Union[str, int, None]): number of days to be crawled
-            urls (Union[str, None]): comma-separated url list
+            urls (Union[str, None]): comma-separated url list, or a
+                                     source, see `url_source`
+            url_source (Union[str, None]): stream post urls from `-`
+                                           (stdin), a file path
+                                           (`file:` prefix optional) or
+                                           `db:<table>.<column>`
+            incremental (Union[str, bool, None]): skip posts crawled by
+                                                  previous runs
+            refresh (Union[str, None]): only emit the counters of the
+                                        posts (`metrics`), and also the
+                                        responses posted since the
+                                        previous refresh (`comments`)
             rule (Union[models.Rule, None]): pass arguments from database
         """
         super().__init__(*args, **kwargs)
@@ -35,6 +60,14 @@ class MediumPost(scrapy.Spider):
         date = kwargs.get('date') or rule.get('date')
         back = kwargs.get('back') or rule.get('back')
         urls = kwargs.get('urls') or rule.get('url')
+        url_source = kwargs.get('url_source')
+        if not url_source and sources.is_source(urls):
+            url_source, urls = urls, None
+        incremental = kwargs.get('incremental')
+        refresh = kwargs.get('refresh')
+        if refresh and refresh not in REFRESH_MODES:
+            raise ValueError(f'Unknown refresh mode: {refresh!r}')
+        self.rule_id = rule.get('id')
 
         if date:
             self.start_date = datetime.strptime(date, '%Y%m%d')
@@ -57,34 +90,262 @@ class MediumPost(scrapy.Spider):
             self.urls = urls.strip().split(',')
         else:
             self.urls = None
+        self.url_source = url_source
+        self.url_source_rate = 0.0
+        self.url_source_chunk_size = 1000
         self.pagination_url = (
             '{path}?limit={limit}&to={to}&'
             'source={source}&page={page}'
         )
         self.comment_pagination_url = (
-            'https://medium.com{path}?'
+            '{base_url}{path}?'
             'limit={limit}&to={to}'
         )
+        self.base_url = MEDIUM_URL
+        self.profiles = None
+        self.authors = authors.AuthorResolver()
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        self.watermarks = None
+        self.refresh = refresh
+        self.cursors = None
+        self.decode = payload.decode
+        self.json_backend = 'auto'
+        self.parse_pool = None
+        self.comment_max_pages = 0
+        self.comment_budget = 0
+        self.posts = parents.PostTable()
+        self.relooked: Set[str] = set()
+
+    @classmethod
+    def update_settings(cls, settings) -> None:
+        """Replace the flat delay and AutoThrottle when rate control is on.
+
+        Values given on the command line are kept.
+        """
+        super().update_settings(settings)
+        if settings.getbool('RATE_CONTROL_ENABLED'):
+            settings.set('DOWNLOAD_DELAY', 0, priority='spider')
+            settings.set('AUTOTHROTTLE_ENABLED', False, priority='spider')
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        """Set payload decoder and attach the enabled on-disk stores."""
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        spider.base_url = settings.get('MEDIUM_BASE_URL', MEDIUM_URL)
+        spider.json_backend = settings.get('PAYLOAD_JSON_BACKEND', 'auto')
+        spider.decode = payload.get_decoder(spider.json_backend)
+        if settings.get('PARSE_POOL'):
+            spider.parse_pool = parsing.ParsePool.get(
+                kind=settings.get('PARSE_POOL'),
+                workers=settings.getint('PARSE_POOL_WORKERS'),
+                max_in_flight=settings.getint('PARSE_POOL_MAX_IN_FLIGHT')
+            )
+            crawler.signals.connect(
+                spider.parse_pool.release, signal=signals.spider_closed
+            )
+        spider.url_source_rate = settings.getfloat('URL_SOURCE_RATE')
+        spider.url_source_chunk_size = settings.getint(
+            'URL_SOURCE_CHUNK_SIZE', 1000
+        )
+        spider.comment_max_pages = settings.getint('COMMENT_MAX_PAGES')
+        spider.comment_budget = settings.getint('COMMENT_BUDGET')
+        spider.posts = parents.PostTable(
+            max_entries=settings.getint('POST_TABLE_MAX_ENTRIES', 10000)
+        )
+        crawler.signals.connect(
+            spider.lookup_parked, signal=signals.spider_idle
+        )
+        crawler.signals.connect(
+            spider.drop_parked, signal=signals.spider_closed
+        )
+        if settings.getbool('PROFILE_CACHE_ENABLED'):
+            spider.profiles = authors.ProfileStore(
+                engine=models.db_connect(),
+                ttl=settings.getfloat('PROFILE_CACHE_TTL'),
+                max_entries=settings.getint('PROFILE_CACHE_MAX_ENTRIES')
+            )
+            spider.authors = authors.AuthorResolver(
+                authors.AuthorCache(store=spider.profiles)
+            )
+            crawler.signals.connect(
+                spider.profiles.close, signal=signals.spider_closed
+            )
+        if spider.incremental:
+            spider.watermarks = watermarks.WatermarkStore(
+                engine=models.db_connect()
+            )
+            crawler.signals.connect(
+                spider.watermarks.flush, signal=signals.spider_closed
+            )
+        if spider.refresh == 'comments':
+            spider.cursors = watermarks.CursorStore(engine=models.db_connect())
+            crawler.signals.connect(
+                spider.cursors.flush, signal=signals.spider_closed
+            )
+        return spider
+
+    @property
+    def pending_items(self) -> int:
+        """Number of comments waiting on an author lookup."""
+        return self.authors.pending
+
+    def lookup_parked(self) -> None:
+        """Look up again the authors of comments still parked when idle.
+
+        Nothing is in flight once the spider is idle, so their lookup was
+        lost; each author is looked up once more before the spider closes.
+
+        Raises:
+            DontCloseSpider: if a lookup was scheduled
+        """
+        waiting = {
+            author_id: link
+            for author_id, link in self.authors.waiting().items()
+            if author_id not in self.relooked
+        }
+        for author_id, link in waiting.items():
+            utils.schedule(self.crawler, self.author_request(
+                author_id, link[len(MEDIUM_URL):]
+            ))
+        self.relooked.update(waiting)
+        if waiting:
+            raise DontCloseSpider
+
+    def drop_parked(self) -> None:
+        """Log comments whose author lookups never came back."""
+        if self.authors.pending:
+            logging.warning(
+                f'Dropped {self.authors.pending} comments waiting on '
+                f'{len(self.authors.waiting())} author lookups'
+            )
+
+    def author_request(
+        self,
+        author_id: str,
+        path: str,
+        updated_at: Optional[int] = None
+    ) -> scrapy.Request:
+        """Build the lookup of a comment author.
+
+        The request is never filtered: comments parked on it are only
+        released by its callback or errback.
+
+        Args:
+            author_id (str): medium user id
+            path (str): path of one of the author's comments
+            updated_at (Optional[int]): `updatedAt` (ms) of the post
+
+        Returns:
+            scrapy.Request: scrapy request object
+        """
+        return scrapy.Request(
+            url=f'{self.base_url}{path}?format=json',
+            meta={'author_id': author_id},
+            callback=self.get_comment_author_name,
+            errback=self.get_comment_author_failed,
+            priority=self.priority('author', updated_at),
+            dont_filter=True
+        )
+
+    def priority(self, kind: str, updated_at: Optional[int] = None) -> int:
+        """Get the priority of a request.
+
+        Args:
+            kind (str): `post`, `comment` or `author`
+            updated_at (Optional[int]): `updatedAt` (ms) of the post
+
+        Returns:
+            int: kind priority plus up to 99 for posts of the last 99 days
+        """
+        recency = 0
+        if updated_at:
+            age = (time.time() * 1000 - updated_at) / 86400000
+            recency = min(99, max(0, 99 - int(age)))
+        return self.priorities[kind] + recency
+
+    @property
+    def refetch(self) -> bool:
+        """Whether posts fetched by earlier runs are fetched again."""
+        return self.incremental or bool(self.refresh)
+
+    @property
+    def post_callback(self) -> Callable[..., Any]:
+        """Callback of post requests, `refresh_post` in refresh mode."""
+        return self.refresh_post if self.refresh else self.post
+
+    def rebase(self, url: str) -> str:
+        """Point a medium.com url at `base_url`.
+
+        Args:
+            url (str): medium url
+
+        Returns:
+            str: url on `MEDIUM_BASE_URL`
+        """
+        if url.startswith(MEDIUM_URL) and self.base_url != MEDIUM_URL:
+            return self.base_url + url[len(MEDIUM_URL):]
+        return url
+
+    async def start(self) -> AsyncIterator[scrapy.Request]:
+        """Start requests on scrapy 2.13+, see `start_requests`.
+
+        Scrapy reads `start` as fast as it yields, so while the engine is
+        busy the next request waits for the scheduler to be empty, and at
+        most `URL_SOURCE_RATE` requests are yielded per second. Earlier
+        scrapy reads `start_requests` only while the engine is not busy.
+
+        Yields:
+            scrapy.Request: scrapy request object
+        """
+        engine = getattr(getattr(self, 'crawler', None), 'engine', None)
+        started = time.monotonic()
+        for sent, request in enumerate(self.start_requests()):
+            if engine is not None and engine.needs_backout():
+                await self.crawler.signals.wait_for(signals.scheduler_empty)
+            if self.url_source_rate:
+                ahead = sent / self.url_source_rate - (
+                    time.monotonic() - started
+                )
+                if ahead > 0:
+                    await utils.sleep(ahead)
+            yield request
 
     def start_requests(self) -> Iterator[scrapy.Request]:
         """Start requests.
 
+        Urls of `urls` and `url_source` are read lazily, normalized and
+        deduplicated, see `sources.UrlStream`.
+
         Yields:
             scrapy.Request: scrapy request object
         """
-        if self.urls:
-            for url in self.urls:
+        if self.urls or self.url_source:
+            urls = self.urls or sources.open_source(
+                self.url_source, chunk_size=self.url_source_chunk_size
+            )
+            stats = getattr(getattr(self, 'crawler', None), 'stats', None)
+            for url in sources.UrlStream(urls, stats=stats):
                 yield scrapy.Request(
-                    url=f'{url}?format=json',
-                    callback=self.post
+                    url=f'{self.rebase(url)}?format=json',
+                    callback=self.post_callback,
+                    priority=self.priority('post')
                 )
         elif self.usernames:
             for username in self.usernames:
-                url = f'https://medium.com/@{username}?format=json'
+                url = f'{self.base_url}/@{username}?format=json'
+                meta = {'uid': username}
+                profile = (
+                    self.profiles.get_by_username(username)
+                    if self.profiles else None
+                )
+                if profile:
+                    meta['user_id'] = profile['user_id']
                 yield scrapy.Request(
                     url=url,
-                    meta={'uid': username},
-                    callback=self.parse_links
+                    meta=meta,
+                    callback=self.parse_links,
+                    priority=self.priority('post', int(time.time() * 1000))
                 )
 
     def parse_links_logic(
@@ -104,44 +365,140 @@ class MediumPost(scrapy.Spider):
             bool: if false, stop to crawl the next post
             scrapy.Request: scrapy request object
         """
+        mark = (
+            self.watermarks.get(response.meta['uid'])
+            if self.watermarks else None
+        )
         for k, v in posts.items():
             updated_time = datetime.fromtimestamp(v['updatedAt'] / 1000)
             if updated_time.date() < self.start_date.date():
                 _next = False
                 yield _next
                 break
-            if user_id == v['creatorId']:
-                url = (
-                    f"https://medium.com/{user_id}/{v['id']}?format=json"
+            if mark and v['updatedAt'] <= mark[0]:
+                # reached posts already crawled by a previous run
+                _next = False
+                yield _next
+                break
+            if self.watermarks and user_id == v['creatorId']:
+                self.watermarks.list_post(
+                    response.meta['uid'], v['id'], v['updatedAt']
                 )
+                if self.watermarks.updated_at(
+                    response.meta['uid'], v['id']
+                ) == v['updatedAt']:
+                    logging.debug(f"Skip unchanged post {v['id']}")
+                    self.watermarks.mark(
+                        response.meta['uid'], v['id'], v['updatedAt']
+                    )
+                    continue
+            if user_id == v['creatorId']:
+                url = f"{self.base_url}/{user_id}/{v['id']}?format=json"
                 yield scrapy.Request(
                     url=url,
                     meta=response.meta,
-                    callback=self.post
+                    callback=self.post_callback,
+                    priority=self.priority('post', v['updatedAt'])
                 )
             else:
                 logging.warning('Not this post creator!')
 
+    def extract(
+        self,
+        response: scrapy.http.Response,
+        extract: Callable[..., Any],
+        output: Callable[..., Iterator[Any]],
+        *args: Any
+    ) -> Union[Iterator[Any], Awaitable[Iterator[Any]]]:
+        """Decode and extract a payload, then build the callback output.
+
+        Without parse pool, the payload is decoded and extracted when the
+        output is first iterated, so that `CallbackMetricsMiddleware` times
+        it with the rest of the callback. Otherwise it runs in a worker and
+        the callback returns a coroutine, awaited by scrapy like the result
+        of an `async def` callback; the output is still built on the
+        reactor because it uses the spider state.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            extract (Callable[..., Any]): extraction function of `parsing`
+            output (Callable[..., Iterator[Any]]): generator of the items
+                and requests, called with the response and the extraction
+            *args (Any): other arguments of `extract`
+
+        Returns:
+            Union[Iterator[Any], Awaitable[Iterator[Any]]]: callback output
+        """
+        if self.parse_pool is None:
+            return self.extract_inline(response, extract, output, *args)
+        return self.extract_pooled(response, extract, output, *args)
+
+    def extract_inline(
+        self,
+        response: scrapy.http.Response,
+        extract: Callable[..., Any],
+        output: Callable[..., Iterator[Any]],
+        *args: Any
+    ) -> Iterator[Any]:
+        """Decode and extract a payload on the reactor, see `extract`."""
+        yield from output(response, extract(self.decode(response.body), *args))
+
+    async def extract_pooled(
+        self,
+        response: scrapy.http.Response,
+        extract: Callable[..., Any],
+        output: Callable[..., Iterator[Any]],
+        *args: Any
+    ) -> Iterator[Any]:
+        """Decode and extract a payload in a worker, see `extract`."""
+        result = await utils.wait(self.parse_pool.submit(
+            parsing.decode_and_extract, extract, response.body,
+            self.json_backend, *args
+        ))
+        return output(response, result)
+
     def parse_links(
         self,
         response: scrapy.http.Response
-    ) -> Iterator[scrapy.Request]:
+    ) -> Union[Iterator[scrapy.Request], Awaitable[Iterator[Any]]]:
         """Extract links from medium API.
 
         Args:
             response (scrapy.http.Response): scrapy response
 
+        Returns:
+            Union[Iterator[scrapy.Request], Awaitable[Iterator[Any]]]:
+                scrapy request objects, see `extract`
+        """
+        return self.extract(response, parsing.links_result, self.links)
+
+    def links(
+        self,
+        response: scrapy.http.Response,
+        result: parsing.LinksResult
+    ) -> Iterator[scrapy.Request]:
+        """Follow the posts and the next page of a profile page.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            result (parsing.LinksResult): extracted profile page
+
         Yields:
             scrapy.Request: scrapy request object
         """
         _next = True  # if true, continue to crawl the next page
-        obj = json.loads(response.text.replace('])}while(1);</x>', '', 1))
         if response.meta.get('user_id'):
             user_id = response.meta['user_id']
         else:
-            user_id = obj['payload']['user']['userId']
+            user_id = result.user['userId']
             response.meta['user_id'] = user_id
-        posts = obj.get('payload', {}).get('references', {}).get('Post')
+            if self.profiles:
+                self.profiles.put(
+                    user_id=user_id,
+                    username=result.user.get('username'),
+                    name=result.user.get('name')
+                )
+        posts = result.posts
         if posts:
             stop_next_or_request = self.parse_links_logic(
                 response=response,
@@ -156,26 +513,25 @@ class MediumPost(scrapy.Spider):
         else:
             logging.warning(f'Unable to find post for {response.meta["uid"]}')
 
-        # paging
-        if _next and (
-            'payload' in obj and
-            'paging' in obj['payload'] and
-            'next' in obj['payload']['paging']
-        ):
+        # paging, the next page only has posts older than this one
+        if _next and result.paging:
             url = self.pagination_url.format(
-                path=obj['payload']['paging']['path'],
-                limit=obj['payload']['paging']['next']['limit'],
-                to=obj['payload']['paging']['next']['to'],
+                path=self.rebase(result.paging['path']),
+                limit=result.paging['limit'],
+                to=result.paging['to'],
                 source='latest',
-                page=obj['payload']['paging']['next']['page']
+                page=result.paging['page']
             )
             yield scrapy.Request(
                 url=url,
                 meta=response.meta,
-                callback=self.parse_links
+                callback=self.parse_links,
+                priority=self.priority(
+                    'post', min(v['updatedAt'] for v in posts.values())
+                ) if posts else self.priority('post')
             )
 
-    def parse_post_item(self, post: dict) -> Iterator[items.ArticleItem]:
+    def parse_post_item(self, post: dict) -> items.ArticleItem:
         """Parse medium post item.
 
         Args:
@@ -184,142 +540,337 @@ class MediumPost(scrapy.Spider):
         Returns:
             items.ArticleItem: ArticleItem object
         """
-        link = post['value']['mediumUrl']
-        uid = [i[1] for i in post['references']['User'].items()][0]['username']
-        author = [i[1] for i in post['references']['User'].items()][0]['name']
-        author_id = [i[1] for i in post['references']['User'].items()][0]['userId']  # noqa: E501
-        title = post['value']['title']
-        content = '\n'.join([i['text'] for i in post['value']['content']['bodyModel']['paragraphs']])  # noqa: E501
-        comment_count = int(post['value']['virtuals']['responsesCreatedCount'])
-        like_count = int(post['value']['virtuals']['totalClapCount'])
-        created_time = datetime.fromtimestamp(post['value']['createdAt'] / 1000)  # noqa: E501
-        tag = ','.join([i['name'] for i in post['value']['virtuals']['tags']])
-        post_record = items.ArticleItem(
-            uid=uid,
-            link=link,
-            author=author,
-            author_id=author_id,
-            poster=author,
-            title=title,
-            content=content,
-            comment_count=comment_count,
-            like_count=like_count,
-            created_time=created_time,
-            article_type='post',
-            tag=tag,
-        )
-        return post_record
+        return parsing.post_item(post)
 
     def post(
         self,
         response: scrapy.http.Response
-    ) -> Union[Iterator[items.ArticleItem], Iterator[scrapy.Request]]:
+    ) -> Union[Iterator[Union[items.ArticleItem, scrapy.Request]],
+               Awaitable[Iterator[Any]]]:
         """Get medium posts.
 
         Args:
             response (scrapy.http.Response): scrapy response
 
+        Returns:
+            Union[Iterator[Union[items.ArticleItem, scrapy.Request]],
+                  Awaitable[Iterator[Any]]]: post item, comment items
+                                             whose author became known and
+                                             the comment request, see
+                                             `extract`
+        """
+        return self.extract(response, parsing.post_result, self.post_output)
+
+    def post_output(
+        self,
+        response: scrapy.http.Response,
+        result: parsing.PostResult
+    ) -> Iterator[Union[items.ArticleItem, scrapy.Request]]:
+        """Emit a post and request its comments.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            result (parsing.PostResult): extracted post
+
         Yields:
             items.ArticleItem: ArticleItem object
             scrapy.Request: scrapy request object
         """
-        data = response.text.replace('])}while(1);</x>', '', 1)
-        obj = json.loads(data)['payload']
-        post_record = self.parse_post_item(post=obj)
+        post_record = result.record
         yield post_record
+        yield from self.authors.learn(result.users)
+        if self.watermarks:
+            self.watermarks.mark(
+                username=response.meta.get('uid') or post_record['uid'],
+                post_id=result.post_id,
+                updated_at=result.updated_at
+            )
 
         if post_record['comment_count'] > 0:
-            post_id = obj['value']['id']
-            response.meta['post_id'] = post_id
-            response.meta['post_record'] = post_record
+            post_id = result.post_id
+            self.posts.put(parents.PostRef(
+                post_id=post_id,
+                uid=post_record['uid'],
+                author=post_record['author'],
+                title=post_record['title']
+            ))
             url = (
-                f'https://medium.com/_/api/posts/{post_id}/responsesStream'
+                f'{self.base_url}/_/api/posts/{post_id}/responsesStream'
             )
             yield scrapy.Request(
                 url=url,
-                meta=response.meta,
-                callback=self.comment
+                meta={
+                    'uid': response.meta.get('uid') or post_record['uid'],
+                    'post_id': post_id,
+                    'post_updated_at': result.updated_at,
+                    'comment_page': 1,
+                    'comments_seen': 0,
+                },
+                callback=self.comment,
+                priority=self.priority('comment', result.updated_at)
             )
 
+    def refresh_post(
+        self,
+        response: scrapy.http.Response
+    ) -> Union[Iterator[Union[items.ArticleDeltaItem, scrapy.Request]],
+               Awaitable[Iterator[Any]]]:
+        """Get the counters of a medium post.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+
+        Returns:
+            Union[Iterator[Union[items.ArticleDeltaItem, scrapy.Request]],
+                  Awaitable[Iterator[Any]]]: counters of the post and
+                                             the request of its new
+                                             responses, see `extract`
+        """
+        return self.extract(
+            response, parsing.metrics_result, self.refresh_output
+        )
+
+    def refresh_output(
+        self,
+        response: scrapy.http.Response,
+        result: parsing.MetricsResult
+    ) -> Iterator[Union[items.ArticleDeltaItem, scrapy.Request]]:
+        """Emit the counters of a post and request its new responses.
+
+        In `comments` mode the `responsesStream` resumes at the cursor of
+        the post, replaying the `paging.to` of the page where the crawled
+        responses stop. The first refresh of a post reads its stream to the
+        end without emitting the responses, only to set the cursor.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            result (parsing.MetricsResult): extracted counters
+
+        Yields:
+            items.ArticleDeltaItem: ArticleDeltaItem object
+            scrapy.Request: scrapy request object
+        """
+        record = result.record
+        yield record
+        if self.cursors is None:
+            return
+        post_id = result.post_id
+        cursor = self.cursors.get(post_id)
+        if cursor is None and not record['comment_count']:
+            self.cursors.advance(post_id, watermarks.Cursor(0, None, 0))
+            return
+        if cursor is not None and record['comment_count'] <= cursor.seen:
+            return
+        self.posts.put(parents.PostRef(
+            post_id=post_id,
+            uid=record['uid'],
+            author=result.author,
+            title=result.title
+        ))
+        path = f'/_/api/posts/{post_id}/responsesStream'
+        url = f'{self.base_url}{path}'
+        to = cursor.to if cursor is not None else None
+        if to is not None:
+            url = self.comment_pagination_url.format(
+                base_url=self.base_url, path=path,
+                limit=COMMENT_PAGE_LIMIT, to=to
+            )
+        yield scrapy.Request(
+            url=url,
+            meta={
+                'uid': record['uid'],
+                'post_id': post_id,
+                'comment_page': 1,
+                'comments_seen': 0,
+                'comment_count': record['comment_count'],
+                'comment_to': to,
+                'comment_skip': cursor.skip if cursor is not None else 0,
+                'comment_quiet': cursor is None,
+            },
+            callback=self.comment,
+            priority=self.priority('comment')
+        )
+
     def parse_comment_item(
         self,
-        posts: dict,
+        comments: list,
         response: scrapy.http.Response
-    ) -> Iterator[scrapy.Request]:
+    ) -> Union[Iterator[items.ArticleItem], Iterator[scrapy.Request]]:
         """Parse medium comment item.
 
+        Comments whose author is already known are emitted directly, the
+        others wait for one author lookup per missing author id, with the
+        journal id of the page, see `ResumeMiddleware`. The commented post
+        comes from `self.posts`.
+
         Args:
-            posts (dict): medium comment items
+            comments (list): comments extracted by `parsing.comment_result`
             response (scrapy.http.Response): scrapy response
 
         Yields:
+            items.ArticleItem: ArticleItem object
             scrapy.Request: scrapy request object
         """
-        post_record = response.meta['post_record']
-        for post_id, post_item in posts.items():
-            if post_id != response.meta['post_id']:
-                post = posts[post_id]
-                author_id = post['creatorId']
-                content = '\n'.join([i['text'] for i in post['previewContent2']['bodyModel']['paragraphs']])  # noqa: E501
-                comment_count = int(post['virtuals']['responsesCreatedCount'])  # noqa: E501
-                like_count = int(post['virtuals']['totalClapCount'])  # noqa: E501
-                created_time = datetime.fromtimestamp(post['createdAt'] / 1000)  # noqa: E501
-                link = f'https://medium.com/{author_id}/{post_id}'
-                comment_record = items.ArticleItem(
-                    uid=post_record['uid'],
-                    link=link,
-                    author_id=author_id,
-                    poster=post_record['author'],
-                    title=post_record['title'],
-                    content=content,
-                    comment_count=comment_count,
-                    like_count=like_count,
-                    created_time=created_time,
-                    article_type='comment',
-                )
-                yield scrapy.Request(
-                    url=f'{link}?format=json',
-                    meta={
-                        'comment_record': comment_record,
-                        'author_id': author_id
-                    },
-                    callback=self.get_comment_author_name
-                )
+        ref = self.posts.get(response.meta['post_id'])
+        if ref is None:
+            logging.warning(
+                f"Post {response.meta['post_id']} left the post table"
+            )
+            ref = parents.PostRef(
+                response.meta['post_id'], response.meta.get('uid'), None, None
+            )
+        updated_at = response.meta.get('post_updated_at')
+        for comment in comments:
+            author_id = comment['author_id']
+            path = f"/{author_id}/{comment['post_id']}"
+            comment_record = items.ArticleItem(
+                uid=ref.uid,
+                link=f'{MEDIUM_URL}{path}',
+                author_id=author_id,
+                poster=ref.author,
+                title=ref.title,
+                content=comment['content'],
+                comment_count=comment['comment_count'],
+                like_count=comment['like_count'],
+                created_time=comment['created_time'],
+                article_type='comment',
+            )
+            if self.authors.resolve(comment_record):
+                yield comment_record
+            elif self.authors.defer(
+                comment_record, origin=response.meta.get('job_id')
+            ):
+                yield self.author_request(author_id, path, updated_at)
 
     def comment(
         self,
         response: scrapy.http.Response
-    ) -> Iterator[scrapy.Request]:
+    ) -> Union[Iterator[Union[items.ArticleItem, scrapy.Request]],
+               Awaitable[Iterator[Any]]]:
         """Get medium comments.
 
+        At most `comment_budget` comments are parsed per post, counted in
+        the `comments_seen` meta, after the `comment_skip` ones already
+        crawled by an earlier refresh.
+
         Args:
             response (scrapy.http.Response): scrapy response
 
+        Returns:
+            Union[Iterator[Union[items.ArticleItem, scrapy.Request]],
+                  Awaitable[Iterator[Any]]]: comment items, author
+                                             requests and the next page
+                                             request, see `extract`
+        """
+        return self.extract(
+            response, parsing.comment_result, self.comment_output,
+            response.meta['post_id'], self.comment_limit(response.meta)
+        )
+
+    def comment_limit(self, meta: dict) -> int:
+        """Get the number of comments to parse from a page.
+
+        Args:
+            meta (dict): meta of the comment page request
+
+        Returns:
+            int: skipped comments plus what is left of the comment budget,
+                 0 for no limit
+        """
+        if not self.comment_budget:
+            return 0
+        return meta.get('comment_skip', 0) + max(
+            1, self.comment_budget - meta.get('comments_seen', 0)
+        )
+
+    def comment_output(
+        self,
+        response: scrapy.http.Response,
+        result: parsing.CommentResult
+    ) -> Iterator[Union[items.ArticleItem, scrapy.Request]]:
+        """Emit the comments of a page and request the next page.
+
+        Nothing is emitted by the `comment_quiet` walk of a first refresh.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            result (parsing.CommentResult): extracted comment page
+
         Yields:
+            items.ArticleItem: ArticleItem object
             scrapy.Request: scrapy request object
         """
-        data = response.text.replace('])}while(1);</x>', '', 1)
-        obj = json.loads(data)
-        posts = obj.get('payload', {}).get('references', {}).get('Post')
-        if posts:
-            yield from self.parse_comment_item(posts, response)
-
-        # paging
-        if (
-            'payload' in obj and
-            'paging' in obj['payload'] and
-            'next' in obj['payload']['paging']
-        ):
+        comments = result.comments[response.meta.get('comment_skip', 0):]
+        if not response.meta.get('comment_quiet'):
+            yield from self.authors.learn(result.users)
+            yield from self.parse_comment_item(comments, response)
+        if self.cursors is not None:
+            self.move_cursor(response, result)
+        seen = response.meta.get('comments_seen', 0) + len(comments)
+        response.meta['comments_seen'] = seen
+
+        # paging, within the page cap and comment budget of the post
+        page = response.meta.get('comment_page', 1)
+        if self.comment_max_pages and page >= self.comment_max_pages:
+            logging.debug(f'Comment page cap reached for {response.url}')
+        elif self.comment_budget and seen >= self.comment_budget:
+            logging.debug(f'Comment budget reached for {response.url}')
+        elif result.paging:
             url = self.comment_pagination_url.format(
-                path=obj['payload']['paging']['path'],
-                limit=obj['payload']['paging']['next']['limit'],
-                to=obj['payload']['paging']['next']['to'],
+                base_url=self.base_url,
+                path=result.paging['path'],
+                limit=result.paging['limit'],
+                to=result.paging['to'],
             )
             yield scrapy.Request(
                 url=url,
-                meta=response.meta,
-                callback=self.comment
+                meta={
+                    'uid': response.meta.get('uid'),
+                    'post_id': response.meta['post_id'],
+                    'post_updated_at': response.meta.get('post_updated_at'),
+                    'comment_page': page + 1,
+                    'comments_seen': seen,
+                    'comment_count': response.meta.get('comment_count'),
+                    'comment_to': result.paging['to'],
+                    'comment_quiet': response.meta.get('comment_quiet'),
+                },
+                callback=self.comment,
+                priority=self.priority(
+                    'comment', response.meta.get('post_updated_at')
+                )
+            )
+            return
+        self.posts.discard(response.meta['post_id'])
+
+    def move_cursor(
+        self,
+        response: scrapy.http.Response,
+        result: parsing.CommentResult
+    ) -> None:
+        """Move the cursor of a post past a parsed comment page.
+
+        A page read in full moves the cursor to the `paging.to` of the next
+        page. The last page, or one cut short by the comment budget, is
+        kept with the number of its responses crawled, and the end of the
+        stream records the `responsesCreatedCount` it was read for.
+
+        Args:
+            response (scrapy.http.Response): scrapy response
+            result (parsing.CommentResult): extracted comment page
+        """
+        post_id = response.meta['post_id']
+        current = self.cursors.get(post_id)
+        count = current.seen if current is not None else 0
+        limit = self.comment_limit(response.meta)
+        if result.paging and not (limit and len(result.comments) >= limit):
+            cursor = watermarks.Cursor(count, result.paging['to'], 0)
+        else:
+            if not result.paging:
+                count = response.meta.get('comment_count') or count
+            cursor = watermarks.Cursor(
+                count, response.meta.get('comment_to'), len(result.comments)
             )
+        self.cursors.advance(post_id, cursor)
 
     def get_comment_author_name(
         self,
@@ -327,21 +878,37 @@ class MediumPost(scrapy.Spider):
     ) -> Iterator[items.ArticleItem]:
         """Get comment author name.
 
+        Every user in the payload is cached, so comments parked for other
+        authors are released as well.
+
         Args:
             response (scrapy.http.Response): scrapy response
 
         Yields:
             items.ArticleItem: ArticleItem object
         """
-        comment_record = response.meta['comment_record']
         author_id = response.meta['author_id']
-        data = response.text.replace('])}while(1);</x>', '', 1)
-        obj = json.loads(data)
-        comment_record['author'] = (
-            obj.get('payload', {}).
-            get('references', {}).
-            get('User').
-            get(author_id, {}).
-            get('name')
+        obj = self.decode(response.body)
+        yield from self.authors.learn(
+            obj.get('payload', {}).get('references', {}).get('User')
         )
-        yield comment_record
+        yield from self.authors.release(author_id)
+
+    def get_comment_author_failed(
+        self,
+        failure: Failure
+    ) -> Iterator[items.ArticleItem]:
+        """Emit comments without author when the author lookup failed.
+
+        Args:
+            failure (Failure): twisted failure of the author request
+
+        Yields:
+            items.ArticleItem: ArticleItem object
+        """
+        author_id = failure.request.meta['author_id']
+        logging.warning(f'Unable to get author name for {author_id}')
+        stats = getattr(getattr(self, 'crawler', None), 'stats', None)
+        if stats is not None:
+            stats.inc_value('authors/lookup_failed')
+        yield from self.authors.release(author_id)
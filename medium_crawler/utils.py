@@ -1,10 +1,18 @@
 """Util function."""
 import functools
 import logging
+import re
 import time
+from typing import Any, Awaitable, Optional
 
 launch_logger = logging.getLogger('launch_crawlers_logger')
 
+ENDPOINTS = (
+    ('comment', re.compile(r'^/_/api/posts/[^/]+/responsesStream')),
+    ('profile', re.compile(r'^/(@[^/]+|_/api/users/.+)$')),
+    ('post', re.compile(r'^/[^/_][^/]*/[^/]+$')),
+)
+
 
 def timer(func):
     """Logging function run time."""
@@ -19,3 +27,88 @@ def timer(func):
         )
         return value
     return wrapper_decorator
+
+
+def strtobool(value: str) -> bool:
+    """Convert a string such as `true`, `1`, `off` or `no` to a bool.
+
+    Same as `distutils.util.strtobool`, whose import pulls in setuptools.
+
+    Args:
+        value (str): truth value
+
+    Returns:
+        bool: True for y, yes, t, true, on and 1, False for n, no, f,
+              false, off and 0
+
+    Raises:
+        ValueError: if `value` is anything else
+    """
+    value = value.lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+    raise ValueError(f'invalid truth value {value!r}')
+
+
+def endpoint_type(path: str) -> Optional[str]:
+    """Get the type of a medium endpoint.
+
+    Args:
+        path (str): url path
+
+    Returns:
+        Optional[str]: `profile` (including its pagination), `post`
+                       (including comment author lookups), `comment`,
+                       or None for other urls
+    """
+    for name, pattern in ENDPOINTS:
+        if pattern.match(path):
+            return name
+    return None
+
+
+def schedule(crawler: Any, request: Any) -> None:
+    """Schedule a request from outside a callback.
+
+    Args:
+        crawler (Any): scrapy crawler
+        request (Any): scrapy request, the spider argument of scrapy < 2.6
+                       is the crawler's spider
+    """
+    import scrapy
+    if scrapy.version_info < (2, 6):
+        crawler.engine.crawl(request, crawler.spider)
+    else:
+        crawler.engine.crawl(request)
+
+
+def wait(d: Any) -> Awaitable[Any]:
+    """Await a deferred in a coroutine, with the asyncio reactor too.
+
+    Args:
+        d (Any): twisted deferred
+
+    Returns:
+        Awaitable[Any]: deferred, or future under the asyncio reactor
+    """
+    try:
+        from scrapy.utils.defer import maybe_deferred_to_future
+    except ImportError:  # pragma: no cover, scrapy < 2.6
+        return d
+    return maybe_deferred_to_future(d)
+
+
+def sleep(seconds: float) -> Awaitable[None]:
+    """Wait in a coroutine, with the asyncio reactor too.
+
+    Args:
+        seconds (float): delay
+
+    Returns:
+        Awaitable[None]: deferred, or future under the asyncio reactor
+    """
+    from twisted.internet import reactor
+    from twisted.internet.task import deferLater
+    return wait(deferLater(reactor, seconds, lambda: None))
@@ -0,0 +1,245 @@
+"""High-water marks for incremental crawling and refreshes."""
+from collections import defaultdict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import sessionmaker
+
+from .models import CommentCursor, PostState, Watermark, create_new_table
+
+
+class WatermarkStore:
+    """Remember the latest crawled post of each writer between runs.
+
+    The profile pages list the posts of a writer newest first, down to the
+    previous mark. A mark moves up to the newest post such that every post
+    listed between the old and the new mark was fetched, and only when the
+    crawl finished, so posts a cancelled run or a failed request never
+    fetched are listed again by the next run.
+    """
+
+    def __init__(self, engine: object) -> None:
+        """Set database engine.
+
+        Args:
+            engine (object): sqlalchemy engine, see `models.db_connect`
+        """
+        create_new_table(engine)
+        self.Session = sessionmaker(bind=engine)
+        self._marks: Dict[str, Optional[Tuple[int, str]]] = {}
+        self._posts: Dict[str, Tuple[str, int]] = {}
+        # stored `updatedAt` of the posts of each writer, see `updated_at`
+        self._states: Dict[str, Dict[str, int]] = {}
+        self._listed: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._fetched: Set[str] = set()
+
+    def get(self, username: str) -> Optional[Tuple[int, str]]:
+        """Get the high-water mark of a writer.
+
+        Args:
+            username (str): writer's profile page name
+
+        Returns:
+            Optional[Tuple[int, str]]: `updatedAt` (ms) and id of the
+                                       latest crawled post
+        """
+        if username not in self._marks:
+            session = self.Session()
+            try:
+                row = session.query(Watermark).get(username)
+            finally:
+                session.close()
+            self._marks[username] = (
+                (row.updated_at, row.post_id) if row else None
+            )
+        return self._marks[username]
+
+    def updated_at(self, username: str, post_id: str) -> Optional[int]:
+        """Get the stored `updatedAt` of a post.
+
+        The posts of a writer are read in one query on the first call for
+        that writer, and answered from memory afterwards.
+
+        Args:
+            username (str): writer's profile page name
+            post_id (str): medium post id
+
+        Returns:
+            Optional[int]: `updatedAt` (ms), or None if never crawled
+        """
+        if post_id in self._posts:
+            return self._posts[post_id][1]
+        if username not in self._states:
+            session = self.Session()
+            try:
+                rows = (
+                    session.query(PostState.post_id, PostState.updated_at)
+                    .filter_by(username=username)
+                    .all()
+                )
+            finally:
+                session.close()
+            self._states[username] = dict(rows)
+        return self._states[username].get(post_id)
+
+    def list_post(
+        self,
+        username: str,
+        post_id: str,
+        updated_at: int
+    ) -> None:
+        """Record a post listed on a profile page of the writer.
+
+        Args:
+            username (str): writer's profile page name
+            post_id (str): medium post id
+            updated_at (int): `updatedAt` (ms) of the post
+        """
+        self._listed[username][post_id] = updated_at
+
+    def mark(self, username: str, post_id: str, updated_at: int) -> None:
+        """Record a crawled post.
+
+        Args:
+            username (str): writer's profile page name
+            post_id (str): medium post id
+            updated_at (int): `updatedAt` (ms) of the post
+        """
+        self._posts[post_id] = (username, updated_at)
+        self._fetched.add(post_id)
+
+    def advance(self, username: str) -> Optional[Tuple[int, str]]:
+        """Get the mark of a writer after the posts fetched by this run.
+
+        Args:
+            username (str): writer's profile page name
+
+        Returns:
+            Optional[Tuple[int, str]]: newest listed post below which every
+                                       post listed since the current mark
+                                       was fetched
+        """
+        mark = self.get(username)
+        floor = mark[0] if mark else None
+        listed = sorted(
+            (updated_at, post_id)
+            for post_id, updated_at in self._listed.get(username, {}).items()
+            if floor is None or updated_at > floor
+        )
+        for updated_at, post_id in listed:
+            if post_id not in self._fetched:
+                break
+            mark = (updated_at, post_id)
+        return mark
+
+    def flush(self, reason: str = 'finished') -> None:
+        """Write recorded posts and the marks of a finished crawl.
+
+        Args:
+            reason (str): `spider_closed` reason
+        """
+        marks = {}
+        if reason == 'finished':
+            for username in self._listed:
+                mark = self.advance(username)
+                if mark is not None and mark != self.get(username):
+                    marks[username] = mark
+        if not (self._posts or marks):
+            return
+        session = self.Session()
+        try:
+            for post_id, (username, updated_at) in self._posts.items():
+                session.merge(PostState(
+                    post_id=post_id, username=username, updated_at=updated_at
+                ))
+            for username, (updated_at, post_id) in marks.items():
+                session.merge(Watermark(
+                    username=username, post_id=post_id, updated_at=updated_at
+                ))
+            session.commit()
+        finally:
+            session.close()
+        self._marks.update(marks)
+        for post_id, (username, updated_at) in self._posts.items():
+            if username in self._states:
+                self._states[username][post_id] = updated_at
+        self._posts.clear()
+        self._listed.clear()
+        self._fetched.clear()
+
+
+class Cursor(NamedTuple):
+    """Position in the `responsesStream` of a post."""
+
+    seen: int
+    to: Optional[str]
+    skip: int
+
+
+class CursorStore:
+    """Remember where the crawled responses of each post stop.
+
+    A refresh resumes the `responsesStream` of a post at the page whose
+    `paging.to` is kept by its cursor, skipping the responses of that page
+    already crawled. Cursors are buffered like `WatermarkStore` marks and
+    written by `flush`.
+    """
+
+    def __init__(self, engine: object) -> None:
+        """Set database engine.
+
+        Args:
+            engine (object): sqlalchemy engine, see `models.db_connect`
+        """
+        create_new_table(engine)
+        self.Session = sessionmaker(bind=engine)
+        self._cursors: Dict[str, Optional[Cursor]] = {}
+        self._dirty: Dict[str, Cursor] = {}
+
+    def get(self, post_id: str) -> Optional[Cursor]:
+        """Get the cursor of a post.
+
+        Args:
+            post_id (str): medium post id
+
+        Returns:
+            Optional[Cursor]: `responsesCreatedCount` when the end of the
+                              stream was last reached, `to` of the page to
+                              resume at (None for the first page) and
+                              responses of that page already crawled, or
+                              None if the post was never refreshed
+        """
+        if post_id not in self._cursors:
+            session = self.Session()
+            try:
+                row = session.query(CommentCursor).get(post_id)
+            finally:
+                session.close()
+            self._cursors[post_id] = (
+                Cursor(row.seen, row.to, row.skip) if row else None
+            )
+        return self._cursors[post_id]
+
+    def advance(self, post_id: str, cursor: Cursor) -> None:
+        """Move the cursor of a post to the last crawled response.
+
+        Args:
+            post_id (str): medium post id
+            cursor (Cursor): new position
+        """
+        self._cursors[post_id] = cursor
+        self._dirty[post_id] = cursor
+
+    def flush(self) -> None:
+        """Write the moved cursors in one transaction."""
+        if not self._dirty:
+            return
+        session = self.Session()
+        try:
+            for post_id, cursor in self._dirty.items():
+                session.merge(
+                    CommentCursor(post_id=post_id, **cursor._asdict())
+                )
+            session.commit()
+        finally:
+            session.close()
+        self._dirty.clear()
@@ -0,0 +1,226 @@
+"""Test for comment author resolution."""
+import json
+from types import SimpleNamespace
+
+import pytest
+import scrapy
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+from scrapy.statscollectors import StatsCollector
+from sqlalchemy import create_engine
+from twisted.python.failure import Failure
+
+from medium_crawler import items
+from medium_crawler.authors import AuthorCache, AuthorResolver, ProfileStore
+from medium_crawler.parents import PostRef
+from medium_crawler.spiders.medium import MediumPost
+
+
+def mock_comment_response(
+    spider: MediumPost,
+    users: dict,
+    comments: dict
+) -> HtmlResponse:
+    """Build a `responsesStream` response for post `p0`.
+
+    Args:
+        spider (MediumPost): spider whose post table gets `p0`
+        users (dict): `references.User` map
+        comments (dict): comment id to author id
+
+    Returns:
+        HtmlResponse: scrapy html response
+    """
+    posts = {
+        post_id: {
+            'creatorId': author_id,
+            'createdAt': 1583020800000,
+            'previewContent2': {'bodyModel': {'paragraphs': [{'text': 'hi'}]}},
+            'virtuals': {'responsesCreatedCount': 0, 'totalClapCount': 1},
+        }
+        for post_id, author_id in comments.items()
+    }
+    payload = {'payload': {'references': {'User': users, 'Post': posts}}}
+    body = '])}while(1);</x>' + json.dumps(payload)
+    url = 'https://medium.com/_/api/posts/p0/responsesStream'
+    spider.posts.put(PostRef('p0', 'writer', 'Writer', 'T'))
+    request = Request(url, meta={'post_id': 'p0'})
+    return HtmlResponse(url=url, body=body.encode(), request=request)
+
+
+class TestAuthorResolver:
+    """Test case for AuthorResolver."""
+
+    def test_resolve_from_cache(self):
+        """Test known authors are resolved without lookup."""
+        resolver = AuthorResolver()
+        resolver.learn({'u1': {'name': 'User One'}})
+        record = items.ArticleItem(author_id='u1')
+        assert resolver.resolve(record)
+        assert record['author'] == 'User One'
+
+    def test_defer_once_per_author(self):
+        """Test only the first comment of a missing author asks a lookup."""
+        resolver = AuthorResolver()
+        assert resolver.defer(items.ArticleItem(author_id='u1'))
+        assert not resolver.defer(items.ArticleItem(author_id='u1'))
+        assert resolver.pending == 2
+        released = list(resolver.learn({'u1': {'name': 'User One'}}))
+        assert [i['author'] for i in released] == ['User One'] * 2
+        assert resolver.pending == 0
+
+    def test_release_without_name(self):
+        """Test failed lookups still release the parked comments."""
+        resolver = AuthorResolver()
+        resolver.defer(items.ArticleItem(author_id='u1'))
+        released = list(resolver.release('u1'))
+        assert len(released) == 1
+        assert 'author' not in released[0]
+
+
+class TestMediumSpiderComment:
+    """Test case for MediumPost comment author resolution."""
+
+    def test_comment_uses_references(self):
+        """Test comments are emitted without any author request."""
+        spider = MediumPost(date='20200301', usernames='chiayinchen')
+        response = mock_comment_response(
+            spider,
+            users={'u1': {'name': 'User One'}, 'u2': {'name': 'User Two'}},
+            comments={'c1': 'u1', 'c2': 'u2', 'c3': 'u1'},
+        )
+        output = list(spider.comment(response))
+        assert not [i for i in output if isinstance(i, Request)]
+        assert sorted(i['author'] for i in output) == [
+            'User One', 'User One', 'User Two'
+        ]
+
+    def test_comment_batches_missing_authors(self):
+        """Test one author request is sent per missing author."""
+        spider = MediumPost(date='20200301', usernames='chiayinchen')
+        response = mock_comment_response(
+            spider,
+            users={},
+            comments={'c1': 'u1', 'c2': 'u1', 'c3': 'u2'},
+        )
+        requests = list(spider.comment(response))
+        assert sorted(r.meta['author_id'] for r in requests) == ['u1', 'u2']
+        assert all(r.dont_filter for r in requests)
+        assert spider.authors.pending == 3
+
+    def test_lookup_parked(self):
+        """Test lost author lookups are sent again once when idle."""
+        spider = MediumPost(date='20200301', usernames='chiayinchen')
+        response = mock_comment_response(
+            spider, users={}, comments={'c1': 'u1', 'c2': 'u2'}
+        )
+        sent = {r.meta['author_id']: r.url for r in spider.comment(response)}
+        crawled = []
+        spider.crawler = SimpleNamespace(
+            engine=SimpleNamespace(crawl=crawled.append)
+        )
+        with pytest.raises(DontCloseSpider):
+            spider.lookup_parked()
+        assert sorted(r.meta['author_id'] for r in crawled) == ['u1', 'u2']
+        assert {r.meta['author_id']: r.url for r in crawled} == sent
+        spider.lookup_parked()
+        assert len(crawled) == 2
+
+    def test_lookup_parked_scrapy_2_0(self, monkeypatch):
+        """Test the spider is passed to `engine.crawl` before scrapy 2.6."""
+        monkeypatch.setattr(scrapy, 'version_info', (2, 0, 1))
+        spider = MediumPost(date='20200301', usernames='chiayinchen')
+        response = mock_comment_response(
+            spider, users={}, comments={'c1': 'u1'}
+        )
+        list(spider.comment(response))
+        crawled = []
+        spider.crawler = SimpleNamespace(
+            spider=spider,
+            engine=SimpleNamespace(
+                crawl=lambda request, spider: crawled.append(spider)
+            )
+        )
+        with pytest.raises(DontCloseSpider):
+            spider.lookup_parked()
+        assert crawled == [spider]
+
+    def test_lookup_failed(self):
+        """Test a failed lookup releases comments without author."""
+        spider = MediumPost(date='20200301', usernames='chiayinchen')
+        response = mock_comment_response(
+            spider, users={}, comments={'c1': 'u1', 'c2': 'u1'}
+        )
+        request, = spider.comment(response)
+        spider.crawler = SimpleNamespace(stats=StatsCollector(
+            SimpleNamespace(settings=Settings())
+        ))
+        failure = Failure(ValueError())
+        failure.request = request
+        released = list(spider.get_comment_author_failed(failure))
+        assert len(released) == 2
+        assert not any('author' in r for r in released)
+        assert spider.crawler.stats.get_value('authors/lookup_failed') == 1
+
+
+class TestProfileStore:
+    """Test case for ProfileStore."""
+
+    def make_store(self, tmp_path, **kwargs):
+        """Create a profile store in a temporary SQLite file."""
+        engine = create_engine(f'sqlite:///{tmp_path / "rule.db"}')
+        return ProfileStore(engine=engine, **kwargs)
+
+    def test_round_trip(self, tmp_path):
+        """Test profiles survive a flush and are found by user and name."""
+        store = self.make_store(tmp_path)
+        store.put('u1', username='one', name='User One')
+        store.flush()
+        assert store.get('u1')['name'] == 'User One'
+        assert store.get_by_username('one')['user_id'] == 'u1'
+
+    def test_ttl(self, tmp_path):
+        """Test expired profiles are ignored and evicted."""
+        store = self.make_store(tmp_path, ttl=-1)
+        store.put('u1', username='one', name='User One')
+        store.flush()
+        assert store.get('u1') is None
+        assert store.evict() == 1
+
+    def test_lru(self, tmp_path):
+        """Test least recently used profiles are trimmed."""
+        store = self.make_store(tmp_path, max_entries=1)
+        store.put('u1', name='User One')
+        store.flush()
+        store.put('u2', name='User Two')
+        store.flush()
+        assert store.evict() == 1
+        assert store.get('u1') is None
+        assert store.get('u2')['name'] == 'User Two'
+
+    def test_lookups_from_memory(self, tmp_path):
+        """Test profiles are read once, misses and usernames included."""
+        store = self.make_store(tmp_path)
+        store.put('u1', username='one', name='User One')
+        store.flush()
+        store = self.make_store(tmp_path)
+        store.put('u2', username='two')
+        assert store.get_by_username('two')['user_id'] == 'u2'
+        assert store.get('u1')['name'] == 'User One'
+
+        def no_session():
+            raise AssertionError('database read')
+
+        store.Session = no_session
+        assert store.get('u3') is None
+        assert store.get('u3') is None
+        assert store.get_by_username('one')['user_id'] == 'u1'
+        assert store.get_by_username('three') is None
+
+    def test_cache_reads_through(self, tmp_path):
+        """Test the author cache falls back to the store."""
+        store = self.make_store(tmp_path)
+        AuthorCache(store=store).update({'u1': {'name': 'User One'}})
+        store.flush()
+        assert AuthorCache(store=store).get('u1') == 'User One'
@@ -0,0 +1,87 @@
+"""Test for content change detection."""
+from datetime import datetime
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from medium_crawler import changes
+from medium_crawler.items import ArticleDeltaItem, ArticleItem
+from medium_crawler.pipelines import ChangeDetectionPipeline
+
+
+def make_item(**kwargs) -> ArticleItem:
+    """Build a post item."""
+    fields = dict(
+        uid='writer', link='https://medium.com/p/a', title='T', content='x',
+        tag='python', comment_count=1, like_count=2,
+        created_time=datetime(2020, 3, 1), article_type='post',
+        fetched_time=datetime(2020, 3, 2)
+    )
+    fields.update(kwargs)
+    return ArticleItem(fields)
+
+
+class TestContentIndex:
+    """Test case for ContentIndex."""
+
+    def test_status(self, tmp_path):
+        """Test new, unchanged, counters and changed items."""
+        index = changes.ContentIndex(str(tmp_path / 'changes.db'))
+        assert index.check(make_item()) == changes.NEW
+        assert index.check(make_item()) == changes.UNCHANGED
+        assert index.check(make_item(like_count=3)) == changes.COUNTERS
+        assert index.check(make_item(like_count=3)) == changes.UNCHANGED
+        assert index.check(make_item(content='y')) == changes.CHANGED
+
+    def test_fetched_time_is_ignored(self):
+        """Test the fingerprint only covers meaningful fields."""
+        assert changes.content_fingerprint(make_item()) == \
+            changes.content_fingerprint(make_item(fetched_time=datetime.now()))
+
+    def test_persisted(self, tmp_path):
+        """Test fingerprints survive a flush and a new index."""
+        path = str(tmp_path / 'changes.db')
+        index = changes.ContentIndex(path, flush_size=2)
+        index.check(make_item())
+        index.check(make_item(link='https://medium.com/p/b'))
+        index.check(make_item(link='https://medium.com/p/c'))
+        index.flush()
+        index = changes.ContentIndex(path)
+        assert index.check(make_item()) == changes.UNCHANGED
+        assert index.check(
+            make_item(link='https://medium.com/p/c', comment_count=5)
+        ) == changes.COUNTERS
+
+
+class TestChangeDetectionPipeline:
+    """Test case for ChangeDetectionPipeline."""
+
+    def test_not_configured(self):
+        """Test the pipeline is disabled without an index path."""
+        with pytest.raises(NotConfigured):
+            ChangeDetectionPipeline.from_crawler(get_crawler())
+
+    @pytest.mark.filterwarnings('error::scrapy.exceptions.'
+                                'ScrapyDeprecationWarning')
+    def test_drop_and_delta(self, tmp_path):
+        """Test unchanged items are dropped and counters become deltas."""
+        crawler = get_crawler()
+        stats = MemoryStatsCollector(crawler)
+        pipeline = ChangeDetectionPipeline(
+            changes.ContentIndex(str(tmp_path / 'changes.db')), stats
+        )
+        assert pipeline.process_item(make_item(), None)['content'] == 'x'
+        with pytest.raises(changes.UnchangedItem):
+            pipeline.process_item(make_item(), None)
+        delta = pipeline.process_item(make_item(like_count=9), None)
+        assert isinstance(delta, ArticleDeltaItem)
+        assert dict(delta) == {
+            'uid': 'writer', 'link': 'https://medium.com/p/a',
+            'article_type': 'post', 'comment_count': 1, 'like_count': 9,
+            'fetched_time': datetime(2020, 3, 2),
+        }
+        assert stats.get_value('changes/new') == 1
+        assert stats.get_value('changes/unchanged') == 1
+        assert stats.get_value('changes/counters') == 1
@@ -0,0 +1,141 @@
+"""Test for the rule daemon."""
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from medium_crawler.daemon import RuleDaemon
+from medium_crawler.dupefilters import SharedDupeFilter
+
+
+class FakeCrawler:
+    """Crawler whose crawl ends when `finish` or `stop` is called."""
+
+    def __init__(self) -> None:
+        """Set the deferred of the crawl."""
+        self.done = defer.Deferred()
+        self.stopped = False
+
+    def finish(self) -> None:
+        """End the crawl."""
+        self.done.callback(None)
+
+    def stop(self) -> defer.Deferred:
+        """Stop the crawl."""
+        self.stopped = True
+        self.finish()
+        return defer.succeed(None)
+
+
+class FakeRunner:
+    """CrawlerRunner recording the crawls."""
+
+    def __init__(self) -> None:
+        """Set the started crawls."""
+        self.crawls = []
+
+    def create_crawler(self, spider_name: str) -> FakeCrawler:
+        """Create a crawler."""
+        return FakeCrawler()
+
+    def crawl(self, crawler: FakeCrawler, rule, **kwargs) -> defer.Deferred:
+        """Start a crawl."""
+        self.crawls.append((rule.id, rule.date, crawler))
+        return crawler.done
+
+
+class DedupRunner(FakeRunner):
+    """Runner whose crawls request the post urls of a rule.
+
+    Each crawl goes through its own `SharedDupeFilter`, like a crawler of
+    the default settings, and counts the requests it would download.
+    """
+
+    def crawl(self, crawler: FakeCrawler, rule, **kwargs) -> defer.Deferred:
+        """Run a crawl to the end."""
+        dupefilter = SharedDupeFilter.from_crawler(get_crawler())
+        dupefilter.open()
+        crawler.items = sum(
+            1 for url in rule.url.split(',')
+            if not dupefilter.request_seen(Request(url))
+        )
+        dupefilter.close('finished')
+        self.crawls.append((rule.id, rule.date, crawler))
+        crawler.finish()
+        return crawler.done
+
+
+def rule(rule_id: int, date: str = '20200301') -> SimpleNamespace:
+    """Build a rule row."""
+    return SimpleNamespace(id=rule_id, username=f'user{rule_id}', date=date,
+                           back=None, url=None, source='medium')
+
+
+class TestRuleDaemon:
+    """Test case for RuleDaemon."""
+
+    def make_daemon(self, max_crawlers: int = 2) -> RuleDaemon:
+        """Create a daemon on a fake runner."""
+        return RuleDaemon(FakeRunner(), 'medium', load_rules=list,
+                          max_crawlers=max_crawlers)
+
+    def test_caps_concurrent_crawlers(self):
+        """Test queued rules start as slots free up."""
+        daemon = self.make_daemon()
+        daemon.reconcile([rule(1), rule(2), rule(3)])
+        assert sorted(daemon.running) == [1, 2]
+        assert list(daemon.queued) == [3]
+        daemon.running[1][0].finish()
+        assert sorted(daemon.running) == [2, 3]
+
+    def test_finished_rules_are_not_crawled_again(self):
+        """Test a finished rule waits for a change."""
+        daemon = self.make_daemon()
+        daemon.reconcile([rule(1)])
+        daemon.running[1][0].finish()
+        daemon.reconcile([rule(1)])
+        assert not daemon.running
+        daemon.reconcile([rule(1, date='20200401')])
+        assert [c[:2] for c in daemon.runner.crawls] == [
+            (1, '20200301'), (1, '20200401')
+        ]
+
+    def test_crawled_again_after_change(self):
+        """Test a rule crawled again in the same process gets its items."""
+        daemon = RuleDaemon(DedupRunner(), 'medium', load_rules=list)
+        first = rule(1)
+        first.url = 'https://medium.com/u/p1,https://medium.com/u/p2'
+        daemon.reconcile([first])
+        second = rule(1, date='20200401')
+        second.url = first.url
+        daemon.reconcile([second])
+        assert [c[2].items for c in daemon.runner.crawls] == [2, 2]
+
+    def test_disabled_rule_is_stopped(self):
+        """Test a rule that is no longer enabled is stopped."""
+        daemon = self.make_daemon()
+        daemon.reconcile([rule(1), rule(2)])
+        crawler = daemon.running[1][0]
+        daemon.reconcile([rule(2)])
+        assert crawler.stopped
+        assert sorted(daemon.running) == [2]
+        assert 1 not in daemon.finished
+
+    def test_changed_rule_is_restarted(self):
+        """Test a changed rule is stopped and crawled with new arguments."""
+        daemon = self.make_daemon()
+        daemon.reconcile([rule(1)])
+        crawler = daemon.running[1][0]
+        daemon.reconcile([rule(1, date='20200401')])
+        assert crawler.stopped
+        assert daemon.running[1][1][1] == '20200401'
+
+    def test_stop(self):
+        """Test stopping the daemon stops every crawler."""
+        daemon = self.make_daemon()
+        daemon.reconcile([rule(1), rule(2), rule(3)])
+        crawlers = [c for c, _ in daemon.running.values()]
+        daemon.stop()
+        assert all(c.stopped for c in crawlers)
+        assert not daemon.running
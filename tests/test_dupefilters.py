@@ -0,0 +1,98 @@
+"""Test for process-wide request deduplication."""
+from types import SimpleNamespace
+
+from scrapy import Request
+
+from medium_crawler.dupefilters import (FingerprintIndex, SharedDupeFilter,
+                                        SharedIndex, fingerprint)
+
+
+def parse_links(response):
+    """Stand-in for the volatile spider callback."""
+
+
+class TestFingerprintIndex:
+    """Test case for FingerprintIndex."""
+
+    def test_add(self, monkeypatch):
+        """Test membership across buffer compaction."""
+        monkeypatch.setattr(FingerprintIndex, 'MIN_BUFFER', 8)
+        index = FingerprintIndex()
+        assert all(index.add(i * 7919) for i in range(100))
+        assert not any(index.add(i * 7919) for i in range(100))
+        assert len(index) == 100
+        assert 7919 in index and 7920 not in index
+
+    def test_save_load(self, tmp_path):
+        """Test the index round-trips through a file."""
+        path = str(tmp_path / 'seen.idx')
+        FingerprintIndex([3, 1, 2 ** 64 - 1]).save(path)
+        index = FingerprintIndex.load(path)
+        assert len(index) == 3
+        assert 2 ** 64 - 1 in index
+
+    def test_merge_save(self, tmp_path):
+        """Test indexes saved by two workers are both kept."""
+        path = str(tmp_path / 'seen.idx')
+        FingerprintIndex([1, 2, 3]).merge_save(path)
+        FingerprintIndex([3, 4]).merge_save(path)
+        index = FingerprintIndex.load(path)
+        assert len(index) == 4
+        assert all(fp in index for fp in (1, 2, 3, 4))
+
+
+class TestSharedDupeFilter:
+    """Test case for SharedDupeFilter."""
+
+    def test_shared_between_crawlers(self, tmp_path):
+        """Test a request seen by one crawler is filtered in another."""
+        index = SharedIndex.get(str(tmp_path / 'seen.idx'))
+        first = SharedDupeFilter(index, volatile_callbacks=['parse_links'])
+        second = SharedDupeFilter(index, volatile_callbacks=['parse_links'])
+        first.open()
+        second.open()
+        url = 'https://medium.com/8045c82962e2/be290cd1f9d8?format=json'
+        assert not first.request_seen(Request(url))
+        assert second.request_seen(Request(url))
+        profile = Request('https://medium.com/@user?format=json',
+                          callback=parse_links)
+        assert not first.request_seen(profile)
+        first.close('finished')
+        second.close('finished')
+        persisted = FingerprintIndex.load(index.path)
+        assert fingerprint(Request(url)) in persisted
+        assert fingerprint(profile) not in persisted
+
+    def test_refetch(self, tmp_path):
+        """Test a refetching crawl fetches persisted requests once."""
+        url = 'https://medium.com/8045c82962e2/be290cd1f9d8?format=json'
+        path = str(tmp_path / 'seen.idx')
+        FingerprintIndex([fingerprint(Request(url))]).save(path)
+        dupefilter = SharedDupeFilter(SharedIndex.get(path))
+        dupefilter.crawler = SimpleNamespace(
+            spider=SimpleNamespace(refetch=True)
+        )
+        dupefilter.open()
+        assert not dupefilter.request_seen(Request(url))
+        assert dupefilter.request_seen(Request(url))
+        other = 'https://medium.com/8045c82962e2/f1e2d3c4b5a6?format=json'
+        assert not dupefilter.request_seen(Request(other))
+        dupefilter.close('finished')
+        assert fingerprint(Request(other)) in FingerprintIndex.load(path)
+
+    def test_released(self):
+        """Test the index is dropped once its last crawler closes."""
+        index = SharedIndex.get()
+        dupefilter = SharedDupeFilter(index)
+        dupefilter.open()
+        assert SharedIndex.get() is index
+        dupefilter.close('finished')
+        assert SharedIndex.get() is not index
+        SharedIndex.get().release()
+
+    def test_canonical_url(self):
+        """Test query order does not change the fingerprint."""
+        assert (
+            fingerprint(Request('https://medium.com/a?limit=10&to=1')) ==
+            fingerprint(Request('https://medium.com/a?to=1&limit=10'))
+        )
@@ -0,0 +1,57 @@
+"""Test for scrapy extensions."""
+from scrapy import Request
+from scrapy.http import TextResponse
+
+from medium_crawler.extensions import CallbackMetrics, Histogram
+from medium_crawler.middlewares import CallbackMetricsMiddleware
+
+
+class Spider:
+    """Spider launched from a rule."""
+
+    name = 'medium'
+    rule_id = 3
+
+    def post(self, response):
+        """Stand-in callback."""
+
+
+class TestCallbackMetrics:
+    """Test case for CallbackMetrics."""
+
+    def test_histogram(self):
+        """Test bucket counts and quantile estimates."""
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.observe(value)
+        assert histogram.counts == [1, 2, 1, 1]
+        assert histogram.quantile(0.5) == 10
+        assert histogram.quantile(1) == float('inf')
+        text = histogram.prometheus('m', 'callback="post"')
+        assert 'm_bucket{callback="post",le="+Inf"} 5' in text
+        assert 'm_count{callback="post"} 5' in text
+
+    def test_callback_middleware(self, tmp_path):
+        """Test callback output is counted per callback and rule."""
+        spider = Spider()
+        metrics = CallbackMetrics(
+            interval=0, prometheus_file=str(tmp_path / '{spider}-{rule}.prom')
+        )
+        metrics.spider_opened(spider)
+        request = Request('https://medium.com/a/b?format=json',
+                          callback=spider.post,
+                          meta={'download_latency': 0.2})
+        response = TextResponse(request.url, body=b'{}', request=request)
+        metrics.response_received(response, request, spider)
+        middleware = CallbackMetricsMiddleware(metrics)
+        output = [{'link': 'a'}, Request('https://medium.com/c')]
+        assert list(
+            middleware.process_spider_output(response, output, spider)
+        ) == output
+        metrics.spider_closed(spider)
+
+        assert metrics.histograms[('items', 'post', '3')].sum == 1
+        assert metrics.histograms[('requests', 'post', '3')].sum == 1
+        assert metrics.histograms[('download_seconds', 'post', '3')].count == 1
+        text = (tmp_path / 'medium-3.prom').read_text()
+        assert '# TYPE medium_callback_parse_cpu_seconds histogram' in text
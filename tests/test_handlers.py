@@ -0,0 +1,134 @@
+"""Test for the download handlers."""
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, task
+# scrapy's handler expects the reactor a crawl installs
+from twisted.internet import reactor  # noqa: F401
+
+from medium_crawler.handlers import (MeteredConnectionPool,
+                                     PooledHTTPDownloadHandler)
+
+
+class FakeTransport:
+    """Transport recording disconnections."""
+
+    def __init__(self):
+        """Start connected."""
+        self.connected = True
+
+    def loseConnection(self):
+        """Disconnect."""
+        self.connected = False
+
+
+class FakeProtocol:
+    """Idle HTTP/1.1 client protocol."""
+
+    state = 'QUIESCENT'
+
+    def __init__(self):
+        """Set transport."""
+        self.transport = FakeTransport()
+
+
+class FakeEndpoint:
+    """Endpoint counting the connections it opens."""
+
+    def __init__(self):
+        """Start without connection."""
+        self.protocols = []
+
+    def connect(self, factory):
+        """Open a connection."""
+        protocol = FakeProtocol()
+        self.protocols.append(protocol)
+        return defer.succeed(protocol)
+
+
+def get_connection(pool, endpoint, key=('https', b'medium.com', 443)):
+    """Get a connection, use it for one request and give it back."""
+    result = []
+    pool.getConnection(key, endpoint).addCallback(result.append)
+    connection = result[0]
+    # the pool wraps reused connections to retry idempotent requests
+    connection = getattr(connection, '_clientProtocol', connection)
+    pool._putConnection(key, connection)
+    return connection
+
+
+class TestMeteredConnectionPool:
+    """Test case for MeteredConnectionPool."""
+
+    def test_reuse(self):
+        """Test idle connections are reused and counted."""
+        crawler = get_crawler()
+        pool = MeteredConnectionPool(task.Clock(), stats=crawler.stats)
+        endpoint = FakeEndpoint()
+        for _ in range(5):
+            get_connection(pool, endpoint)
+        assert len(endpoint.protocols) == 1
+        assert crawler.stats.get_value('http_pool/connections/new') == 1
+        assert crawler.stats.get_value('http_pool/connections/reused') == 4
+        assert crawler.stats.get_value('http_pool/reuse_ratio') == 0.8
+
+    def test_keys(self):
+        """Test each host and proxy gets its own connections."""
+        pool = MeteredConnectionPool(task.Clock())
+        endpoint = FakeEndpoint()
+        get_connection(pool, endpoint, key=('proxy-a',))
+        get_connection(pool, endpoint, key=('proxy-b',))
+        get_connection(pool, endpoint, key=('proxy-a',))
+        assert len(endpoint.protocols) == 2
+        assert (pool.new, pool.reused) == (2, 1)
+
+    def test_max_requests(self):
+        """Test a connection is closed after `max_requests` requests."""
+        crawler = get_crawler()
+        pool = MeteredConnectionPool(
+            task.Clock(), stats=crawler.stats, max_requests=2
+        )
+        endpoint = FakeEndpoint()
+        for _ in range(4):
+            get_connection(pool, endpoint)
+        assert len(endpoint.protocols) == 2
+        assert not endpoint.protocols[0].transport.connected
+        assert crawler.stats.get_value('http_pool/connections/retired') == 2
+
+    def test_idle_timeout(self):
+        """Test idle connections are closed after the timeout."""
+        clock = task.Clock()
+        pool = MeteredConnectionPool(clock)
+        pool.cachedConnectionTimeout = 10
+        endpoint = FakeEndpoint()
+        get_connection(pool, endpoint)
+        clock.advance(11)
+        get_connection(pool, endpoint)
+        assert len(endpoint.protocols) == 2
+        assert not endpoint.protocols[0].transport.connected
+
+
+class TestPooledHTTPDownloadHandler:
+    """Test case for PooledHTTPDownloadHandler."""
+
+    def test_settings(self):
+        """Test the pool is configured from the settings."""
+        crawler = get_crawler(settings_dict={
+            'HTTP_POOL_MAX_PER_HOST': 3,
+            'HTTP_POOL_IDLE_TIMEOUT': 30,
+            'HTTP_POOL_MAX_REQUESTS': 100,
+            'TWISTED_REACTOR_ENABLED': True,
+        })
+        handler = PooledHTTPDownloadHandler.from_crawler(crawler)
+        assert isinstance(handler._pool, MeteredConnectionPool)
+        assert handler._pool.maxPersistentPerHost == 3
+        assert handler._pool.cachedConnectionTimeout == 30
+        assert handler._pool.max_requests == 100
+        assert handler._pool.stats is crawler.stats
+
+    def test_default_max_per_host(self):
+        """Test idle connections default to the per-domain concurrency."""
+        crawler = get_crawler(settings_dict={
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 6,
+            'TWISTED_REACTOR_ENABLED': True,
+        })
+        handler = PooledHTTPDownloadHandler.from_crawler(crawler)
+        assert handler._pool.maxPersistentPerHost == 6
@@ -0,0 +1,70 @@
+"""Test for scrapy items."""
+from datetime import datetime
+
+from medium_crawler.items import ArticleItem, ArticleRecord
+from medium_crawler.pipelines import DefaultValuesPipeline
+
+
+def make_item() -> ArticleItem:
+    """Build a comment item."""
+    return ArticleItem(
+        uid='writer', link='https://medium.com/p/c1', author='User One',
+        author_id='u1', poster='Writer', title='T', content='hi',
+        comment_count=2, like_count=3,
+        created_time=datetime.fromtimestamp(1583020800.123),
+        fetched_time=datetime.fromtimestamp(1583107200.456),
+        article_type='comment', tag=None
+    )
+
+
+class TestArticleRecord:
+    """Test case for ArticleRecord."""
+
+    def test_round_trip(self):
+        """Test an item survives the conversion to a record and back."""
+        item = make_item()
+        record = ArticleRecord.from_item(item)
+        assert record.created_time == 1583020800123
+        assert record.fetched_time == 1583107200456
+        assert dict(record.to_item()) == {
+            k: v for k, v in item.items() if v is not None
+        }
+        assert ArticleRecord.from_item(record.to_item()) == record
+
+    def test_compact(self):
+        """Test records have no instance dict and share the type string."""
+        first = ArticleRecord.from_item(make_item())
+        second = ArticleRecord.from_item(
+            ArticleItem(article_type=''.join(['com', 'ment']))
+        )
+        assert not hasattr(first, '__dict__')
+        assert first.article_type is second.article_type
+
+    def test_missing_fields(self):
+        """Test missing fields are None, and counters 0."""
+        record = ArticleRecord.from_item(ArticleItem(link='l'))
+        assert record.created_time is None
+        assert record.like_count == 0
+        assert dict(record.to_item()) == {
+            'link': 'l', 'comment_count': 0, 'like_count': 0
+        }
+
+
+class TestDefaultValuesPipeline:
+    """Test case for DefaultValuesPipeline."""
+
+    def test_defaults(self):
+        """Test defaults are set without overwriting values."""
+        pipeline = DefaultValuesPipeline()
+        item = pipeline.process_item(ArticleItem(like_count=5), None)
+        assert item['like_count'] == 5
+        assert item['comment_count'] == 0
+        assert item['content'] is None
+        assert 'title' not in item
+
+    def test_fetched_time_per_item(self):
+        """Test `fetched_time` is evaluated for every item."""
+        pipeline = DefaultValuesPipeline()
+        before = datetime.now()
+        item = pipeline.process_item(ArticleItem(), None)
+        assert item['fetched_time'] >= before
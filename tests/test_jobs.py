@@ -0,0 +1,196 @@
+"""Test for the resumable crawl journal."""
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from medium_crawler import items
+from medium_crawler.jobs import (JobJournal, dump_request, item_fingerprint,
+                                 load_request)
+from medium_crawler.middlewares import ResumeMiddleware
+from medium_crawler.parents import PostRef
+from medium_crawler.spiders.medium import MediumPost
+
+URL = 'https://medium.com/_/api/posts/625a07c75000/responsesStream'
+
+
+def comment_request(spider: MediumPost) -> Request:
+    """Build a comment request of a post in the spider's post table."""
+    spider.posts.put(PostRef('625a07c75000', 'writer', 'W', 'T'))
+    return Request(
+        URL,
+        callback=spider.comment,
+        priority=150,
+        meta={
+            'uid': 'writer',
+            'post_id': '625a07c75000',
+            'proxy': 'http://proxy:8080',
+            'download_latency': 0.5,
+        }
+    )
+
+
+class TestSerialization:
+    """Test case for dump_request and load_request."""
+
+    def test_round_trip(self):
+        """Test callbacks, meta and the post reference survive."""
+        spider = MediumPost(date='20200301', usernames='writer')
+        data = dump_request(comment_request(spider), spider.posts)
+        assert len(data) < 300
+        resumed = MediumPost(date='20200301', usernames='writer')
+        request = load_request(data, resumed)
+        assert request.url == URL
+        assert request.callback == resumed.comment
+        assert request.priority == 150
+        assert request.dont_filter
+        assert request.meta == {'uid': 'writer', 'post_id': '625a07c75000'}
+        assert resumed.posts.get('625a07c75000') == PostRef(
+            '625a07c75000', 'writer', 'W', 'T'
+        )
+
+
+class TestJobJournal:
+    """Test case for JobJournal."""
+
+    def test_pending_survives_reopen(self, tmp_path):
+        """Test unfinished requests are loaded by a new journal."""
+        spider = MediumPost(date='20200301', usernames='writer')
+        journal = JobJournal(str(tmp_path))
+        first = journal.add(comment_request(spider))
+        journal.add(Request(f'{URL}?to=2', callback=spider.comment))
+        journal.flush()
+        journal.finish(first)
+        journal.emit(items.ArticleItem(link='l', article_type='comment'))
+        journal.flush()
+
+        reopened = JobJournal(str(tmp_path))
+        assert len(reopened) == 1
+        [request] = reopened.pending(spider)
+        assert request.url == f'{URL}?to=2'
+        assert request.meta['job_id'] == first + 1
+        assert reopened.emitted(
+            items.ArticleItem(link='l', article_type='comment')
+        )
+        assert reopened.add(Request(URL)) == first + 2
+
+    def test_short_lived_requests_are_not_written(self, tmp_path):
+        """Test a request finished before a flush never hits the disk."""
+        journal = JobJournal(str(tmp_path))
+        journal.finish(journal.add(Request(URL)))
+        journal.flush()
+        assert len(JobJournal(str(tmp_path))) == 0
+
+
+class TestResumeMiddleware:
+    """Test case for ResumeMiddleware."""
+
+    def make_middleware(self, tmp_path):
+        """Create a middleware and spider on a job directory."""
+        crawler = get_crawler(settings_dict={
+            'RESUME_DIR': str(tmp_path),
+            'RESUME_FLUSH_INTERVAL': 0,
+        })
+        mw = ResumeMiddleware.from_crawler(crawler)
+        spider = MediumPost(date='20200301', usernames='writer')
+        mw.spider_opened(spider)
+        return mw, spider
+
+    def test_resume(self, tmp_path):
+        """Test handled requests are removed and the rest is resumed."""
+        mw, spider = self.make_middleware(tmp_path)
+        parent = comment_request(spider)
+        mw.request_scheduled(parent, spider)
+        child = Request(f'{URL}?to=2', meta=dict(parent.meta),
+                        callback=spider.comment)
+        item = items.ArticleItem(link='l', article_type='comment')
+        response = HtmlResponse(URL, body=b'', request=parent)
+
+        output = list(mw.process_spider_output(response, [child, item],
+                                               spider))
+        assert 'job_id' not in child.meta
+        mw.request_scheduled(child, spider)
+        # the item is still in the pipelines
+        assert mw.handled == {parent.meta['job_id']}
+        mw.item_scraped(item, spider)
+        assert mw.handled == set()
+        assert len(mw.journal) == 1
+        assert output == [child, item]
+        mw.spider_closed(spider, 'shutdown')
+
+        mw, spider = self.make_middleware(tmp_path)
+        seeds = [Request('https://medium.com/@writer?format=json')]
+        restored = list(mw.process_start_requests(seeds, spider))
+        assert [r.url for r in restored] == [f'{URL}?to=2']
+        duplicate = list(mw.process_spider_output(
+            HtmlResponse(URL, body=b'', request=restored[0]), [item], spider
+        ))
+        assert duplicate == []
+
+    def test_finished_job_is_cleared(self, tmp_path):
+        """Test a finished crawl starts over."""
+        mw, spider = self.make_middleware(tmp_path)
+        mw.request_scheduled(comment_request(spider), spider)
+        mw.spider_closed(spider, 'finished')
+        mw, spider = self.make_middleware(tmp_path)
+        seeds = [Request('https://medium.com/@writer?format=json')]
+        assert list(mw.process_start_requests(seeds, spider)) == seeds
+
+    def test_requests_settle_on_their_own(self, tmp_path):
+        """Test a request is removed while others still have items."""
+        mw, spider = self.make_middleware(tmp_path)
+        first, second = Request(f'{URL}?to=1'), Request(f'{URL}?to=2')
+        mw.request_scheduled(first, spider)
+        mw.request_scheduled(second, spider)
+        slow = items.ArticleItem(link='slow', article_type='comment')
+        fast = items.ArticleItem(link='fast', article_type='comment')
+        list(mw.process_spider_output(
+            HtmlResponse(URL, body=b'', request=first), [slow], spider
+        ))
+        list(mw.process_spider_output(
+            HtmlResponse(URL, body=b'', request=second), [fast], spider
+        ))
+        mw.item_scraped(fast, spider)
+        assert mw.handled == {first.meta['job_id']}
+        assert len(mw.journal) == 1
+
+    def test_buffered_items_wait_for_their_write(self, tmp_path):
+        """Test an item buffered by an exporter is emitted once written."""
+        mw, spider = self.make_middleware(tmp_path)
+        request = Request(URL)
+        mw.request_scheduled(request, spider)
+        item = items.ArticleItem(link='l', article_type='comment')
+        list(mw.process_spider_output(
+            HtmlResponse(URL, body=b'', request=request), [item], spider
+        ))
+        mw.item_buffered(item)
+        mw.item_scraped(item, spider)
+        assert len(mw.journal) == 1
+        assert not mw.journal.emitted(item)
+        mw.items_stored([item_fingerprint(item)])
+        assert len(mw.journal) == 0
+        assert mw.journal.emitted(item)
+
+    def test_parked_comments(self, tmp_path):
+        """Test a comment page waits for the comments it parked."""
+        mw, spider = self.make_middleware(tmp_path)
+        page = comment_request(spider)
+        mw.request_scheduled(page, spider)
+        comment = items.ArticleItem(link='c', article_type='comment',
+                                    author_id='a1')
+        spider.authors.defer(comment, origin=page.meta['job_id'])
+        lookup = Request('https://medium.com/a1/c?format=json',
+                         meta={'author_id': 'a1'})
+        list(mw.process_spider_output(
+            HtmlResponse(URL, body=b'', request=page), [lookup], spider
+        ))
+        mw.request_scheduled(lookup, spider)
+        assert len(mw.journal) == 2
+
+        released = list(mw.process_spider_output(
+            HtmlResponse(lookup.url, body=b'', request=lookup),
+            spider.authors.release('a1'), spider
+        ))
+        assert released == [comment]
+        assert len(mw.journal) == 1
+        mw.item_scraped(comment, spider)
+        assert len(mw.journal) == 0
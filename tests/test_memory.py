@@ -0,0 +1,70 @@
+"""Memory test for the post-to-comment hand-off."""
+import gc
+import tracemalloc
+
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks import payloads
+from medium_crawler import items
+from medium_crawler.spiders.medium import MediumPost
+
+POST_ID = '625a07c75000'
+USER_ID = '8045c82962e2'
+RESPONSES = 10000
+PAGE_SIZE = 100
+RETAINED_BUDGET = 4 * 2 ** 20
+PEAK_BUDGET = 8 * 2 ** 20
+
+
+def test_post_with_10k_responses():
+    """Test pending requests stay small while 10k responses are crawled.
+
+    Items are dropped as the pipelines would, requests are kept as the
+    scheduler would. Allocations are traced from a baseline taken once the
+    payloads are built, so only what the spider keeps and its peak count.
+    """
+    spider = MediumPost(date='20000101', usernames='writer')
+    url = f'https://medium.com/{USER_ID}/{POST_ID}?format=json'
+    post_body = payloads.dump(payloads.post(
+        POST_ID, USER_ID, 'writer', 5000, RESPONSES
+    ))
+    pages = [
+        payloads.dump(payloads.responses(
+            POST_ID, PAGE_SIZE, 1000, missing_authors=0.1, page=page,
+            has_next=page < RESPONSES // PAGE_SIZE, seed=page
+        ))
+        for page in range(1, RESPONSES // PAGE_SIZE + 1)
+    ]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    response = HtmlResponse(
+        url, body=post_body, request=Request(url, meta={'uid': 'writer'})
+    )
+    pending = [o for o in spider.post(response) if isinstance(o, Request)]
+    request = pending[0]
+    for body in pages:
+        response = HtmlResponse(request.url, body=body, request=request)
+        output = [
+            o for o in spider.comment(response) if isinstance(o, Request)
+        ]
+        pending.extend(output)
+        request = next(
+            (r for r in output if r.callback == spider.comment), request
+        )
+    del response, output
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained, peak = after - before, peak - before
+
+    assert len(spider.posts) == 0
+    assert not [
+        r for r in pending
+        if any(isinstance(v, items.ArticleItem) for v in r.meta.values())
+    ]
+    assert retained < RETAINED_BUDGET, (
+        f'{retained / 2 ** 20:.1f} MiB retained'
+    )
+    assert peak < PEAK_BUDGET, f'{peak / 2 ** 20:.1f} MiB at peak'
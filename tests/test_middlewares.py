@@ -0,0 +1,64 @@
+"""Test for scrapy middlewares."""
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from medium_crawler.middlewares import MediumCacheMiddleware
+
+
+class TestMediumCacheMiddleware:
+    """Test case for MediumCacheMiddleware."""
+
+    url = 'https://medium.com/8045c82962e2/625a07c75000?format=json'
+
+    def make_middleware(self, tmp_path, ttl):
+        """Create a cache middleware in a temporary directory."""
+        crawler = get_crawler(settings_dict={
+            'MEDIUM_CACHE_ENABLED': True,
+            'MEDIUM_CACHE_DIR': str(tmp_path),
+            'MEDIUM_CACHE_TTLS': {'profile': ttl, 'post': ttl, 'comment': ttl},
+        })
+        return MediumCacheMiddleware.from_crawler(crawler)
+
+    def test_endpoint(self, tmp_path):
+        """Test medium urls are classified by endpoint."""
+        mw = self.make_middleware(tmp_path, 60)
+        assert mw.endpoint(Request(self.url)) == 'post'
+        assert mw.endpoint(
+            Request('https://medium.com/@chiayinchen?format=json')
+        ) == 'profile'
+        assert mw.endpoint(Request(
+            'https://medium.com/_/api/users/8045c82962e2/profile/stream'
+            '?limit=10&to=1&source=latest&page=2'
+        )) == 'profile'
+        assert mw.endpoint(Request(
+            'https://medium.com/_/api/posts/625a07c75000/responsesStream'
+        )) == 'comment'
+        request = Request(self.url, meta={'dont_cache': True})
+        assert mw.endpoint(request) is None
+
+    def test_hit(self, tmp_path):
+        """Test fresh entries are served from disk."""
+        mw = self.make_middleware(tmp_path, 60)
+        request = Request(self.url)
+        assert mw.process_request(request, None) is None
+        response = TextResponse(self.url, body=b'{}', request=request)
+        mw.process_response(request, response, None)
+        cached = mw.process_request(Request(self.url), None)
+        assert cached.body == b'{}'
+        assert 'cached' in cached.flags
+
+    def test_revalidate(self, tmp_path):
+        """Test stale entries are revalidated and replayed on 304."""
+        mw = self.make_middleware(tmp_path, 0)
+        request = Request(self.url)
+        response = TextResponse(self.url, body=b'{}', request=request,
+                                headers={'ETag': '"v1"'})
+        mw.process_response(request, response, None)
+        request = Request(self.url)
+        assert mw.process_request(request, None) is None
+        assert request.headers[b'If-None-Match'] == b'"v1"'
+        not_modified = TextResponse(self.url, status=304, request=request)
+        replayed = mw.process_response(request, not_modified, None)
+        assert replayed.status == 200
+        assert replayed.body == b'{}'
@@ -0,0 +1,263 @@
+"""Test for the medium stand-in server and the spider base url."""
+import asyncio
+import json
+from collections import deque
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from benchmarks.mock_medium import MockMedium
+from medium_crawler import items, payload
+from medium_crawler.spiders.medium import MediumPost
+from medium_crawler.watermarks import Cursor
+
+BASE_URL = 'http://127.0.0.1:8080'
+POST_ID = '000000a1b2c3'
+
+
+def fetch(mock, request):
+    """Answer a request with the stand-in, without network."""
+    url = urlparse(request.url)
+    _, status, body = mock.route(url.path, dict(parse_qsl(url.query)))
+    return HtmlResponse(url=request.url, status=status, body=body,
+                        request=request)
+
+
+def crawl(mock, spider):
+    """Run the spider callbacks on the stand-in responses.
+
+    Returns:
+        tuple: items and requested urls
+    """
+    output, urls = [], []
+    queue = deque(spider.start_requests())
+    while queue:
+        request = queue.popleft()
+        urls.append(request.url)
+        for result in request.callback(fetch(mock, request)) or ():
+            if isinstance(result, Request):
+                queue.append(result)
+            else:
+                output.append(result)
+    return output, urls
+
+
+def base_spider(**kwargs):
+    """Build a spider pointed at the stand-in."""
+    crawler = get_crawler(MediumPost, settings_dict={
+        'MEDIUM_BASE_URL': BASE_URL,
+        'PROFILE_CACHE_ENABLED': False,
+    })
+    return MediumPost.from_crawler(crawler, date='20000101', **kwargs)
+
+
+class TestMockMedium:
+    """Test case for the stand-in routes."""
+
+    def test_profile_pages(self):
+        """Test profile pages page through every post of a writer."""
+        mock = MockMedium(writers=2, posts=25, page_size=10)
+        _, status, body = mock.route('/@writer1', {})
+        obj = payload.decode(body)
+        assert status == 200
+        assert obj['payload']['user']['username'] == 'writer1'
+        assert obj['payload']['paging']['path'].startswith(
+            'https://medium.com/_/api/'
+        )
+        _, _, body = mock.route(
+            '/_/api/users/000001000001/profile/stream', {'page': '3'}
+        )
+        assert 'next' not in payload.decode(body)['payload']['paging']
+        assert mock.route('/@nobody', {})[1] == 404
+
+    def test_comment_pages(self):
+        """Test comment pages stop after the comments of the post."""
+        mock = MockMedium(comments=120, comment_page_size=50)
+        path = '/_/api/posts/p1/responsesStream'
+        obj = payload.decode(mock.route(path, {})[2])
+        assert obj['payload']['paging']['next']['to'] == '50'
+        obj = payload.decode(
+            mock.route(path, {'limit': '50', 'to': '100'})[2]
+        )
+        assert len(obj['payload']['references']['Post']) == 21
+        assert 'next' not in obj['payload']['paging']
+
+    def test_comment_ids(self):
+        """Test comments of two posts have distinct ids."""
+        mock = MockMedium()
+        ids = [
+            set(payload.decode(mock.route(
+                f'/_/api/posts/{post_id}/responsesStream', {}
+            )[2])['payload']['references']['Post'])
+            for post_id in ('000001001000', '000001001001')
+        ]
+        assert len(ids[0]) == len(ids[1]) == 51
+        assert not ids[0] & ids[1]
+
+    def test_post_updated_at(self):
+        """Test a post is as recent as its profile stream entry."""
+        mock = MockMedium(posts=25, page_size=10)
+        obj = payload.decode(mock.route(
+            '/_/api/users/000001000001/profile/stream', {'page': '2'}
+        )[2])
+        for post_id, post in obj['payload']['references']['Post'].items():
+            value = payload.decode(mock.route(
+                f'/000001000001/{post_id}', {}
+            )[2])['payload']['value']
+            assert value['updatedAt'] == post['updatedAt']
+
+    def test_deterministic(self):
+        """Test the same path gets the same payload."""
+        path = '/000001000001/000001001000'
+        first, second = MockMedium(), MockMedium()
+        second.newest_ms = first.newest_ms
+        assert first.route(path, {}) == second.route(path, {})
+
+    def test_bursts(self):
+        """Test every request of a burst gets a 429."""
+        mock = MockMedium(burst_every=60, burst_length=5)
+        status, headers = mock.fault(mock.started + 61)
+        assert status == 429
+        assert headers['Retry-After'] == '4'
+        assert mock.fault(mock.started + 30) is None
+
+    def test_errors(self):
+        """Test the error rate."""
+        mock = MockMedium(error_rate=0.5)
+        faults = [mock.fault(mock.started) for _ in range(1000)]
+        assert 400 < sum(1 for f in faults if f) < 600
+
+    def test_stats(self):
+        """Test the stats route reports the served requests."""
+        mock = MockMedium()
+        mock.served['post/200'] += 1
+        assert json.loads(mock.route('/_mock/stats', {})[2]) == {
+            'post/200': 1
+        }
+
+
+class TestBaseUrl:
+    """Test case for the spider base url."""
+
+    def test_default(self):
+        """Test medium.com is requested by default."""
+        spider = MediumPost(date='20000101', usernames='writer0')
+        request = next(spider.start_requests())
+        assert request.url == 'https://medium.com/@writer0?format=json'
+
+    def test_start(self):
+        """Test scrapy 2.13+ gets the requests of `start_requests`."""
+        spider = MediumPost(date='20000101', usernames='writer0,writer1')
+
+        async def start():
+            return [request async for request in spider.start()]
+
+        assert ([r.url for r in asyncio.run(start())]
+                == [r.url for r in spider.start_requests()])
+
+    def test_urls_are_rebased(self):
+        """Test the `urls` argument is sent to the base url."""
+        spider = base_spider(urls='https://medium.com/@writer0/p1')
+        request = next(spider.start_requests())
+        assert request.url == f'{BASE_URL}/@writer0/p1?format=json'
+
+    def test_profile_paging_is_rebased(self):
+        """Test the second profile page is requested from the base url."""
+        mock = MockMedium(writers=1, posts=20, page_size=10, comments=0)
+        _, urls = crawl(mock, base_spider(usernames='writer0'))
+        stream = [u for u in urls if '/profile/stream' in u]
+        assert stream and all(u.startswith(BASE_URL) for u in stream)
+
+    def test_crawl(self):
+        """Test a full crawl stays on the stand-in.
+
+        Item links keep pointing at medium.com.
+        """
+        mock = MockMedium(writers=2, posts=20, page_size=10, comments=60,
+                          comment_page_size=25, authors=10,
+                          missing_authors=0.2)
+        spider = base_spider(usernames='writer0,writer1')
+        output, urls = crawl(mock, spider)
+        assert all(url.startswith(BASE_URL) for url in urls)
+        records = [o for o in output if isinstance(o, items.ArticleItem)]
+        posts = [r for r in records if r['article_type'] == 'post']
+        comments = [r for r in records if r['article_type'] == 'comment']
+        assert len(posts) == 40
+        assert len(comments) == 40 * 60
+        assert all(r['link'].startswith('https://medium.com/')
+                   for r in records)
+        assert all(c.get('author') for c in comments)
+
+
+class TestRefresh:
+    """Test case for the refresh mode."""
+
+    def test_metrics(self):
+        """Test only the counters of a post are requested and emitted."""
+        mock = MockMedium(comments=60)
+        spider = base_spider(urls=POST_ID, refresh='metrics')
+        output, urls = crawl(mock, spider)
+        assert urls == [f'{BASE_URL}/p/{POST_ID}?format=json']
+        assert len(output) == 1
+        assert isinstance(output[0], items.ArticleDeltaItem)
+        assert output[0]['comment_count'] == 60
+        assert output[0]['link'] == f'https://medium.com/@user_p/{POST_ID}'
+
+    def test_comments(self, tmp_path, monkeypatch):
+        """Test a refresh crawls the responses after the cursor."""
+        monkeypatch.setenv('DATABASE_URL',
+                           f'sqlite:///{tmp_path / "rule.db"}')
+
+        def refresh(mock):
+            spider = base_spider(urls=POST_ID, refresh='comments')
+            output, urls = crawl(mock, spider)
+            spider.cursors.flush()
+            comments = [o for o in output
+                        if isinstance(o, items.ArticleItem)]
+            return comments, urls, spider.cursors.get(POST_ID)
+
+        # the first refresh reads the stream only to set the cursor
+        mock = MockMedium(comments=100, missing_authors=0)
+        comments, urls, cursor = refresh(mock)
+        assert (len(comments), len(urls)) == (0, 3)
+        assert cursor == Cursor(100, '50', 50)
+
+        mock = MockMedium(comments=170, missing_authors=0)
+        comments, urls, cursor = refresh(mock)
+        assert urls[1] == (f'{BASE_URL}/_/api/posts/{POST_ID}/'
+                           f'responsesStream?limit=50&to=50')
+        assert len(comments) == 70
+        assert len({c['link'] for c in comments}) == 70
+        assert {c['title'] for c in comments} == {f'Post {POST_ID}'}
+        assert cursor == Cursor(170, '150', 20)
+
+        comments, urls, cursor = refresh(mock)
+        assert (len(comments), len(urls)) == (0, 1)
+        assert cursor == Cursor(170, '150', 20)
+
+    def test_comments_budget(self, tmp_path, monkeypatch):
+        """Test a refresh cut by the budget resumes where it stopped."""
+        monkeypatch.setenv('DATABASE_URL',
+                           f'sqlite:///{tmp_path / "rule.db"}')
+
+        def refresh(mock, budget=0):
+            spider = base_spider(urls=POST_ID, refresh='comments')
+            spider.comment_budget = budget
+            output, _ = crawl(mock, spider)
+            spider.cursors.flush()
+            return {o['link'] for o in output
+                    if isinstance(o, items.ArticleItem)}
+
+        refresh(MockMedium(comments=100, missing_authors=0))
+        mock = MockMedium(comments=170, missing_authors=0)
+        first = refresh(mock, budget=30)
+        second = refresh(mock)
+        assert (len(first), len(second)) == (30, 40)
+        assert not first & second
+
+    def test_unknown_mode(self):
+        """Test refresh modes are checked."""
+        with pytest.raises(ValueError):
+            MediumPost(date='20000101', urls=POST_ID, refresh='all')
@@ -0,0 +1,198 @@
+"""Test for payload extraction and the parse pool."""
+import inspect
+import pickle
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+from twisted.internet import defer
+
+from benchmarks import payloads
+from medium_crawler import items, parsing, payload
+from medium_crawler.parents import PostRef
+from medium_crawler.spiders.medium import MediumPost
+
+POST_ID = '625a07c75000'
+USER_ID = '8045c82962e2'
+USERNAME = 'writer'
+
+
+class InlinePool:
+    """Parse pool running the submitted function on the calling thread."""
+
+    def submit(self, func, *args):
+        """Run a function and wrap its result in a fired deferred."""
+        return defer.succeed(func(*args))
+
+
+def response(url, body, **meta):
+    """Build a response to a request with meta."""
+    return HtmlResponse(url=url, body=body, request=Request(url, meta=meta))
+
+
+def comment_response():
+    """Build a `responsesStream` response of 20 comments."""
+    body = payloads.dump(payloads.responses(
+        POST_ID, 20, 5, page=1, has_next=True
+    ))
+    return response(
+        f'https://medium.com/_/api/posts/{POST_ID}/responsesStream',
+        body, uid=USERNAME, post_id=POST_ID, comment_page=1
+    )
+
+
+def spider_with_post():
+    """Build a spider knowing the commented post."""
+    spider = MediumPost(date='20000101', usernames=USERNAME)
+    spider.posts.put(PostRef(POST_ID, USERNAME, 'Writer', 'Title'))
+    return spider
+
+
+def collect(output):
+    """Get the output of a callback, coroutine or iterator."""
+    if inspect.iscoroutine(output):
+        result = []
+        defer.ensureDeferred(output).addCallback(result.extend)
+        return result
+    return list(output)
+
+
+class TestExtractors:
+    """Test case for the extraction functions."""
+
+    def test_links_result(self):
+        """Test posts, author and next page are read from a profile."""
+        obj = payloads.profile(USER_ID, USERNAME, 3, 1583020800000)
+        result = parsing.links_result(obj)
+        assert result.user['userId'] == USER_ID
+        assert len(result.posts) == 3
+        assert result.paging['page'] == 2
+
+    def test_links_result_copy(self):
+        """Test a copied profile only keeps what the spider reads."""
+        obj = payloads.profile(USER_ID, USERNAME, 3, 1583020800000,
+                               has_next=False)
+        result = parsing.links_result(obj, copy=True)
+        post = next(iter(result.posts.values()))
+        assert set(post) == {'id', 'updatedAt', 'creatorId'}
+        assert result.user == payloads.user(USER_ID, USERNAME)
+        assert result.paging is None
+
+    def test_post_result(self):
+        """Test the post item, id and users are read from a post."""
+        obj = payloads.post(POST_ID, USER_ID, USERNAME, 3, 2)
+        result = parsing.post_result(obj)
+        assert isinstance(result.record, items.ArticleItem)
+        assert result.record['comment_count'] == 2
+        assert result.post_id == POST_ID
+        assert USER_ID in result.users
+
+    def test_metrics_result(self):
+        """Test only the counters of a post are read."""
+        obj = payloads.post(POST_ID, USER_ID, USERNAME, 3, 2)
+        del obj['payload']['value']['content']
+        result = parsing.metrics_result(obj)
+        assert isinstance(result.record, items.ArticleDeltaItem)
+        assert result.record['comment_count'] == 2
+        assert result.record['uid'] == USERNAME
+        assert result.record['link'].endswith(POST_ID)
+        assert result.post_id == POST_ID
+
+    def test_comment_result(self):
+        """Test the commented post is skipped."""
+        obj = payloads.responses(POST_ID, 20, 5)
+        result = parsing.comment_result(obj, POST_ID)
+        assert len(result.comments) == 20
+        assert POST_ID not in {c['post_id'] for c in result.comments}
+        assert result.paging is None
+
+    def test_comment_result_limit(self):
+        """Test no more than `limit` comments are extracted."""
+        obj = payloads.responses(POST_ID, 20, 5)
+        assert len(parsing.comment_result(obj, POST_ID, 7).comments) == 7
+
+    def test_decode_and_extract_is_picklable(self):
+        """Test worker results can be sent back from another process."""
+        body = payloads.dump(payloads.responses(POST_ID, 20, 5))
+        result = parsing.decode_and_extract(
+            parsing.comment_result, body, 'json', POST_ID, 0
+        )
+        assert pickle.loads(pickle.dumps(result)) == result
+
+
+class TestParsePool:
+    """Test case for the shared parse pool."""
+
+    def test_shared_and_released(self):
+        """Test crawlers share a pool until the last one releases it."""
+        pool = parsing.ParsePool.get('thread', 1, 2)
+        assert parsing.ParsePool.get('thread', 1, 2) is pool
+        assert pool.users == 2
+        pool.release()
+        assert parsing.ParsePool._instances[pool.key] is pool
+        pool.release()
+        assert pool.key not in parsing.ParsePool._instances
+
+    def test_unknown_kind(self):
+        """Test unknown pool kinds are rejected."""
+        with pytest.raises(ValueError):
+            parsing.ParsePool('fiber')
+
+    @pytest.mark.parametrize('kind', parsing.KINDS)
+    def test_workers(self, kind):
+        """Test a payload is decoded and extracted in a worker."""
+        pool = parsing.ParsePool(kind, 1)
+        body = payloads.dump(payloads.responses(POST_ID, 20, 5))
+        try:
+            result = pool.executor.submit(
+                parsing.decode_and_extract, parsing.comment_result, body,
+                'json', POST_ID, 0
+            ).result(timeout=30)
+        finally:
+            pool.executor.shutdown()
+        assert len(result.comments) == 20
+
+
+class TestInlineSpider:
+    """Test case for spider callbacks parsing on the reactor."""
+
+    def test_decoded_when_iterated(self):
+        """Test the payload is decoded while the output is consumed."""
+        spider = spider_with_post()
+        decoded = []
+
+        def decode(body):
+            decoded.append(body)
+            return payload.decode(body)
+
+        spider.decode = decode
+        output = spider.comment(comment_response())
+        assert not decoded
+        assert collect(output)
+        assert len(decoded) == 1
+
+
+class TestPooledSpider:
+    """Test case for spider callbacks running on a parse pool."""
+
+    def test_comment_output_matches_inline(self):
+        """Test pooled callbacks emit what inline callbacks emit."""
+        inline = collect(spider_with_post().comment(comment_response()))
+        spider = spider_with_post()
+        spider.parse_pool = InlinePool()
+        output = spider.comment(comment_response())
+        assert inspect.iscoroutine(output)
+        pooled = collect(output)
+        assert [type(o) for o in pooled] == [type(o) for o in inline]
+        assert ([dict(o) for o in pooled if isinstance(o, items.ArticleItem)]
+                == [dict(o) for o in inline
+                    if isinstance(o, items.ArticleItem)])
+        assert pooled[-1].url == inline[-1].url
+
+    def test_comment_budget(self):
+        """Test the budget limits the comments extracted by a worker."""
+        spider = spider_with_post()
+        spider.parse_pool = InlinePool()
+        spider.comment_budget = 5
+        output = collect(spider.comment(comment_response()))
+        assert len([o for o in output
+                    if isinstance(o, items.ArticleItem)]) <= 5
@@ -0,0 +1,42 @@
+"""Test for payload decoding."""
+import pytest
+
+from medium_crawler import payload
+
+BODY = (
+    b'])}while(1);</x>'
+    b'{"payload": {"value": {"title": "\xc3\xa9t\xc3\xa9"}}}'
+)
+
+
+class TestPayload:
+    """Test case for payload decoders."""
+
+    @pytest.mark.parametrize('backend', ['auto', 'json', 'orjson'])
+    def test_decode(self, backend):
+        """Test the prefix is stripped and utf-8 is decoded."""
+        if backend == 'orjson':
+            pytest.importorskip('orjson')
+        obj = payload.get_decoder(backend)(BODY)
+        assert obj['payload']['value']['title'] == 'été'
+
+    def test_decode_simdjson(self):
+        """Test the simdjson backend reads the stripped body."""
+        pytest.importorskip('simdjson')
+        obj = payload.get_decoder('simdjson')(BODY)
+        assert obj['payload']['value']['title'] == 'été'
+        assert payload.decode_simdjson(b'{"a": [1]}')['a'][0] == 1
+
+    def test_decode_without_prefix(self):
+        """Test bodies without the prefix are decoded as they are."""
+        assert payload.decode_json(b'{"a": 1}') == {'a': 1}
+        assert payload.decode_json(b'])}while(1);</x> {"a": 1}\n') == {
+            'a': 1
+        }
+        with pytest.raises(ValueError):
+            payload.decode_json(b'])}while(1);</x>{"a": 1}]')
+
+    def test_unknown_backend(self):
+        """Test unknown backends are rejected."""
+        with pytest.raises(ValueError):
+            payload.get_decoder('yaml')
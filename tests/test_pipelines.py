@@ -0,0 +1,139 @@
+"""Test for scrapy pipelines."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from medium_crawler import jobs
+from medium_crawler.items import ArticleDeltaItem, ArticleItem
+from medium_crawler.models import Article
+from medium_crawler.pipelines import (ArticleExportPipeline,
+                                      ParquetExportPipeline)
+
+
+class FakeSignals:
+    """Signal manager recording the sent signals."""
+
+    def __init__(self):
+        """Start without signals."""
+        self.sent = []
+
+    def send_catch_log(self, signal, **kwargs):
+        """Record a signal."""
+        self.sent.append((signal, kwargs))
+
+
+def make_item(link: str, like_count: int = 0) -> ArticleItem:
+    """Build a post item."""
+    return ArticleItem(
+        uid='writer', link=link, title='T', like_count=like_count,
+        created_time=datetime(2020, 3, 1), article_type='post'
+    )
+
+
+class TestArticleExportPipeline:
+    """Test case for ArticleExportPipeline."""
+
+    def test_batches_and_upserts(self, tmp_path):
+        """Test items are written per batch and keyed by link."""
+        engine = create_engine(f'sqlite:///{tmp_path / "rule.db"}')
+        pipeline = ArticleExportPipeline(engine, batch_size=2,
+                                         flush_interval=0)
+        pipeline.open_spider(None)
+        pipeline.process_item(make_item('https://medium.com/a'), None)
+        assert engine.execute(Article.__table__.count()).scalar() == 0
+        pipeline.process_item(make_item('https://medium.com/b'), None)
+        assert engine.execute(Article.__table__.count()).scalar() == 2
+        pipeline.process_item(make_item('https://medium.com/a', 5), None)
+        pipeline.close_spider(None)
+        rows = engine.execute(
+            Article.__table__.select().order_by(Article.link)
+        ).fetchall()
+        assert [(r.link, r.like_count) for r in rows] == [
+            ('https://medium.com/a', 5), ('https://medium.com/b', 0)
+        ]
+
+    def test_delta_updates_counters(self, tmp_path):
+        """Test delta items only update the counters of their row."""
+        engine = create_engine(f'sqlite:///{tmp_path / "rule.db"}')
+        pipeline = ArticleExportPipeline(engine, batch_size=10,
+                                         flush_interval=0)
+        pipeline.open_spider(None)
+        pipeline.process_item(make_item('https://medium.com/a'), None)
+        pipeline.process_item(make_item('https://medium.com/b'), None)
+        pipeline.flush()
+        for link, like_count in (('https://medium.com/a', 7),
+                                 ('https://medium.com/c', 1)):
+            pipeline.process_item(ArticleDeltaItem(
+                link=link, like_count=like_count, comment_count=0,
+                fetched_time=datetime(2020, 3, 3)
+            ), None)
+        pipeline.close_spider(None)
+        rows = engine.execute(
+            Article.__table__.select().order_by(Article.link)
+        ).fetchall()
+        assert [(r.link, r.title, r.like_count) for r in rows] == [
+            ('https://medium.com/a', 'T', 7), ('https://medium.com/b', 'T', 0)
+        ]
+
+    def test_stored_signal(self, tmp_path):
+        """Test buffered items are announced once written."""
+        engine = create_engine(f'sqlite:///{tmp_path / "rule.db"}')
+        pipeline = ArticleExportPipeline(engine, batch_size=10,
+                                         flush_interval=0)
+        pipeline.signals = FakeSignals()
+        pipeline.open_spider(None)
+        item = make_item('https://medium.com/a')
+        pipeline.process_item(item, None)
+        assert pipeline.signals.sent == [
+            (jobs.item_buffered, {'item': item})
+        ]
+        pipeline.flush()
+        assert pipeline.signals.sent[-1] == (
+            jobs.items_stored,
+            {'fingerprints': [jobs.item_fingerprint(item)]}
+        )
+
+
+class TestParquetExportPipeline:
+    """Test case for ParquetExportPipeline."""
+
+    def test_partitions_and_rolls(self, tmp_path):
+        """Test files are partitioned, typed and rolled."""
+        pq = pytest.importorskip('pyarrow.parquet')
+        pipeline = ParquetExportPipeline(str(tmp_path), row_group_size=2,
+                                         max_rows_per_file=2)
+        for i in range(5):
+            item = make_item(f'https://medium.com/{i}')
+            item['tag'] = 'python,scrapy'
+            item['fetched_time'] = datetime(2020, 3, 2, 8)
+            pipeline.process_item(item, None)
+        comment = make_item('https://medium.com/c')
+        comment['article_type'] = 'comment'
+        comment['fetched_time'] = datetime(2020, 3, 2, 8)
+        pipeline.process_item(comment, None)
+        pipeline.close_spider(None)
+
+        partition = tmp_path / 'article_type=post' / 'crawl_date=2020-03-02'
+        posts = sorted(partition.iterdir())
+        assert len(posts) == 3
+        table = pq.read_table(str(posts[0]))
+        assert table.num_rows == 2
+        assert table.column('tag').to_pylist()[0] == ['python', 'scrapy']
+        assert str(table.schema.field('created_time').type) == 'timestamp[ms]'
+        assert (tmp_path / 'article_type=comment').exists()
+
+    def test_deltas(self, tmp_path):
+        """Test delta items are written to their own files."""
+        pq = pytest.importorskip('pyarrow.parquet')
+        pipeline = ParquetExportPipeline(str(tmp_path))
+        pipeline.process_item(ArticleDeltaItem(
+            link='https://medium.com/a', article_type='post', like_count=3,
+            comment_count=0, fetched_time=datetime(2020, 3, 2, 8)
+        ), None)
+        pipeline.close_spider(None)
+        partition = (tmp_path / 'deltas' / 'article_type=post' /
+                     'crawl_date=2020-03-02')
+        table = pq.read_table(str(next(partition.iterdir())))
+        assert 'content' not in table.column_names
+        assert table.column('like_count').to_pylist() == [3]
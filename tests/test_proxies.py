@@ -0,0 +1,96 @@
+"""Test for the proxy pool."""
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from medium_crawler import middlewares
+from medium_crawler.middlewares import ProxyMiddleware
+from medium_crawler.proxies import ProxyPool
+
+FAST = 'http://fast:8080'
+SLOW = 'http://slow:8080'
+
+
+class TestProxyPool:
+    """Test case for ProxyPool."""
+
+    def test_healthiest(self):
+        """Test the proxy with the best latency is picked."""
+        pool = ProxyPool([SLOW, FAST])
+        for _ in range(5):
+            pool.success(SLOW, latency=5)
+            pool.success(FAST, latency=0.2)
+        assert pool.pick() == FAST
+
+    def test_in_flight_spreads_load(self):
+        """Test busy proxies are picked less often."""
+        pool = ProxyPool([SLOW, FAST])
+        pool.proxies[FAST].in_flight = 10
+        assert pool.pick() == SLOW
+
+    def test_sticky_session(self):
+        """Test a session keeps its proxy until it is quarantined."""
+        pool = ProxyPool([SLOW, FAST])
+        proxy = pool.pick('chiayinchen', now=0)
+        pool.proxies[proxy].in_flight = 10
+        assert pool.pick('chiayinchen', now=0) == proxy
+        pool.failure(proxy, ban=True, now=0)
+        assert pool.pick('chiayinchen', now=1) != proxy
+
+    def test_quarantine(self):
+        """Test quarantine after consecutive errors and its backoff."""
+        pool = ProxyPool([FAST], max_failures=2, quarantine=10)
+        assert not pool.failure(FAST, now=0)
+        assert pool.failure(FAST, now=0)
+        assert pool.pick(now=5) is None
+        assert [p.url for p in pool.due(now=11)] == [FAST]
+        assert pool.failure(FAST, now=11)
+        assert pool.pick(now=25) is None
+        assert pool.pick(now=32) == FAST
+        pool.success(FAST, latency=0.1, now=32)
+        assert pool.due(now=32) == []
+        assert pool.proxies[FAST].quarantines == 0
+
+
+class TestProxyMiddleware:
+    """Test case for ProxyMiddleware."""
+
+    url = 'https://medium.com/8045c82962e2/625a07c75000?format=json'
+
+    def make_middleware(self, monkeypatch):
+        """Create a middleware with two proxies."""
+        monkeypatch.setattr(middlewares, 'PROXY_ENABLED', True)
+        monkeypatch.setattr(middlewares, 'PROXY', f'{FAST},{SLOW}')
+        crawler = get_crawler(settings_dict={
+            'PROXY_FROM_DATABASE': False,
+            'PROXY_MAX_FAILURES': 3,
+            'PROXY_QUARANTINE_TIME': 60,
+            'PROXY_MAX_QUARANTINE_TIME': 3600,
+        })
+        return ProxyMiddleware.from_crawler(crawler)
+
+    def test_slot_per_proxy(self, monkeypatch):
+        """Test every request uses a proxy and a per-proxy slot."""
+        mw = self.make_middleware(monkeypatch)
+        request = Request(self.url, meta={'uid': 'chiayinchen'})
+        mw.process_request(request, None)
+        proxy = request.meta['proxy']
+        assert proxy in (FAST, SLOW)
+        assert request.meta['download_slot'] == f'medium.com@{proxy}'
+        assert mw.pool.proxies[proxy].in_flight == 1
+
+    def test_ban(self, monkeypatch):
+        """Test a 429 quarantines the proxy of the request."""
+        mw = self.make_middleware(monkeypatch)
+        request = Request(self.url, meta={'uid': 'chiayinchen'})
+        mw.process_request(request, None)
+        proxy = request.meta['proxy']
+        response = TextResponse(self.url, status=429, request=request)
+        mw.process_response(request, response, None)
+        assert mw.pool.proxies[proxy].in_flight == 0
+        assert [p.url for p in mw.pool.healthy()] == [
+            p for p in (FAST, SLOW) if p != proxy
+        ]
+        retry = Request(self.url, meta={'uid': 'chiayinchen'})
+        mw.process_request(retry, None)
+        assert retry.meta['proxy'] != proxy
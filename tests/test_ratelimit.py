@@ -0,0 +1,159 @@
+"""Test for adaptive rate control."""
+import asyncio
+import time
+from email.utils import formatdate
+
+from scrapy import Request, Spider
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from medium_crawler import middlewares
+from medium_crawler import settings as project_settings
+from medium_crawler.middlewares import (BackoffRetryMiddleware,
+                                        RateLimitMiddleware)
+from medium_crawler.ratelimit import (RateController, TokenBucket, backoff,
+                                      parse_retry_after)
+from medium_crawler.spiders.medium import MediumPost
+
+
+class TestTokenBucket:
+    """Test case for TokenBucket."""
+
+    def test_burst_then_rate(self):
+        """Test a burst is free and later tokens wait for the rate."""
+        bucket = TokenBucket(rate=2, burst=2)
+        assert bucket.reserve(now=bucket.updated) == 0
+        assert bucket.reserve(now=bucket.updated) == 0
+        assert bucket.reserve(now=bucket.updated) == 0.5
+        assert bucket.reserve(now=bucket.updated) == 1.0
+
+    def test_aimd(self):
+        """Test additive increase and multiplicative decrease."""
+        bucket = TokenBucket(rate=4, burst=1, min_rate=1, max_rate=4.1,
+                             increase=0.05, decrease=0.5)
+        bucket.on_success()
+        bucket.on_success()
+        assert bucket.rate == 4.1
+        bucket.on_throttle()
+        assert bucket.rate == 2.05
+        bucket.on_throttle()
+        bucket.on_throttle()
+        assert bucket.rate == 1
+
+    def test_retry_after_blocks(self):
+        """Test Retry-After blocks the bucket."""
+        bucket = TokenBucket(rate=10, burst=10)
+        now = bucket.updated
+        bucket.on_throttle(retry_after=30, now=now)
+        assert bucket.reserve(now=now + 10) == 20
+
+
+class TestRateController:
+    """Test case for RateController."""
+
+    def test_buckets(self):
+        """Test buckets are kept per endpoint type and proxy."""
+        controller = RateController({
+            'post': {'rate': 5, 'burst': 10},
+            'default': {'rate': 1, 'burst': 1},
+        })
+        assert controller.bucket('post') is controller.bucket('post')
+        assert controller.bucket('post') is not controller.bucket(
+            'post', 'http://proxy:8080'
+        )
+        assert controller.bucket('post').rate == 5
+        assert controller.bucket(None) is controller.bucket('comment')
+        assert controller.bucket(None).rate == 1
+
+
+def test_parse_retry_after():
+    """Test Retry-After in seconds and as an HTTP date."""
+    assert parse_retry_after(None) is None
+    assert parse_retry_after(b'120') == 120
+    assert parse_retry_after(b'soon') is None
+    date = formatdate(time.time() + 60, usegmt=True).encode()
+    assert 55 < parse_retry_after(date) <= 60
+
+
+def test_backoff():
+    """Test backoff grows exponentially up to the cap."""
+    for _ in range(100):
+        assert 0 <= backoff(1, base=1, cap=60) <= 1
+        assert 0 <= backoff(4, base=1, cap=60) <= 8
+        assert 0 <= backoff(20, base=1, cap=60) <= 60
+
+
+class TestMiddlewares:
+    """Test case for RateLimitMiddleware and BackoffRetryMiddleware."""
+
+    url = 'https://medium.com/_/api/posts/625a07c75000/responsesStream'
+
+    def test_throttle(self):
+        """Test a 429 lowers the rate of the endpoint bucket."""
+        crawler = get_crawler(settings_dict={
+            'RATE_CONTROL_ENABLED': True,
+            'RATE_CONTROL_ENDPOINTS': {'comment': {'rate': 2, 'burst': 4}},
+            'RATE_CONTROL_MIN_RATE': 0.1,
+            'RATE_CONTROL_MAX_RATE': 50,
+            'RATE_CONTROL_INCREASE': 0.05,
+            'RATE_CONTROL_DECREASE': 0.5,
+        })
+        mw = RateLimitMiddleware.from_crawler(crawler)
+        request = Request(self.url)
+        bucket = mw.bucket(request)
+        rate = bucket.rate
+        response = TextResponse(self.url, status=429, request=request,
+                                headers={'Retry-After': '5'})
+        mw.process_response(request, response, crawler.spider)
+        assert bucket.rate == rate * 0.5
+        assert bucket.blocked_until > time.monotonic() + 4
+        ok = TextResponse(self.url, status=200, request=request)
+        mw.process_response(request, ok, crawler.spider)
+        assert bucket.rate > rate * 0.5
+
+    def test_retry_delay(self):
+        """Test retries carry a backoff delay of at least Retry-After."""
+        crawler = get_crawler(settings_dict={
+            'RETRY_TIMES': 3,
+            'RETRY_HTTP_CODES': [429],
+            'RETRY_BACKOFF_BASE': 1,
+            'RETRY_BACKOFF_MAX': 60,
+        })
+        crawler.spider = Spider.from_crawler(crawler, 'medium')
+        mw = BackoffRetryMiddleware.from_crawler(crawler)
+        request = Request(self.url)
+        response = TextResponse(self.url, status=429, request=request,
+                                headers={'Retry-After': '30'})
+        retry = mw.process_response(request, response, crawler.spider)
+        assert isinstance(retry, Request)
+        assert retry.meta['retry_not_before'] >= time.time() + 29
+
+    def test_retry_waits(self, monkeypatch):
+        """Test a retry waits for its backoff without rate control."""
+        waits = []
+
+        async def fake_sleep(seconds):
+            waits.append(seconds)
+
+        monkeypatch.setattr(middlewares, 'sleep', fake_sleep)
+        crawler = get_crawler(settings_dict={'RETRY_HTTP_CODES': [429]})
+        mw = BackoffRetryMiddleware.from_crawler(crawler)
+        retry = Request(self.url,
+                        meta={'retry_not_before': time.time() + 10})
+        asyncio.run(mw.process_request(retry, None))
+        asyncio.run(mw.process_request(Request(self.url), None))
+        assert len(waits) == 1 and 9 < waits[0] <= 10
+
+
+def test_throttle_defaults():
+    """Test AutoThrottle is only replaced when rate control is enabled."""
+    project = {k: getattr(project_settings, k)
+               for k in dir(project_settings) if k.isupper()}
+    settings = get_crawler(MediumPost, settings_dict=project).settings
+    assert settings.getbool('AUTOTHROTTLE_ENABLED')
+    assert settings.getfloat('DOWNLOAD_DELAY') == 0.3
+    settings = get_crawler(MediumPost, settings_dict={
+        **project, 'RATE_CONTROL_ENABLED': True
+    }).settings
+    assert not settings.getbool('AUTOTHROTTLE_ENABLED')
+    assert settings.getfloat('DOWNLOAD_DELAY') == 0
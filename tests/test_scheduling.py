@@ -0,0 +1,101 @@
+"""Test for request priorities and comment limits."""
+import time
+
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks import payloads
+from medium_crawler import items
+from medium_crawler.parents import PostRef
+from medium_crawler.spiders.medium import MediumPost
+
+POST_ID = '625a07c75000'
+USER_ID = '8045c82962e2'
+
+
+def comment_response(
+    spider: MediumPost,
+    page: int = 1,
+    seen: int = 0
+) -> HtmlResponse:
+    """Build a `responsesStream` page with a next page and 10 comments."""
+    spider.posts.put(PostRef(POST_ID, 'writer', 'W', 'T'))
+    url = f'https://medium.com/_/api/posts/{POST_ID}/responsesStream'
+    body = payloads.dump(payloads.responses(
+        POST_ID, n_comments=10, n_authors=10, page=page, has_next=True
+    ))
+    meta = {
+        'post_id': POST_ID,
+        'post_updated_at': int(time.time() * 1000),
+        'comment_page': page,
+        'comments_seen': seen,
+    }
+    return HtmlResponse(url=url, body=body, request=Request(url, meta=meta))
+
+
+class TestPriorities:
+    """Test case for MediumPost request priorities."""
+
+    def test_kind_and_recency(self):
+        """Test posts before comments before authors, newer first."""
+        spider = MediumPost(date='20000101', usernames='writer')
+        now = int(time.time() * 1000)
+        day = 86400000
+        assert spider.priority('post', now) > spider.priority(
+            'post', now - 5 * day
+        ) > spider.priority('comment', now) > spider.priority('author', now)
+        assert spider.priority('post', now - 1000 * day) == 200
+
+    def test_parse_links(self):
+        """Test post requests follow recency and outrank the next page."""
+        spider = MediumPost(date='20000101', usernames='writer')
+        url = 'https://medium.com/@writer?format=json'
+        body = payloads.dump(payloads.profile(
+            USER_ID, 'writer', 5, int(time.time() * 1000)
+        ))
+        response = HtmlResponse(
+            url=url, body=body, request=Request(url, meta={'uid': 'writer'})
+        )
+        requests = list(spider.parse_links(response))
+        posts, page = requests[:-1], requests[-1]
+        assert page.callback == spider.parse_links
+        priorities = [r.priority for r in posts]
+        assert priorities == sorted(priorities, reverse=True)
+        assert priorities[0] > priorities[-1] == page.priority
+
+
+class TestCommentLimits:
+    """Test case for the comment page cap and budget."""
+
+    def test_unlimited(self):
+        """Test the next comment page is requested without limits."""
+        spider = MediumPost(date='20000101', usernames='writer')
+        output = list(spider.comment(comment_response(spider)))
+        next_page = [r for r in output if isinstance(r, Request) and
+                     r.callback == spider.comment]
+        assert len(next_page) == 1
+        assert next_page[0].meta['comment_page'] == 2
+        assert next_page[0].meta['comments_seen'] == 10
+        assert next_page[0].priority < spider.priority('post')
+        assert spider.posts.get(POST_ID) is not None
+
+    def test_page_cap(self):
+        """Test no page is requested past the page cap."""
+        spider = MediumPost(date='20000101', usernames='writer')
+        spider.comment_max_pages = 2
+        output = list(spider.comment(comment_response(spider, page=2)))
+        assert not [r for r in output if isinstance(r, Request) and
+                    r.callback == spider.comment]
+        assert spider.posts.get(POST_ID) is None
+
+    def test_budget(self):
+        """Test comments stop at the budget of the post."""
+        spider = MediumPost(date='20000101', usernames='writer')
+        spider.comment_budget = 15
+        response = comment_response(spider, page=2, seen=10)
+        output = list(spider.comment(response))
+        comments = [o for o in output if isinstance(o, items.ArticleItem)]
+        deferred = spider.authors.pending
+        assert len(comments) + deferred == 5
+        assert response.meta['comments_seen'] == 15
+        assert not [r for r in output if isinstance(r, Request) and
+                    r.callback == spider.comment]
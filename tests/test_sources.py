@@ -0,0 +1,196 @@
+"""Test for the streaming url sources."""
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+from scrapy.utils.test import get_crawler
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine
+
+from medium_crawler import sources
+from medium_crawler.spiders.medium import MediumPost
+
+POST_URL = 'https://medium.com/8045c82962e2/be290cd1f9d8'
+
+
+@pytest.fixture
+def url_file(tmp_path):
+    """Write a url file with duplicates, comments and an invalid url."""
+    path = tmp_path / 'urls.txt'
+    path.write_text('\n'.join([
+        '# posts to refresh',
+        POST_URL,
+        'medium.com/8045c82962e2/be290cd1f9d8/',
+        f'{POST_URL}?source=email',
+        '',
+        'https://medium.com/@writer/second-post-a1b2c3',
+        'mailto:someone',
+    ]))
+    return path
+
+
+@pytest.fixture
+def engine():
+    """Create a table of 25 urls, one missing."""
+    engine = create_engine('sqlite://')
+    table = Table('post_urls', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('url', Text))
+    table.create(engine)
+    rows = [{'url': f'https://medium.com/writer/post-{i:03d}'}
+            for i in range(25)]
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows + [{'url': None}])
+    return engine
+
+
+class TestNormalize:
+    """Test case for normalize_url."""
+
+    @pytest.mark.parametrize('url', [
+        POST_URL,
+        f'  {POST_URL}/ ',
+        f'{POST_URL}?format=json#responses',
+        'http://www.Medium.com/8045c82962e2/be290cd1f9d8',
+        'medium.com/8045c82962e2/be290cd1f9d8',
+    ])
+    def test_canonical(self, url):
+        """Test variants of a post url have the same canonical form."""
+        assert sources.normalize_url(url) == POST_URL
+
+    @pytest.mark.parametrize('url', [
+        '', '# comment', 'https://medium.com/', 'ftp://medium.com/a/b',
+    ])
+    def test_skipped(self, url):
+        """Test blank, comment and invalid lines are skipped."""
+        assert sources.normalize_url(url) is None
+
+    def test_post_id(self):
+        """Test a bare post id becomes its short url."""
+        assert (sources.normalize_url(' be290cd1f9d8 ')
+                == 'https://medium.com/p/be290cd1f9d8')
+
+
+class TestSources:
+    """Test case for the url sources."""
+
+    def test_is_source(self):
+        """Test sources are told apart from url lists."""
+        assert sources.is_source('-')
+        assert sources.is_source('file:urls.txt')
+        assert sources.is_source('db:post_urls.url')
+        assert not sources.is_source(POST_URL)
+        assert not sources.is_source(None)
+
+    def test_file(self, url_file):
+        """Test a file is read line by line."""
+        crawler = get_crawler()
+        stream = sources.UrlStream(
+            sources.open_source(f'file:{url_file}'), stats=crawler.stats
+        )
+        assert list(stream) == [
+            POST_URL, 'https://medium.com/@writer/second-post-a1b2c3'
+        ]
+        assert crawler.stats.get_value('url_source/read') == 7
+        assert crawler.stats.get_value('url_source/duplicate') == 2
+        assert crawler.stats.get_value('url_source/invalid') == 1
+
+    def test_table(self, engine):
+        """Test a table is read in chunks."""
+        urls = list(sources.open_source(
+            'db:post_urls.url', engine=engine, chunk_size=10
+        ))
+        assert urls == [f'https://medium.com/writer/post-{i:03d}'
+                        for i in range(25)]
+
+    def test_table_without_column(self, engine):
+        """Test `db:` sources need a column."""
+        with pytest.raises(ValueError):
+            sources.open_source('db:post_urls', engine=engine)
+
+    def test_lazy(self):
+        """Test urls are read as they are consumed."""
+        read = []
+
+        def urls():
+            for i in range(100):
+                read.append(i)
+                yield f'https://medium.com/writer/post-{i}'
+
+        stream = iter(sources.UrlStream(urls()))
+        next(stream)
+        next(stream)
+        assert len(read) == 2
+
+    def test_memory(self):
+        """Test memory grows by a few bytes per url at most.
+
+        The fingerprint index buffers up to 65536 fingerprints in a set.
+        """
+        n = 50000
+        urls = (f'https://medium.com/writer/post-{i:08d}' for i in range(n))
+        tracemalloc.start()
+        count = sum(1 for _ in sources.UrlStream(urls))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert count == n
+        assert peak < 8 * 2 ** 20 + 64 * n
+
+
+class FakeEngine:
+    """Engine busy for a number of checks."""
+
+    def __init__(self, busy):
+        """Set the number of busy checks."""
+        self.busy = busy
+
+    def needs_backout(self):
+        """Tell whether the engine is busy."""
+        self.busy -= 1
+        return self.busy >= 0
+
+
+class FakeSignals:
+    """Signal manager recording the awaited signals."""
+
+    def __init__(self):
+        """Start without waits."""
+        self.waits = 0
+
+    async def wait_for(self, signal):
+        """Wait for a signal."""
+        self.waits += 1
+
+
+class TestSpider:
+    """Test case for the spider url source."""
+
+    def test_rule_url_source(self, url_file):
+        """Test a rule url naming a source is streamed."""
+        rule = SimpleNamespace(id=1, url=f'file:{url_file}')
+        spider = MediumPost(date='20000101', rule=rule)
+        assert spider.url_source == f'file:{url_file}'
+        assert [r.url for r in spider.start_requests()] == [
+            f'{POST_URL}?format=json',
+            'https://medium.com/@writer/second-post-a1b2c3?format=json',
+        ]
+
+    def test_urls_are_deduplicated(self):
+        """Test the `urls` list is normalized and deduplicated too."""
+        spider = MediumPost(date='20000101',
+                            urls=f'{POST_URL},{POST_URL}/')
+        assert len(list(spider.start_requests())) == 1
+
+    def test_start_waits_while_busy(self, url_file):
+        """Test start requests wait for the scheduler while busy."""
+        spider = MediumPost(date='20000101', url_source=str(url_file))
+        crawler = get_crawler(MediumPost)
+        crawler.engine = FakeEngine(busy=1)
+        crawler.signals = FakeSignals()
+        spider.crawler = crawler
+
+        async def start():
+            return [request async for request in spider.start()]
+
+        assert len(asyncio.run(start())) == 2
+        assert crawler.signals.waits == 1
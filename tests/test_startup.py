@@ -0,0 +1,56 @@
+"""Test for import-time side effects."""
+import subprocess
+import sys
+
+import pytest
+
+from medium_crawler.utils import strtobool
+
+
+def imported_modules(code: str) -> set:
+    """Run code in a fresh interpreter and get its loaded modules."""
+    output = subprocess.run(
+        [sys.executable, '-c', f'{code}\nimport sys; print(*sys.modules)'],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True
+    ).stdout
+    return set(output.split())
+
+
+class TestStartup:
+    """Test case for a cheap and side-effect free package import."""
+
+    def test_package_import_is_light(self):
+        """Test `import medium_crawler` loads neither scrapy nor colorlog."""
+        modules = imported_modules('import medium_crawler')
+        assert 'scrapy' not in modules
+        assert 'colorlog' not in modules
+        assert 'distutils' not in modules
+
+    def test_color_logging_is_opt_in(self):
+        """Test scrapy's log handler is only patched with `COLOR_LOGS`."""
+        code = (
+            'import medium_crawler.settings, scrapy.utils.log\n'
+            'print(getattr(scrapy.utils.log._get_handler, "colored", False))'
+        )
+        for value, expected in (('false', 'False'), ('true', 'True')):
+            output = subprocess.run(
+                [sys.executable, '-c', code], stdout=subprocess.PIPE,
+                universal_newlines=True, check=True,
+                env={'COLOR_LOGS': value, 'PATH': ''}
+            ).stdout
+            assert output.strip() == expected
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('TRUE', True), ('1', True), ('on', True),
+    ('FALSE', False), ('0', False), ('no', False),
+])
+def test_strtobool(value, expected):
+    """Test truth values are parsed like distutils did."""
+    assert strtobool(value) is expected
+
+
+def test_strtobool_invalid():
+    """Test other values are rejected."""
+    with pytest.raises(ValueError):
+        strtobool('maybe')
@@ -0,0 +1,131 @@
+"""Test for incremental crawling."""
+from scrapy import signals
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+
+from medium_crawler.spiders.medium import MediumPost
+from medium_crawler.watermarks import Cursor, CursorStore, WatermarkStore
+
+
+def make_store(tmp_path) -> WatermarkStore:
+    """Create a watermark store in a temporary SQLite file."""
+    return WatermarkStore(create_engine(f'sqlite:///{tmp_path / "rule.db"}'))
+
+
+def crawl(store, posts, fetched=None, username='writer'):
+    """List the posts of a writer and fetch some of them."""
+    for post_id, updated_at in posts:
+        store.list_post(username, post_id, updated_at)
+        if fetched is None or post_id in fetched:
+            store.mark(username, post_id, updated_at)
+
+
+class TestWatermarkStore:
+    """Test case for WatermarkStore."""
+
+    def test_mark_keeps_latest(self, tmp_path):
+        """Test the mark only moves forward and survives a flush."""
+        store = make_store(tmp_path)
+        crawl(store, [('p2', 2000), ('p1', 1000)])
+        store.flush()
+        store = make_store(tmp_path)
+        assert store.get('writer') == (2000, 'p2')
+        assert store.updated_at('writer', 'p1') == 1000
+        assert store.get('nobody') is None
+        crawl(store, [('p3', 3000)], fetched=())
+        store.flush()
+        assert make_store(tmp_path).get('writer') == (2000, 'p2')
+
+    def test_post_states_read_once(self, tmp_path):
+        """Test the posts of a writer are read in one query."""
+        store = make_store(tmp_path)
+        crawl(store, [('p2', 2000), ('p1', 1000)])
+        store.flush()
+        store = make_store(tmp_path)
+        assert store.updated_at('writer', 'p2') == 2000
+
+        def no_session():
+            raise AssertionError('database read')
+
+        store.Session = no_session
+        assert store.updated_at('writer', 'p1') == 1000
+        assert store.updated_at('writer', 'p9') is None
+        crawl(store, [('p3', 3000)])
+        assert store.updated_at('writer', 'p3') == 3000
+
+    def test_interrupted_run(self, tmp_path):
+        """Test a run that did not finish leaves the mark."""
+        store = make_store(tmp_path)
+        crawl(store, [('p1', 1000)])
+        store.flush()
+        crawl(store, [('p3', 3000), ('p2', 2000)], fetched=('p3',))
+        store.flush('shutdown')
+        store = make_store(tmp_path)
+        assert store.get('writer') == (1000, 'p1')
+        assert store.updated_at('writer', 'p3') == 3000
+
+    def test_failed_post(self, tmp_path):
+        """Test the mark stops below a listed post that was not fetched."""
+        store = make_store(tmp_path)
+        crawl(store, [('p4', 4000), ('p3', 3000), ('p2', 2000),
+                      ('p1', 1000)], fetched=('p4', 'p2', 'p1'))
+        store.flush()
+        assert make_store(tmp_path).get('writer') == (2000, 'p2')
+
+
+class TestCursorStore:
+    """Test case for CursorStore."""
+
+    def test_advance(self, tmp_path):
+        """Test the last cursor of a post survives a flush."""
+        engine = create_engine(f'sqlite:///{tmp_path / "rule.db"}')
+        store = CursorStore(engine)
+        assert store.get('p1') is None
+        store.advance('p1', Cursor(0, '50', 0))
+        store.advance('p1', Cursor(70, '50', 20))
+        store.flush()
+        store = CursorStore(engine)
+        assert store.get('p1') == Cursor(70, '50', 20)
+
+
+class TestMediumSpiderIncremental:
+    """Test case for MediumPost incremental mode."""
+
+    def test_parse_links_logic(self, tmp_path):
+        """Test crawled posts are skipped and paging stops at the mark."""
+        spider = MediumPost(date='20200301', usernames='writer',
+                            incremental='true')
+        spider.watermarks = make_store(tmp_path)
+        crawl(spider.watermarks, [('p3', 1610000000000),
+                                  ('p2', 1600000000000)])
+        spider.watermarks.flush()
+        posts = {
+            f'p{i}': {'id': f'p{i}', 'creatorId': 'u1', 'updatedAt': t}
+            for i, t in [(4, 1620000000000), (3, 1615000000000),
+                         (1, 1612000000000), (2, 1600000000000)]
+        }
+        url = 'https://medium.com/@writer?format=json'
+        response = HtmlResponse(
+            url=url, body=b'', request=Request(url, meta={'uid': 'writer'})
+        )
+        output = list(spider.parse_links_logic(response, posts, 'u1'))
+        assert [r.url.split('/')[-1] for r in output[:-1]] == [
+            'p4?format=json', 'p3?format=json', 'p1?format=json'
+        ]
+        assert output[-1] is False
+
+    def test_interrupted_crawl(self, tmp_path, monkeypatch):
+        """Test a cancelled crawl only stores its posts."""
+        monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "rule.db"}')
+        crawler = get_crawler(MediumPost)
+        spider = MediumPost.from_crawler(
+            crawler, date='20200301', usernames='writer', incremental='true'
+        )
+        crawl(spider.watermarks, [('p2', 2000), ('p1', 1000)])
+        crawler.signals.send_catch_log(
+            signals.spider_closed, spider=spider, reason='shutdown'
+        )
+        store = make_store(tmp_path)
+        assert store.get('writer') is None
+        assert store.updated_at('writer', 'p2') == 2000